@@ -0,0 +1,216 @@
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmark import storage
+from benchmark.corpus import generate_corpus, parse_size
+from domain.models import BatchTask
+from session.batch_engine import BatchEngine, collect_ncm_files, is_free_threaded, resolve_executor_kind
+from session.chunk_tuner import AUTO_CHUNK_SIZE, PROFILE_PATH_ENV
+from session.decryption_session import DecryptionSession
+from session.header_cache import HEADER_CACHE_ENV
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+"""
+语料形态：名称 -> (文件数量, 单个文件音频大小)
+"""
+DEFAULT_CORPORA = {
+    "many-small": (40, "128K"),
+    "few-huge": (2, "4M"),
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_bytes() -> int:
+    """当前进程及已回收子进程的峰值常驻内存（字节）"""
+    if resource is None:
+        return 0
+    scale = 1 if platform.system() == "Darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+
+def run_session_mode(ncm_files: List[str], output_dir: Path, chunk_size: int) -> List[float]:
+    latencies = []
+    for file_path in ncm_files:
+        start = time.perf_counter()
+        session = DecryptionSession(file_path)
+        output_path = output_dir / (Path(file_path).stem + "." + session.get_metadata().format)
+        session.export_with_chunk(str(output_path), chunk_size)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_batch_mode(ncm_files: List[str], output_dir: Path, chunk_size: int,
+                   jobs: int, profile: str, executor: str = "auto") -> List[float]:
+    tasks = [BatchTask(file_path, output_dir=str(output_dir)) for file_path in ncm_files]
+    engine = BatchEngine(jobs=jobs, chunk_size=chunk_size, initializer=storage.install, initargs=(profile,),
+                         executor=executor)
+    results = engine.run(tasks)
+    failed = [r for r in results if not r.success]
+    if failed:
+        raise RuntimeError(f"{len(failed)} files failed, first error: {failed[0].message}")
+    return [r.elapsed for r in results]
+
+
+def run_case(corpus_dir: str, mode: str, profile: str, jobs: int, chunk_size: int, executor: str, queue) -> None:
+    """在独立子进程中运行单个用例，使峰值内存互不干扰"""
+    ncm_files = collect_ncm_files([corpus_dir])
+    total_bytes = sum(Path(p).stat().st_size for p in ncm_files)
+
+    with tempfile.TemporaryDirectory(prefix="ncm_batch_out_") as output_dir:
+        # 每个用例从空的分块调节档案开始，避免不同限速配置（同一设备）互相影响
+        os.environ[PROFILE_PATH_ENV] = str(Path(output_dir) / "chunk_profile.json")
+        # 文件头缓存同样从空数据库开始，不写入用户的缓存，复用语料时也不会测到已缓存的文件头
+        os.environ[HEADER_CACHE_ENV] = str(Path(output_dir) / "headers.db")
+        start = time.perf_counter()
+        if mode == "session":
+            storage.install(profile)
+            latencies = run_session_mode(ncm_files, Path(output_dir), chunk_size)
+        else:
+            latencies = run_batch_mode(ncm_files, Path(output_dir), chunk_size, jobs, profile, executor)
+        wall = time.perf_counter() - start
+
+    queue.put({
+        "files": len(ncm_files),
+        "bytes": total_bytes,
+        "wall_seconds": wall,
+        "files_per_second": len(ncm_files) / wall if wall else 0.0,
+        "mb_per_second": total_bytes / wall / 1024 / 1024 if wall else 0.0,
+        "p50_latency_ms": percentile(latencies, 50) * 1000,
+        "p99_latency_ms": percentile(latencies, 99) * 1000,
+        "mean_latency_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "peak_rss_bytes": peak_rss_bytes(),
+    })
+
+
+def run_isolated(corpus_dir: str, mode: str, profile: str, jobs: int, chunk_size: int, executor: str = "auto") -> Dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_case, args=(corpus_dir, mode, profile, jobs, chunk_size, executor, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict, baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    old_cases = {c["case"]: c for c in baseline["cases"]}
+    print(f"\nCompared with {baseline.get('revision', '?')}:")
+    for case in current["cases"]:
+        old = old_cases.get(case["case"])
+        if not old or not old["mb_per_second"]:
+            continue
+        ratio = case["mb_per_second"] / old["mb_per_second"]
+        print(f"  {case['case']:<40} {ratio:6.2f}x MB/s, "
+              f"p99 {old['p99_latency_ms']:.1f} -> {case['p99_latency_ms']:.1f} ms")
+
+
+def print_cases(cases: List[Dict]) -> None:
+    print(f"{'case':<40}{'files/s':>10}{'MB/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak RSS MB':>14}")
+    for c in cases:
+        print(f"{c['case']:<40}{c['files_per_second']:>10.2f}{c['mb_per_second']:>10.2f}"
+              f"{c['p50_latency_ms']:>10.1f}{c['p99_latency_ms']:>10.1f}{c['peak_rss_bytes'] / 1024 / 1024:>14.1f}")
+
+
+def run(corpora: Dict[str, tuple], profiles: List[str], modes: List[str], jobs: int, chunk_size: int,
+        output_json: str, baseline_json: Optional[str] = None, keep_corpus: Optional[str] = None,
+        executor: str = "auto") -> Dict:
+    executor = resolve_executor_kind(executor)
+    work_dir = Path(keep_corpus) if keep_corpus else Path(tempfile.mkdtemp(prefix="ncm_batch_corpus_"))
+    cases = []
+    try:
+        for corpus_name, (count, size) in corpora.items():
+            corpus_dir = work_dir / corpus_name
+            if not corpus_dir.is_dir():
+                generate_corpus(str(corpus_dir), count, parse_size(size), ["mp3", "flac"], cover_dimension=300)
+
+            for profile in profiles:
+                for mode in modes:
+                    mode_name = f"batch-{executor}-j{jobs}" if mode == "batch" else mode
+                    result = run_isolated(str(corpus_dir), mode, profile, jobs, chunk_size, executor)
+                    cases.append({"case": f"{corpus_name}/{profile}/{mode_name}"} | result)
+    finally:
+        if not keep_corpus:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "free_threaded": is_free_threaded(),
+        "platform": platform.platform(),
+        "chunk_size": chunk_size or "auto",
+        "jobs": jobs,
+        "executor": executor,
+        "cases": cases,
+    }
+    Path(output_json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print_cases(cases)
+    if baseline_json:
+        compare(report, baseline_json)
+    return report
+
+
+def main():
+    parser = ArgumentParser(description="End-to-end batch throughput benchmark\t端到端批量吞吐基准测试")
+    parser.add_argument("--corpus", action="append", metavar="NAME=COUNTxSIZE",
+                        help="Corpus shape, e.g. many-small=200x256K\t语料形态，可重复指定")
+    parser.add_argument("--profiles", type=str, default="local,nas", help=f"Storage profiles {list(storage.PROFILES)}")
+    parser.add_argument("--modes", type=str, default="session,batch", help="session / batch\t运行模式")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Parallel jobs for batch mode\t批量模式并行数")
+    parser.add_argument("--executor", type=str, default="auto", choices=["auto", "thread", "process"],
+                        help="Worker pool for batch mode\t批量模式工作池（auto 在无 GIL 构建上使用线程池）")
+    parser.add_argument("--chunk-size", type=str, default="1M", help="Chunk size or auto\t分块大小，auto 表示自动调节")
+    parser.add_argument("--output", type=str, default="batch_bench.json", help="Result JSON path\t结果文件")
+    parser.add_argument("--compare", type=str, help="Baseline result JSON\t用于对比的历史结果")
+    parser.add_argument("--keep-corpus", type=str, help="Reuse/keep corpus in this directory\t保留语料目录")
+    args = parser.parse_args()
+
+    corpora = DEFAULT_CORPORA
+    if args.corpus:
+        corpora = {}
+        for spec in args.corpus:
+            name, shape = spec.split("=", 1)
+            count, size = shape.lower().split("x", 1)
+            corpora[name] = (int(count), size)
+
+    run(corpora, args.profiles.split(","), args.modes.split(","), args.jobs,
+        AUTO_CHUNK_SIZE if args.chunk_size == "auto" else parse_size(args.chunk_size),
+        args.output, args.compare, args.keep_corpus, args.executor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from benchmark.corpus import SyntheticTrack, generate_track, parse_size
+from codec.header_decoder import BatchHeaderDecoder
+from codec.ncm_codec import NCMCodec
+from domain.models import ClipOptions
+from session.decryption_session import DecryptionSession
+from session.header_cache import HEADER_CACHE_ENV
+
+
+@dataclass
+class BenchResult:
+    name: str
+    case: str
+    repeat: int
+    best_seconds: float
+    mean_seconds: float
+    bytes_per_call: int
+    peak_alloc_bytes: int
+
+    @property
+    def mb_per_second(self) -> float:
+        if not self.bytes_per_call or not self.best_seconds:
+            return 0.0
+        return self.bytes_per_call / self.best_seconds / 1024 / 1024
+
+
+def measure(name: str, case: str, func: Callable[[], object], repeat: int, bytes_per_call: int) -> BenchResult:
+    """
+    Time func over repeat runs, then run it once more under tracemalloc to record peak allocations.
+    计时 repeat 次，再在 tracemalloc 下额外运行一次以记录内存分配峰值。
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchResult(name, case, repeat, min(timings), sum(timings) / len(timings), bytes_per_call, peak)
+
+
+def check_round_trip(track: SyntheticTrack, ncm_path: Path) -> None:
+    """
+    Verify that every codec primitive and the session restore the synthetic input byte for byte.
+    校验各解码原语与会话能逐字节还原合成输入。
+    """
+    key_bytes = track.ncm_bytes[10:142]
+    if NCMCodec.derive_key(key_bytes) != track.rc4_key:
+        raise AssertionError(f"{track.name}: derive_key mismatch")
+
+    session = DecryptionSession(str(ncm_path))
+    metadata_length = int.from_bytes(track.ncm_bytes[142:146], byteorder="little")
+    if NCMCodec.decrypt_metadata(track.ncm_bytes[146:146 + metadata_length]) != track.metadata:
+        raise AssertionError(f"{track.name}: decrypt_metadata mismatch")
+    if session.get_cover_bytes() != track.cover_bytes:
+        raise AssertionError(f"{track.name}: cover mismatch")
+    if session.decrypt_with_chunk() != track.audio:
+        raise AssertionError(f"{track.name}: decrypt_with_chunk mismatch")
+
+
+def bench_track(track: SyntheticTrack, work_dir: Path, repeat: int) -> List[BenchResult]:
+    ncm_path = work_dir / f"{track.name}.ncm"
+    ncm_path.write_bytes(track.ncm_bytes)
+    output_path = work_dir / f"{track.name}.{track.metadata['format']}"
+
+    check_round_trip(track, ncm_path)
+
+    case = f"{track.metadata['format']} {len(track.audio) / 1024 / 1024:.2f}MB cover={len(track.cover_bytes)}B"
+    key_bytes = track.ncm_bytes[10:142]
+    metadata_length = int.from_bytes(track.ncm_bytes[142:146], byteorder="little")
+    encrypted_metadata = track.ncm_bytes[146:146 + metadata_length]
+    encrypted_audio = track.ncm_bytes[-len(track.audio):]
+
+    def preview():
+        DecryptionSession(str(ncm_path), use_header_cache=False).preview()
+
+    def cached_preview():
+        DecryptionSession(str(ncm_path)).preview()
+
+    def export():
+        DecryptionSession(str(ncm_path)).export_with_chunk(str(output_path))
+
+    def export_clip():
+        DecryptionSession(str(ncm_path)).export_with_chunk(str(output_path), clip=ClipOptions(30))
+
+    return [
+        measure("verify_format", case, lambda: NCMCodec.verify_format(track.ncm_bytes[:8]), repeat, 8),
+        measure("derive_key", case, lambda: NCMCodec.derive_key(key_bytes), repeat, len(key_bytes)),
+        measure("decrypt_metadata", case, lambda: NCMCodec.decrypt_metadata(encrypted_metadata),
+                repeat, len(encrypted_metadata)),
+        measure("decrypt_audio", case, lambda: NCMCodec.decrypt_audio(encrypted_audio, track.rc4_key),
+                repeat, len(encrypted_audio)),
+        measure("session.preview", case, preview, repeat, len(track.ncm_bytes) - len(track.audio)),
+        measure("session.preview (cached)", case, cached_preview, repeat, len(track.ncm_bytes) - len(track.audio)),
+        measure("session.export_with_chunk", case, export, repeat, len(track.ncm_bytes)),
+        # 吞吐量按整首音频计算，与完整导出对比可看出只截取片段节省的时间
+        measure("session.export (clip 30s)", case, export_clip, repeat, len(track.ncm_bytes)),
+    ]
+
+
+def bench_headers(tracks: List[SyntheticTrack], count: int, repeat: int) -> List[BenchResult]:
+    """
+    Compare per-file header decoding with BatchHeaderDecoder over count headers taken from the tracks.
+    对比逐个文件解码与 BatchHeaderDecoder 批量解码 count 个文件头的耗时。
+    """
+    key_blobs, metadata_blobs = [], []
+    for i in range(count):
+        ncm_bytes = tracks[i % len(tracks)].ncm_bytes
+        metadata_length = int.from_bytes(ncm_bytes[142:146], byteorder="little")
+        key_blobs.append(ncm_bytes[10:142])
+        metadata_blobs.append(ncm_bytes[146:146 + metadata_length])
+
+    if BatchHeaderDecoder.derive_keys(key_blobs) != [NCMCodec.derive_key(b) for b in key_blobs]:
+        raise AssertionError("BatchHeaderDecoder.derive_keys mismatch")
+    if BatchHeaderDecoder.decrypt_metadata(metadata_blobs) != [NCMCodec.decrypt_metadata(b) for b in metadata_blobs]:
+        raise AssertionError("BatchHeaderDecoder.decrypt_metadata mismatch")
+
+    def per_file():
+        for key_blob, metadata_blob in zip(key_blobs, metadata_blobs):
+            NCMCodec.derive_key(key_blob)
+            NCMCodec.decrypt_metadata(metadata_blob)
+
+    def batched():
+        BatchHeaderDecoder.derive_keys(key_blobs)
+        BatchHeaderDecoder.decrypt_metadata(metadata_blobs)
+
+    case = f"{count} headers"
+    total_bytes = sum(map(len, key_blobs)) + sum(map(len, metadata_blobs))
+    return [
+        measure("headers.per_file", case, per_file, repeat, total_bytes),
+        measure("headers.batch", case, batched, repeat, total_bytes),
+    ]
+
+
+def print_results(results: List[BenchResult]) -> None:
+    print(f"{'primitive':<28}{'case':<36}{'best ms':>10}{'mean ms':>10}{'MB/s':>10}{'peak KB':>12}")
+    for r in results:
+        print(f"{r.name:<28}{r.case:<36}{r.best_seconds * 1000:>10.3f}{r.mean_seconds * 1000:>10.3f}"
+              f"{r.mb_per_second:>10.2f}{r.peak_alloc_bytes / 1024:>12.1f}")
+
+
+def run(sizes: List[int], formats: List[str], covers: List[int], repeat: int,
+        json_path: Optional[str] = None, header_count: int = 1000) -> List[BenchResult]:
+    results = []
+    tracks = []
+    previous_cache = os.environ.get(HEADER_CACHE_ENV)
+    with tempfile.TemporaryDirectory(prefix="ncm_bench_") as tmp:
+        os.environ[HEADER_CACHE_ENV] = str(Path(tmp) / "headers.db")  # 不写入用户的文件头缓存
+        try:
+            index = 0
+            for audio_format in formats:
+                for size in sizes:
+                    for cover in covers:
+                        track = generate_track(index, size, audio_format, cover)
+                        results.extend(bench_track(track, Path(tmp), repeat))
+                        tracks.append(track)
+                        index += 1
+            if header_count:
+                results.extend(bench_headers(tracks, header_count, repeat))
+        finally:
+            # 恢复调用方的设置，避免之后指向已删除的临时目录
+            if previous_cache is None:
+                os.environ.pop(HEADER_CACHE_ENV, None)
+            else:
+                os.environ[HEADER_CACHE_ENV] = previous_cache
+
+    print_results(results)
+    if json_path:
+        payload = [asdict(r) | {"mb_per_second": r.mb_per_second} for r in results]
+        Path(json_path).write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="NCM codec micro-benchmarks\tNCM 解码原语微基准测试")
+    parser.add_argument("-s", "--sizes", type=str, default="256K,1M", help="Audio sizes\t音频大小列表")
+    parser.add_argument("-f", "--formats", type=str, default="mp3,flac", help="Audio formats\t音频格式列表")
+    parser.add_argument("-c", "--covers", type=str, default="0,500", help="Cover dimensions\t封面边长列表")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Repeat count\t重复次数")
+    parser.add_argument("--json", type=str, help="Write results as JSON\t结果写入JSON文件")
+    parser.add_argument("--headers", type=int, default=1000,
+                        help="Header count for the batch decoding case, 0 to skip\t批量文件头解码用例的文件头数量，0 表示跳过")
+    args = parser.parse_args()
+
+    run([parse_size(s) for s in args.sizes.split(",")],
+        args.formats.split(","),
+        [int(c) for c in args.covers.split(",")],
+        args.repeat,
+        args.json,
+        args.headers)
+
+
+if __name__ == "__main__":
+    main()
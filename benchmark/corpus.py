@@ -0,0 +1,204 @@
+import hashlib
+import io
+import json
+import random
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from codec.ncm_encoder import NCMEncoder
+
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"  # MPEG1 Layer III, 128kbps, 44100Hz, 无CRC
+MP3_FRAME_SIZE = 417  # 144 * 128000 // 44100
+MP3_SAMPLES_PER_FRAME = 1152
+FLAC_BLOCK_SIZE = 4096
+FLAC_FRAME_SIZE = FLAC_BLOCK_SIZE * 4  # 与未压缩的16位双声道数据同样大小，时长与 make_metadata 中的估算一致
+SAMPLE_RATE = 44100
+
+
+@dataclass
+class SyntheticTrack:
+    name: str
+    rc4_key: bytes
+    metadata: dict
+    cover_bytes: bytes
+    audio: bytes
+    ncm_bytes: bytes
+
+
+def parse_size(size_str: str) -> int:
+    """
+    Parse a human-readable size such as 512K, 4M or 1G.
+    解析 512K、4M、1G 形式的大小字符串。
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    size_str = size_str.strip().upper().removesuffix("B").removesuffix("I")
+    if size_str and size_str[-1] in units:
+        return int(float(size_str[:-1]) * units[size_str[-1]])
+    return int(size_str)
+
+
+def make_rc4_key(rng: random.Random) -> bytes:
+    return "".join(rng.choices("0123456789", k=110)).encode("ascii")
+
+
+def make_mp3_audio(size: int, rng: random.Random) -> bytes:
+    """生成以ID3v2头开始、由合法MP3帧头组成的音频数据"""
+    id3_padding = 1024
+    syncsafe = bytes([(id3_padding >> shift) & 0x7F for shift in (21, 14, 7, 0)])
+    audio = bytearray(b"ID3\x04\x00\x00" + syncsafe + b"\x00" * id3_padding)
+
+    frame_payload = MP3_FRAME_SIZE - len(MP3_FRAME_HEADER)
+    while len(audio) < size:
+        audio += MP3_FRAME_HEADER + rng.randbytes(frame_payload)
+    return bytes(audio)
+
+
+def _flac_frame_header(frame_number: int) -> bytes:
+    """固定块大小 FLAC_BLOCK_SIZE、44100Hz、双声道、16位的帧头，帧号按类 UTF-8 编码，末尾为 CRC-8"""
+    if frame_number < 0x80:
+        number = bytes([frame_number])
+    else:
+        length = 2
+        while frame_number >= 1 << (5 * length + 1):
+            length += 1
+        tail = [0x80 | (frame_number >> (6 * i)) & 0x3F for i in range(length - 1)][::-1]
+        number = bytes([(0xFF00 >> length) & 0xFF | frame_number >> (6 * (length - 1))] + tail)
+    header = b"\xff\xf8" + bytes([(12 << 4) | 9, (1 << 4) | (4 << 1)]) + number
+    crc = 0
+    for b in header:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return header + bytes([crc])
+
+
+def make_flac_audio(size: int, rng: random.Random) -> bytes:
+    """生成带 STREAMINFO 头、由合法FLAC帧头组成的数据，帧内容为随机字节"""
+    frame_count = max(size // FLAC_FRAME_SIZE, 1)
+    total_samples = frame_count * FLAC_BLOCK_SIZE
+    stream_info = (
+        FLAC_BLOCK_SIZE.to_bytes(2, "big") + FLAC_BLOCK_SIZE.to_bytes(2, "big")
+        + (0).to_bytes(3, "big") + (0).to_bytes(3, "big")
+        + ((SAMPLE_RATE << 44) | (1 << 41) | (15 << 36) | total_samples).to_bytes(8, "big")
+        + b"\x00" * 16
+    )
+    audio = bytearray(b"fLaC" + bytes([0x80]) + len(stream_info).to_bytes(3, "big") + stream_info)
+    for frame_number in range(frame_count):
+        header = _flac_frame_header(frame_number)
+        audio += header + rng.randbytes(FLAC_FRAME_SIZE - len(header))
+    return bytes(audio)
+
+
+def make_cover(dimension: int, rng: random.Random) -> bytes:
+    """生成 dimension x dimension 的随机噪声JPEG封面，dimension 为 0 时不生成封面"""
+    if dimension <= 0:
+        return b""
+
+    from PIL import Image
+
+    image = Image.frombytes("RGB", (dimension, dimension), rng.randbytes(dimension * dimension * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def make_metadata(index: int, audio_format: str, audio_size: int, rng: random.Random) -> dict:
+    if audio_format == "mp3":
+        frames = audio_size // MP3_FRAME_SIZE
+        duration = frames * MP3_SAMPLES_PER_FRAME * 1000 // SAMPLE_RATE
+        bitrate = 128000
+    else:
+        duration = audio_size // 4 * 1000 // SAMPLE_RATE
+        bitrate = 1411000
+
+    artist_count = rng.randint(1, 3)
+    return {
+        "musicId": 100000 + index,
+        "musicName": f"合成歌曲 {index}",
+        "artist": [[f"歌手 {rng.randint(1, 500)}", rng.randint(1, 10 ** 6)] for _ in range(artist_count)],
+        "album": f"合成专辑 {index // 10}",
+        "albumId": 2000 + index // 10,
+        "format": audio_format,
+        "duration": duration,
+        "bitrate": bitrate,
+    }
+
+
+def generate_track(index: int = 0, audio_size: int = 1024 * 1024, audio_format: str = "mp3",
+                   cover_dimension: int = 500, seed: Optional[int] = None) -> SyntheticTrack:
+    """
+    Generate one synthetic track in memory.
+    在内存中生成一首合成歌曲及其 NCM 文件字节。
+
+    :param index: int 序号，用于生成文件名和元数据
+    :param audio_size: int 明文音频大小（字节）
+    :param audio_format: str mp3 / flac
+    :param cover_dimension: int 封面边长（像素），0 表示无封面
+    :param seed: Optional[int] 随机种子，默认取 index
+    :return: SyntheticTrack
+    """
+    if audio_format not in ("mp3", "flac"):
+        raise ValueError(f"Unsupported format: {audio_format}")
+
+    rng = random.Random(index if seed is None else seed)
+    rc4_key = make_rc4_key(rng)
+    if audio_format == "mp3":
+        audio = make_mp3_audio(audio_size, rng)
+    else:
+        audio = make_flac_audio(audio_size, rng)
+    cover_bytes = make_cover(cover_dimension, rng)
+    metadata = make_metadata(index, audio_format, len(audio), rng)
+
+    ncm_bytes = NCMEncoder.build_file(rc4_key, metadata, cover_bytes, audio)
+    return SyntheticTrack(f"track_{index:05d}_{audio_format}", rc4_key, metadata, cover_bytes, audio, ncm_bytes)
+
+
+def generate_corpus(output_dir: str, count: int, audio_size: int, formats: List[str],
+                    cover_dimension: int = 500, seed: int = 0) -> List[Path]:
+    """
+    Write a synthetic corpus to disk, together with a manifest.json of expected audio digests.
+    生成合成语料到磁盘，并写入记录明文音频摘要的 manifest.json。
+
+    :return: List[Path] 生成的 .ncm 文件路径
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    manifest = {}
+    for index in range(count):
+        audio_format = formats[index % len(formats)]
+        track = generate_track(index, audio_size, audio_format, cover_dimension, seed=seed + index)
+        path = output / f"{track.name}.ncm"
+        path.write_bytes(track.ncm_bytes)
+        paths.append(path)
+        manifest[path.name] = {
+            "format": audio_format,
+            "audio_size": len(track.audio),
+            "audio_sha256": hashlib.sha256(track.audio).hexdigest(),
+            "cover_sha256": hashlib.sha256(track.cover_bytes).hexdigest(),
+        }
+
+    (output / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    return paths
+
+
+def main():
+    parser = ArgumentParser(description="Generate a synthetic NCM corpus\t生成合成 NCM 语料")
+    parser.add_argument("output_dir", type=str, help="Output directory\t输出目录")
+    parser.add_argument("-n", "--count", type=int, default=10, help="Number of files\t文件数量")
+    parser.add_argument("-s", "--size", type=str, default="1M", help="Audio size per file\t单个文件音频大小")
+    parser.add_argument("-f", "--formats", type=str, default="mp3,flac", help="Comma separated formats\t音频格式")
+    parser.add_argument("-c", "--cover", type=int, default=500, help="Cover dimension in pixels\t封面边长")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed\t随机种子")
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output_dir, args.count, parse_size(args.size),
+                            args.formats.split(","), args.cover, args.seed)
+    print(f"Generated {len(paths)} files in {Path(args.output_dir).resolve()}")
+
+
+if __name__ == "__main__":
+    main()
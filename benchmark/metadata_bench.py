@@ -0,0 +1,125 @@
+import json
+import random
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+from domain.metadata_table import MetadataTable
+from domain.models import NCMMetadata
+
+
+@dataclass
+class LegacyMetadata:
+    """改造前的 NCMMetadata：普通 dataclass，每条记录各自持有列表与未驻留的字符串，用作对照"""
+    music_id: str
+    title: str
+    artist: List[str]
+    artist_ids: List[Optional[int]]
+    album: str
+    album_id: str
+    format: str
+    duration: int
+    bitrate: int
+
+    @classmethod
+    def load_from_dict(cls, data: dict) -> "LegacyMetadata":
+        return cls(
+            music_id=data.get("music_id", ""),
+            title=data.get("musicName", "未知歌曲"),
+            artist=[artist[0] for artist in data.get('artist', [])],
+            artist_ids=[artist[1] if artist[1] else None for artist in data.get('artist', [])],
+            album=data.get("album", "未知专辑"),
+            album_id=data.get("albumId", ""),
+            format=data.get("format", "flac"),
+            duration=data.get("duration", 0),
+            bitrate=data.get("bitrate", 0)
+        )
+
+
+def iter_metadata_dicts(count: int, artists: int, albums: int, seed: int = 0) -> Iterator[dict]:
+    """
+    Yield metadata dicts shaped like decrypted NCM headers. Each record is decoded from its own JSON text,
+    so its strings are separate objects exactly as they are when read from real files.
+    生成与解密后的 NCM 元数据结构相同的字典。每条记录由各自的 JSON 文本解码，字符串与读取真实文件时一样互不共享。
+    """
+    rng = random.Random(seed)
+    for index in range(count):
+        album = rng.randrange(albums)
+        first_artist = album % artists
+        names = [[f"歌手{first_artist}", 10000 + first_artist]]
+        if rng.random() < 0.2:
+            featured = rng.randrange(artists)
+            names.append([f"歌手{featured}", 10000 + featured])
+        yield json.loads(json.dumps({
+            "musicName": f"歌曲{index}", "artist": names, "album": f"专辑{album}", "albumId": 500000 + album,
+            "format": "flac" if rng.random() < 0.4 else "mp3", "duration": rng.randrange(60_000, 600_000),
+            "bitrate": rng.choice((128000, 320000, 999000)),
+        }, ensure_ascii=False))
+
+
+def measure_memory(build: Callable[[], object]) -> tuple:
+    """返回（构建结果，保留的内存字节数，构建耗时秒数）"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, elapsed
+
+
+def timed(func: Callable[[], object], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_queries(collection) -> tuple:
+    """返回（筛选耗时，排序耗时）秒数"""
+    if isinstance(collection, MetadataTable):
+        return (timed(lambda: collection.filter_rows(artist="歌手7", format="flac")),
+                timed(lambda: collection.sort_rows("album", "duration")))
+    return (timed(lambda: [m for m in collection if "歌手7" in m.artist and m.format == "flac"]),
+            timed(lambda: sorted(collection, key=lambda m: (m.album, m.duration))))
+
+
+def run(count: int, artists: int, albums: int) -> None:
+    def build_legacy():
+        return [LegacyMetadata.load_from_dict(data) for data in iter_metadata_dicts(count, artists, albums)]
+
+    def build_records():
+        return [NCMMetadata.load_from_dict(data) for data in iter_metadata_dicts(count, artists, albums)]
+
+    def build_frozen():
+        return [NCMMetadata.load_from_dict(data).freeze() for data in iter_metadata_dicts(count, artists, albums)]
+
+    def build_table():
+        return MetadataTable(NCMMetadata.load_from_dict(data) for data in iter_metadata_dicts(count, artists, albums))
+
+    print(f"{count} 条记录，{artists} 位歌手，{albums} 张专辑")
+    print(f"{'representation':<24}{'retained MB':>14}{'bytes/row':>12}{'build s':>10}{'filter ms':>12}{'sort ms':>10}")
+    for name, build in (("legacy dataclass", build_legacy), ("NCMMetadata (slots)", build_records),
+                        ("FrozenNCMMetadata", build_frozen), ("MetadataTable", build_table)):
+        collection, retained, elapsed = measure_memory(build)
+        filter_seconds, sort_seconds = time_queries(collection)
+        print(f"{name:<24}{retained / 1024 / 1024:>14.1f}{retained / count:>12.0f}{elapsed:>10.2f}"
+              f"{filter_seconds * 1000:>12.1f}{sort_seconds * 1000:>10.1f}")
+        collection = None  # 构建下一种表示之前释放，避免计入其内存
+
+
+def main():
+    parser = ArgumentParser(description="Metadata memory and filtering benchmark\t元数据内存占用与筛选排序基准测试")
+    parser.add_argument("-n", "--count", type=int, default=100_000, help="Record count\t记录数")
+    parser.add_argument("--artists", type=int, default=2_000, help="Distinct artists\t不同歌手数")
+    parser.add_argument("--albums", type=int, default=10_000, help="Distinct albums\t不同专辑数")
+    args = parser.parse_args()
+    run(args.count, args.artists, args.albums)
+
+
+if __name__ == "__main__":
+    main()
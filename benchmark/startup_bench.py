@@ -0,0 +1,110 @@
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmark.corpus import generate_track
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CLI_PATH = PROJECT_ROOT / "cli.py"
+
+"""
+命令名称 -> 该命令不应加载的模块前缀
+"""
+FORBIDDEN_IMPORTS: Dict[str, Tuple[str, ...]] = {
+    "help": ("mutagen", "Crypto", "session", "multiprocessing", "concurrent"),
+    "preview": ("mutagen", "multiprocessing", "concurrent"),
+    "export": ("multiprocessing", "concurrent"),
+}
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """解析 -X importtime 的输出：import time: self [us] | cumulative | imported package"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        records.append(ImportRecord(parts[2].strip(), int(parts[0]), int(parts[1])))
+    return records
+
+
+def run_once(cli_args: List[str], importtime: bool = False) -> Tuple[float, str]:
+    flags = ["-X", "importtime"] if importtime else []
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, *flags, str(CLI_PATH), *cli_args],
+                               capture_output=True, text=True, cwd=PROJECT_ROOT)
+    return time.perf_counter() - start, completed.stderr
+
+
+def bench_command(name: str, cli_args: List[str], repeat: int) -> Dict:
+    """计时使用不带 -X importtime 的运行，导入明细取自额外一次带 -X importtime 的运行"""
+    walls = [run_once(cli_args)[0] for _ in range(repeat)]
+    records = parse_importtime(run_once(cli_args, importtime=True)[1])
+
+    top_level = [r for r in records if not r.module.startswith(" ")]
+    slowest = sorted(top_level, key=lambda r: r.cumulative_us, reverse=True)[:8]
+    loaded = {r.module.strip() for r in records}
+    forbidden = sorted(m for m in loaded
+                       if any(m == p or m.startswith(p + ".") for p in FORBIDDEN_IMPORTS.get(name, ())))
+
+    return {
+        "command": name,
+        "median_ms": statistics.median(walls) * 1000,
+        "min_ms": min(walls) * 1000,
+        "import_ms": sum(r.self_us for r in records) / 1000,
+        "slowest": [(r.module.strip(), r.cumulative_us / 1000) for r in slowest],
+        "forbidden": forbidden,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="CLI cold start benchmark based on -X importtime\tCLI 冷启动基准测试")
+    parser.add_argument("-r", "--repeat", type=int, default=10, help="Runs per command\t每个命令运行次数")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Median wall time budget\t启动耗时预算")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="ncm_startup_") as tmp:
+        track = generate_track(0, 64 * 1024, "mp3", cover_dimension=0)
+        ncm_path = Path(tmp) / "startup.ncm"
+        ncm_path.write_bytes(track.ncm_bytes)
+
+        commands = {
+            "help": ["--help"],
+            "preview": [str(ncm_path), "-p"],
+            "export": [str(ncm_path), "-o", str(Path(tmp) / "startup.mp3")],
+        }
+        for name, cli_args in commands.items():
+            result = bench_command(name, cli_args, args.repeat)
+            print(f"{name:<8} median {result['median_ms']:7.1f} ms  min {result['min_ms']:7.1f} ms  "
+                  f"imports {result['import_ms']:7.1f} ms")
+            for module, cumulative_ms in result["slowest"]:
+                print(f"    {module:<40}{cumulative_ms:8.1f} ms")
+
+            if result["forbidden"]:
+                failed = True
+                print(f"    !! unexpected imports: {', '.join(result['forbidden'])}")
+            if name != "export" and result["median_ms"] > args.budget_ms:
+                failed = True
+                print(f"    !! over budget ({args.budget_ms:.0f} ms)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import builtins
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    name: str
+    open_latency: float = 0.0  # 每次打开文件的延迟（秒）
+    op_latency: float = 0.0  # 每次读/写/定位操作的延迟（秒）
+    bandwidth: float = 0.0  # 读写带宽（字节/秒），0 表示不限速
+
+
+PROFILES: Dict[str, StorageProfile] = {
+    "local": StorageProfile("local"),
+    "nas": StorageProfile("nas", open_latency=0.004, op_latency=0.001, bandwidth=110 * 1024 * 1024),
+    "slow-nas": StorageProfile("slow-nas", open_latency=0.015, op_latency=0.004, bandwidth=30 * 1024 * 1024),
+}
+
+
+class ThrottledFile:
+    """
+    File wrapper that injects latency and caps bandwidth to simulate network storage.
+    为文件对象注入延迟并限制带宽，用于模拟网络存储。
+    """
+    def __init__(self, raw, profile: StorageProfile):
+        self._raw = raw
+        self._profile = profile
+        time.sleep(profile.open_latency)
+
+    def _throttle(self, size: int):
+        delay = self._profile.op_latency
+        if self._profile.bandwidth and size:
+            delay += size / self._profile.bandwidth
+        if delay:
+            time.sleep(delay)
+
+    def read(self, size: int = -1):
+        data = self._raw.read(size)
+        self._throttle(len(data))
+        return data
+
+    def write(self, data):
+        written = self._raw.write(data)
+        self._throttle(len(data))
+        return written
+
+    def seek(self, offset: int, whence: int = 0):
+        self._throttle(0)
+        return self._raw.seek(offset, whence)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._raw.close()
+
+
+def install(profile_name: str, *modules) -> None:
+    """
+    Route open() calls of the session module through ThrottledFile. Usable as a worker initializer.
+    将会话模块中的 open() 替换为限速版本，可直接用作子进程初始化函数。
+    """
+    import session.decryption_session
+
+    profile = PROFILES[profile_name]
+    targets = modules or (session.decryption_session,)
+
+    def throttled_open(file, mode="r", *args, **kwargs):
+        raw = builtins.open(file, mode, *args, **kwargs)
+        if "b" not in mode or profile == PROFILES["local"]:
+            return raw
+        return ThrottledFile(raw, profile)
+
+    for module in targets:
+        module.open = throttled_open
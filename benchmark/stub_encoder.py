@@ -0,0 +1,40 @@
+import hashlib
+import sys
+import time
+from argparse import ArgumentParser
+
+"""
+替身编码器：不依赖 ffmpeg 等外部工具，用于验证与测量 FormatConverter 的管道开销。
+从标准输入读取音频，向标准输出写出 "STUB<format>\\n" 头、原始数据与其 sha256，可选地模拟编码耗时或失败。
+
+用法：python cli.py track.ncm -f opus --encoder "python -m benchmark.stub_encoder --format {format}"
+"""
+READ_SIZE = 64 * 1024
+
+
+def main():
+    parser = ArgumentParser(description="Pass-through encoder stand-in\t替身编码器")
+    parser.add_argument("--format", type=str, default="raw", help="Format tag written to the header\t输出头中的格式名")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Seconds to sleep per MiB, simulating encoder cost\t每 MiB 模拟的编码耗时（秒）")
+    parser.add_argument("--fail", action="store_true", help="Exit with an error after reading input\t读取输入后以错误退出")
+    args = parser.parse_args()
+
+    digest = hashlib.sha256()
+    stdout = sys.stdout.buffer
+    stdout.write(f"STUB{args.format}\n".encode())
+    while data := sys.stdin.buffer.read(READ_SIZE):
+        digest.update(data)
+        stdout.write(data)
+        if args.delay:
+            time.sleep(args.delay * len(data) / (1024 * 1024))
+
+    if args.fail:
+        print("stub encoder: simulated failure", file=sys.stderr)
+        sys.exit(1)
+    stdout.write(digest.hexdigest().encode())
+    stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
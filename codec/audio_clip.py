@@ -0,0 +1,399 @@
+import math
+import re
+from typing import Iterable, List, NamedTuple, Optional
+
+from domain.exceptions import NCMExportException
+from domain.models import ClipOptions
+
+"""
+截取片段时每次读取的分块上限：片段通常只有几 MB，较小的分块使读取量尽量接近切点
+"""
+CLIP_READ_SIZE = 256 * 1024
+
+MP3_FRAME_SCAN_LIMIT = 64 * 1024  # 在音频开头的多少字节内寻找第一个 MP3 帧
+
+_MP3_BITRATES = {  # (MPEG1, layer) / (MPEG2 与 2.5, layer) -> 码率表（kbps），下标为帧头中的码率编号
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_LAME_ENCODERS = (b"LAME", b"Lavf", b"Lavc", b"GOGO")
+
+_FLAC_SYNC = re.compile(b"\xff[\xf8\xf9]")
+_FLAC_STREAMINFO, _FLAC_SEEKTABLE, _FLAC_CUESHEET = 0, 3, 5
+_FLAC_MAX_HEADER = 16
+
+
+def _crc_table(poly: int, reflected: bool) -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte if reflected else byte << 8
+        for _ in range(8):
+            if reflected:
+                crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+            else:
+                crc = ((crc << 1) ^ poly) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC8_TABLE = [value >> 8 for value in _crc_table(0x07 << 8, False)]  # FLAC 帧头 CRC-8，多项式 0x07
+_CRC16_TABLE = _crc_table(0xA001, True)  # LAME 标签 CRC-16（多项式 0x8005 的反射形式）
+
+
+def _crc8(data: bytes) -> int:
+    crc = 0
+    for b in data:
+        crc = _CRC8_TABLE[crc ^ b]
+    return crc
+
+
+def _crc16(data: bytes) -> int:
+    crc = 0
+    for b in data:
+        crc = (crc >> 8) ^ _CRC16_TABLE[(crc ^ b) & 0xFF]
+    return crc
+
+
+class _ChunkBuffer:
+    """按需从分块迭代器中读取数据，切点确定后不再读取后面的分块"""
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self.data = bytearray()
+        self.exhausted = False
+
+    def fill(self, size: int) -> bool:
+        """确保至少缓存 size 字节，数据不足时返回 False"""
+        while len(self.data) < size and not self.exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.exhausted = True
+            else:
+                self.data += chunk
+        return len(self.data) >= size
+
+    def grow(self) -> bool:
+        """再读取一个分块，已读完时返回 False"""
+        return self.fill(len(self.data) + 1)
+
+    def drain(self) -> bytes:
+        """读取剩余全部数据：片段长度超过整首音频时原样返回"""
+        while self.grow():
+            pass
+        return self.data
+
+    def close(self) -> None:
+        # 关闭生成器，提前释放文件句柄
+        close = getattr(self._chunks, "close", None)
+        if close:
+            close()
+
+
+def _id3v2_size(head: bytes) -> int:
+    """音频开头 ID3v2 标签的总长度（含头部与尾部），没有标签时为 0"""
+    if len(head) < 10 or not head.startswith(b"ID3"):
+        return 0
+    size = 0
+    for b in head[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+class _MP3Frame(NamedTuple):
+    mpeg1: bool
+    layer: int
+    sample_rate: int
+    samples: int  # 每帧采样数
+    size: int  # 帧长度（字节）
+    side_info: int  # Layer III 边信息长度，Xing / Info 头紧随其后
+
+
+def _parse_mp3_frame(header: bytes) -> Optional[_MP3Frame]:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 3
+    layer = 4 - ((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    # 保留值与自由码率（无法从帧头得出帧长）都视为非法帧头
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        samples, size = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        size = samples // 8 * bitrate // sample_rate + padding
+    mono = header[3] >> 6 == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    return _MP3Frame(mpeg1, layer, sample_rate, samples, size, side_info)
+
+
+def _same_stream(a: _MP3Frame, b: _MP3Frame) -> bool:
+    return a.mpeg1 == b.mpeg1 and a.layer == b.layer and a.sample_rate == b.sample_rate
+
+
+def _find_mp3_start(buffer: _ChunkBuffer, start: int) -> Optional[int]:
+    """寻找第一个 MP3 帧：帧头合法且下一帧帧头与之一致，避免把标签后的填充或杂数据误认为帧"""
+    buffer.fill(start + MP3_FRAME_SCAN_LIMIT)
+    position = buffer.data.find(b"\xff", start)
+    while 0 <= position < start + MP3_FRAME_SCAN_LIMIT:
+        frame = _parse_mp3_frame(bytes(buffer.data[position:position + 4]))
+        if frame:
+            buffer.fill(position + frame.size + 4)
+            following = _parse_mp3_frame(bytes(buffer.data[position + frame.size:position + frame.size + 4]))
+            if following and _same_stream(frame, following):
+                return position
+        position = buffer.data.find(b"\xff", position + 1)
+    return None
+
+
+def _update_mp3_info(clip: bytearray, first: int, frame: _MP3Frame, offsets: List[int]) -> None:
+    """
+    Rewrite the Xing/Info (and LAME) or VBRI header in the first frame so players report the clip's duration.
+    改写第一帧中的 Xing / Info（及 LAME）或 VBRI 头，使播放器按片段计算时长。
+
+    :param offsets: List[int] 片段中各帧的起始位置（含信息帧）
+    """
+    audio_frames = len(offsets) - 1
+    stream_size = len(clip) - first
+    xing = first + 4 + frame.side_info
+    if bytes(clip[xing:xing + 4]) in (b"Xing", b"Info"):
+        flags = int.from_bytes(clip[xing + 4:xing + 8], "big")
+        position = xing + 8
+        if flags & 1:
+            clip[position:position + 4] = audio_frames.to_bytes(4, "big")
+            position += 4
+        if flags & 2:
+            clip[position:position + 4] = stream_size.to_bytes(4, "big")
+            position += 4
+        if flags & 4:
+            # 跳转表：第 i 项为 i% 时长处的帧在流中的相对位置（按 256 等分）
+            for i in range(100):
+                offset = offsets[1 + i * audio_frames // 100] - first if audio_frames else 0
+                clip[position + i] = min(255, offset * 256 // stream_size)
+            position += 100
+        if flags & 8:
+            position += 4
+
+        lame = position
+        if bytes(clip[lame:lame + 4]) in _LAME_ENCODERS and lame + 36 <= first + frame.size:
+            # 末尾补零的采样数清零（片段末帧是完整音频），更新音乐长度并重新计算标签 CRC
+            delays = int.from_bytes(clip[lame + 21:lame + 24], "big") & 0xFFF000
+            clip[lame + 21:lame + 24] = delays.to_bytes(3, "big")
+            clip[lame + 28:lame + 32] = stream_size.to_bytes(4, "big")
+            clip[lame + 34:lame + 36] = _crc16(bytes(clip[first:lame + 34])).to_bytes(2, "big")
+        return
+
+    vbri = first + 4 + 32
+    if bytes(clip[vbri:vbri + 4]) == b"VBRI":
+        clip[vbri + 10:vbri + 14] = stream_size.to_bytes(4, "big")
+        clip[vbri + 14:vbri + 18] = audio_frames.to_bytes(4, "big")
+        clip[vbri + 18:vbri + 20] = b"\x00\x00"  # 跳转表指向原曲位置，清空表项
+
+
+def _is_info_frame(data: bytearray, first: int, frame: _MP3Frame) -> bool:
+    xing = first + 4 + frame.side_info
+    return bytes(data[xing:xing + 4]) in (b"Xing", b"Info") or bytes(data[first + 36:first + 40]) == b"VBRI"
+
+
+def _clip_mp3(buffer: _ChunkBuffer, start: int, options: ClipOptions) -> Optional[bytes]:
+    first = _find_mp3_start(buffer, start)
+    if first is None:
+        return None
+
+    first_frame = _parse_mp3_frame(bytes(buffer.data[first:first + 4]))
+    buffer.fill(first + first_frame.size)
+    info_frame = _is_info_frame(buffer.data, first, first_frame)
+    target = math.ceil(options.seconds * first_frame.sample_rate) if options.seconds > 0 else 0
+
+    offsets = []
+    samples = 0
+    position = first
+    while not target or samples < target:
+        if not buffer.fill(position + 4):
+            return buffer.drain()
+        frame = _parse_mp3_frame(bytes(buffer.data[position:position + 4]))
+        if frame is None or not _same_stream(frame, first_frame):
+            # 帧序列结束（ID3v1 / APE 标签或尾部数据）：片段覆盖了整首音频
+            return buffer.drain()
+        if options.max_bytes and position + frame.size > options.max_bytes and len(offsets) > info_frame:
+            break
+        if offsets or not info_frame:
+            samples += frame.samples
+        offsets.append(position)
+        position += frame.size
+
+    # 最后一帧可能尚未完整读入；之后就地截断并改写缓冲区，片段不再复制
+    buffer.fill(position)
+    clip = buffer.data
+    del clip[position:]
+    if info_frame:
+        _update_mp3_info(clip, first, first_frame, offsets)
+    return clip
+
+
+class _FLACFrame(NamedTuple):
+    first_sample: int
+    block_size: int
+    variable: bool
+
+
+def _read_utf8_number(data: bytes, position: int) -> Optional[tuple]:
+    """读取 FLAC 帧头中类 UTF-8 编码的帧号 / 采样号，返回（值，结束位置）"""
+    lead = data[position]
+    if lead < 0x80:
+        return lead, position + 1
+    length = 8 - (lead ^ 0xFF).bit_length()  # 开头连续 1 的个数
+    if not 2 <= length <= 7:
+        return None
+    value = lead & (0x7F >> length)
+    for b in data[position + 1:position + length]:
+        if b & 0xC0 != 0x80:
+            return None
+        value = (value << 6) | (b & 0x3F)
+    return value, position + length
+
+
+def _parse_flac_frame(data: bytes, fixed_block_size: int) -> Optional[_FLACFrame]:
+    """解析以同步码开头的 FLAC 帧头并校验 CRC-8，data 为候选位置开始的 _FLAC_MAX_HEADER 字节"""
+    if len(data) < _FLAC_MAX_HEADER or data[0] != 0xFF or data[1] not in (0xF8, 0xF9):
+        return None
+    block_code, rate_code = data[2] >> 4, data[2] & 0x0F
+    if block_code == 0 or rate_code == 15 or data[3] >> 4 >= 11 or data[3] & 1:
+        return None
+    number = _read_utf8_number(data, 4)
+    if number is None:
+        return None
+    value, position = number
+
+    if block_code == 6:
+        block_size, position = data[position] + 1, position + 1
+    elif block_code == 7:
+        block_size, position = int.from_bytes(data[position:position + 2], "big") + 1, position + 2
+    elif block_code == 1:
+        block_size = 192
+    elif block_code <= 5:
+        block_size = 576 << (block_code - 2)
+    else:
+        block_size = 256 << (block_code - 8)
+    position += {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+
+    if position >= len(data) or _crc8(data[:position]) != data[position]:
+        return None
+    variable = bool(data[1] & 1)
+    return _FLACFrame(value if variable else value * fixed_block_size, block_size, variable)
+
+
+def _clip_flac(buffer: _ChunkBuffer, start: int, options: ClipOptions) -> bytes:
+    # 元数据块：STREAMINFO 中的总采样数改为片段采样数，MD5 置零（表示未知）；跳转表与 CUE 表指向原曲位置，丢弃
+    blocks = []
+    position = start + 4
+    while True:
+        if not buffer.fill(position + 4):
+            raise NCMExportException("FLAC 元数据不完整，无法截取片段")
+        block_type = buffer.data[position] & 0x7F
+        length = int.from_bytes(buffer.data[position + 1:position + 4], "big")
+        if not buffer.fill(position + 4 + length):
+            raise NCMExportException("FLAC 元数据不完整，无法截取片段")
+        blocks.append((block_type, bytes(buffer.data[position + 4:position + 4 + length])))
+        last = buffer.data[position] & 0x80
+        position += 4 + length
+        if last:
+            break
+    if blocks[0][0] != _FLAC_STREAMINFO or len(blocks[0][1]) < 34:
+        raise NCMExportException("缺少 FLAC STREAMINFO，无法截取片段")
+
+    stream_info = blocks[0][1]
+    fixed_block_size = int.from_bytes(stream_info[2:4], "big")
+    sample_rate = int.from_bytes(stream_info[10:13], "big") >> 4
+    target = math.ceil(options.seconds * sample_rate) if options.seconds > 0 else 0
+
+    frames_start = position
+    buffer.fill(position + _FLAC_MAX_HEADER)
+    frame = _parse_flac_frame(bytes(buffer.data[position:position + _FLAC_MAX_HEADER]), fixed_block_size)
+    if frame is None:
+        raise NCMExportException("未找到 FLAC 音频帧，无法截取片段")
+
+    kept = 0
+    while not target or frame.first_sample < target:
+        # 下一帧从下一个帧头开始：同步码、CRC-8 正确且帧号 / 采样号与当前帧衔接
+        expected = frame.first_sample + frame.block_size
+        search = position + 2
+        following = None
+        while following is None:
+            match = _FLAC_SYNC.search(buffer.data, search)
+            if match is None:
+                search = max(search, len(buffer.data) - 1)
+                if not buffer.grow():
+                    return buffer.data  # 最后一帧：片段覆盖了整首音频
+                continue
+            candidate = match.start()
+            buffer.fill(candidate + _FLAC_MAX_HEADER)
+            parsed = _parse_flac_frame(bytes(buffer.data[candidate:candidate + _FLAC_MAX_HEADER]), fixed_block_size)
+            if parsed and parsed.variable == frame.variable and parsed.first_sample == expected:
+                following = (candidate, parsed)
+            else:
+                search = candidate + 1
+        if options.max_bytes and following[0] > options.max_bytes and kept:
+            break
+        position, frame = following
+        kept += 1
+
+    if not kept:
+        raise NCMExportException("FLAC 片段为空")
+    clip_samples = frame.first_sample
+    fields = int.from_bytes(stream_info[10:18], "big")
+    fields = (fields & ~((1 << 36) - 1)) | clip_samples
+    blocks[0] = (_FLAC_STREAMINFO, stream_info[:10] + fields.to_bytes(8, "big") + bytes(16) + stream_info[34:])
+
+    blocks = [block for block in blocks if block[0] not in (_FLAC_SEEKTABLE, _FLAC_CUESHEET)]
+    metadata = bytearray(b"fLaC")
+    for index, (block_type, body) in enumerate(blocks):
+        last = 0x80 if index == len(blocks) - 1 else 0
+        metadata += bytes([last | block_type]) + len(body).to_bytes(3, "big") + body
+    clip = buffer.data
+    del clip[position:]
+    clip[start:frames_start] = metadata
+    return clip
+
+
+def clip_audio(chunks: Iterable[bytes], options: ClipOptions) -> bytes:
+    """
+    Cut decrypted MP3 or FLAC audio after the first options.seconds and/or options.max_bytes, on a frame
+    boundary. Leading ID3 tags and FLAC metadata are kept and the header fields describing the stream length
+    (Xing/LAME/VBRI, STREAMINFO) are rewritten for the clip. Chunks are consumed only up to the cut.
+    If the whole track fits into the clip it is returned unchanged.
+    在帧边界处截取解密后的 MP3 / FLAC 音频的前 options.seconds 秒和 / 或前 options.max_bytes 字节。保留音频开头的
+    ID3 标签与 FLAC 元数据，并按片段改写描述流长度的字段（Xing / LAME / VBRI、STREAMINFO）。只读取到切点所在的分块为止；
+    整首音频都在片段范围内时原样返回。
+
+    :param chunks: Iterable[bytes] 从音频开头开始的解密分块
+    :param options: ClipOptions 时长与大小上限，至少保留一帧
+    :return: bytes 片段
+    :raise: NCMExportException 无法识别音频格式
+    """
+    if options.seconds <= 0 and options.max_bytes <= 0:
+        return b"".join(chunks)
+
+    buffer = _ChunkBuffer(chunks)
+    try:
+        buffer.fill(10)
+        start = _id3v2_size(bytes(buffer.data[:10]))
+        buffer.fill(start + 4)
+        if bytes(buffer.data[start:start + 4]) == b"fLaC":
+            return _clip_flac(buffer, start, options)
+        clip = _clip_mp3(buffer, start, options)
+        if clip is None:
+            raise NCMExportException("只支持截取 MP3 与 FLAC 音频的片段")
+        return clip
+    finally:
+        buffer.close()
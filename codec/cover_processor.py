@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from domain.models import CoverOptions
+
+
+class CoverProcessor:
+    """
+    Resize covers to a maximum dimension and re-encode them as JPEG with Pillow before they are embedded.
+    Results are cached by the sha256 of the source cover, in memory per process and optionally in a
+    directory shared by all worker processes, so each album cover is processed once per batch.
+    使用 Pillow 将封面缩放到最大边长并重新编码为 JPEG，再嵌入输出文件。处理结果按源封面 sha256 缓存：
+    进程内存缓存之外，还可使用所有子进程共享的缓存目录，使同一专辑封面在一次批量任务中只处理一次。
+    """
+    def __init__(self, options: CoverOptions, max_entries: int = 128):
+        """
+        :param options: CoverOptions 最大边长、JPEG 质量与共享缓存目录
+        :param max_entries: int 内存中最多缓存的封面数量
+        """
+        self.options = options
+        self.max_entries = max_entries
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_path(self, digest: str) -> Optional[Path]:
+        if not self.options.cache_dir:
+            return None
+        return Path(self.options.cache_dir) / f"{digest}_{self.options.max_dimension}_{self.options.quality}.jpg"
+
+    def _remember(self, digest: str, data: bytes) -> None:
+        with self._lock:
+            self._cache[digest] = data
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def process(self, cover_bytes: bytes) -> bytes:
+        """
+        Return the processed cover, or the original bytes when it cannot be decoded or would not shrink.
+        返回处理后的封面；无法解码或处理后不会变小时返回原始数据。
+        """
+        if not cover_bytes:
+            return cover_bytes
+
+        digest = hashlib.sha256(cover_bytes).hexdigest()
+        with self._lock:
+            if (cached := self._cache.get(digest)) is not None:
+                self._cache.move_to_end(digest)
+                return cached
+
+        cache_path = self._cache_path(digest)
+        if cache_path is not None and cache_path.is_file():
+            result = cache_path.read_bytes()
+        else:
+            result = self.recompress(cover_bytes)
+            if cache_path is not None:
+                # 写入临时文件后改名，其他进程不会读到不完整的结果
+                temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+                try:
+                    temp_path.write_bytes(result)
+                    temp_path.replace(cache_path)
+                except OSError:
+                    pass
+
+        self._remember(digest, result)
+        return result
+
+    def recompress(self, cover_bytes: bytes) -> bytes:
+        from PIL import Image, UnidentifiedImageError
+
+        max_dimension = self.options.max_dimension
+        try:
+            with Image.open(io.BytesIO(cover_bytes)) as image:
+                source_format = image.format
+                original_size = image.size
+                if max_dimension:
+                    # JPEG 可在解码时按 1/2、1/4、1/8 缩小，避免完整解码超大封面
+                    image.draft("RGB", (max_dimension, max_dimension))
+                image = image.convert("RGB")
+                if max_dimension and max(image.size) > max_dimension:
+                    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+                output = io.BytesIO()
+                image.save(output, "JPEG", quality=self.options.quality, optimize=True)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+            # 无法识别或像素数超出 Pillow 安全上限（可能是恶意构造）的封面原样保留，不中断导出
+            return cover_bytes
+
+        result = output.getvalue()
+        resized = max_dimension and max(original_size) > max_dimension
+        # 尺寸未变且重新编码后没有变小时保留原图，避免无意义的二次有损压缩
+        if source_format == "JPEG" and not resized and len(result) >= len(cover_bytes):
+            return cover_bytes
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_cover_processor(options: CoverOptions) -> CoverProcessor:
+    """每个进程每组选项只创建一个 CoverProcessor，使同一批任务共用其内存缓存"""
+    return CoverProcessor(options)
@@ -0,0 +1,121 @@
+import shlex
+import subprocess
+import threading
+from typing import BinaryIO, Iterable, List, Tuple
+
+from domain.exceptions import NCMException, NCMExportException
+from domain.models import TranscodeOptions
+
+"""
+编码器命令预设：从标准输入读取任意格式音频，向标准输出写出目标格式。
+命令中的 {format} 与 {bitrate} 会被替换为 TranscodeOptions 中的值。
+"""
+_FFMPEG = ("ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-map", "0:a", "-vn")
+ENCODER_PRESETS = {
+    "mp3": _FFMPEG + ("-c:a", "libmp3lame", "-b:a", "{bitrate}", "-f", "mp3", "pipe:1"),
+    "opus": _FFMPEG + ("-c:a", "libopus", "-b:a", "{bitrate}", "-f", "opus", "pipe:1"),
+    "ogg": _FFMPEG + ("-c:a", "libvorbis", "-b:a", "{bitrate}", "-f", "ogg", "pipe:1"),
+    "flac": _FFMPEG + ("-c:a", "flac", "-f", "flac", "pipe:1"),
+}
+
+STDERR_TAIL_SIZE = 4096
+
+
+def parse_command(command: str) -> Tuple[str, ...]:
+    """将命令行字符串拆分为参数元组，如 "lame --silent -b {bitrate} - -" """
+    return tuple(shlex.split(command))
+
+
+class FormatConverter:
+    """
+    Format-conversion stage that pipes decrypted audio through an external encoder (ffmpeg, lame, flac...).
+    Audio chunks are written to the encoder's stdin from a feeder thread while its stdout is copied into
+    the output stream, so no intermediate decrypted file is created. At most max_encoders encoder
+    processes run at the same time per converter.
+    格式转换阶段：将解密后的音频经标准输入送入外部编码器，并把编码器的标准输出写入目标流，不产生中间文件。
+    同一转换器同时运行的编码器进程数不超过 max_encoders。
+    """
+    def __init__(self, options: TranscodeOptions, max_encoders: int = 1, read_size: int = 1024 * 1024):
+        """
+        :param options: TranscodeOptions 目标格式、码率与自定义命令
+        :param max_encoders: int 最大并发编码器进程数
+        :param read_size: int 每次从编码器输出读取的字节数
+        """
+        self.options = options
+        self.read_size = read_size
+        self._slots = threading.BoundedSemaphore(max(1, max_encoders))
+
+    def build_command(self) -> List[str]:
+        template = self.options.command or ENCODER_PRESETS.get(self.options.target_format)
+        if not template:
+            raise NCMExportException(f"没有可用于 {self.options.target_format} 格式的编码器预设，请指定编码器命令")
+        return [arg.format(format=self.options.target_format, bitrate=self.options.bitrate) for arg in template]
+
+    def transcode(self, chunks: Iterable[bytes], output: BinaryIO) -> int:
+        """
+        Feed audio chunks to an encoder process and copy the encoded result into output.
+        将音频分块送入编码器进程，并把编码结果写入 output。
+
+        :param chunks: Iterable[bytes] 解密后的源音频分块
+        :param output: BinaryIO 输出流
+        :return: int 写出的编码后字节数
+        :raise: NCMExportException 编码器不存在、异常退出或写出失败
+        """
+        command = self.build_command()
+        with self._slots:
+            try:
+                process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE)
+            except OSError as e:
+                raise NCMExportException(f"无法启动编码器 {command[0]}：{e}")
+
+            feed_error: List[BaseException] = []
+            stderr_tail = bytearray()
+
+            def feed():
+                try:
+                    for chunk in chunks:
+                        process.stdin.write(chunk)
+                except BrokenPipeError:
+                    pass  # 编码器提前退出，由退出码报告错误
+                except BaseException as e:
+                    feed_error.append(e)
+                finally:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+
+            def drain_stderr():
+                # 持续读取标准错误，避免编码器因管道写满而阻塞；只保留末尾部分用于报错
+                for line in process.stderr:
+                    stderr_tail.extend(line)
+                    del stderr_tail[:-STDERR_TAIL_SIZE]
+
+            threads = [threading.Thread(target=feed, name="ncm-encoder-feed", daemon=True),
+                       threading.Thread(target=drain_stderr, name="ncm-encoder-stderr", daemon=True)]
+            for thread in threads:
+                thread.start()
+
+            written = 0
+            try:
+                while data := process.stdout.read(self.read_size):
+                    output.write(data)
+                    written += len(data)
+            except OSError as e:
+                process.kill()
+                raise NCMExportException(f"写出编码结果失败：{e}")
+            finally:
+                process.stdout.close()
+                return_code = process.wait()
+                for thread in threads:
+                    thread.join()
+
+            if feed_error:
+                error = feed_error[0]
+                raise error if isinstance(error, NCMException) else NCMExportException(f"读取音频失败：{error}")
+            if return_code != 0:
+                detail = stderr_tail.decode("utf-8", errors="replace").strip()
+                raise NCMExportException(f"编码器 {command[0]} 异常退出（返回值 {return_code}）：{detail}")
+            return written
+
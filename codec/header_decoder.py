@@ -0,0 +1,142 @@
+import binascii
+import json
+from typing import Any, List, Sequence, Union
+
+from Crypto.Cipher import AES
+
+from codec.ncm_codec import NCMCodec
+from domain.models import NCMHeader, NCMMetadata
+
+AES_BLOCK_SIZE = 16
+
+# 整字节异或查表，配合 bytes.translate 在C层完成批量异或
+_AUDIO_KEY_XOR_TABLE = bytes(b ^ NCMCodec.AUDIO_XOR_VALUE for b in range(256))
+_METADATA_XOR_TABLE = bytes(b ^ NCMCodec.METADATA_XOR_VALUE for b in range(256))
+
+
+def _unpad(data: bytes) -> bytes:
+    if not data:
+        raise ValueError("Empty data")
+    padding_length = data[-1]
+    if padding_length <= 0 or padding_length > 16:
+        raise ValueError("Invalid PKCS7 padding length")
+    return data[:-padding_length]
+
+
+class BatchHeaderDecoder:
+    """
+    Decode the key and metadata blocks of many NCM headers in one pass. The encrypted blobs are
+    concatenated, XORed with a single bytes.translate call and decrypted by one shared AES-ECB cipher
+    (ECB blocks are independent, so the concatenated plaintext splits back at the same offsets).
+    Results keep the input order; a blob that fails to decode yields its ValueError instead of a value,
+    with the same checks as NCMCodec.derive_key / decrypt_metadata. Each call creates its own cipher,
+    so batches may be decoded from several threads at once.
+    批量解码多个文件头中的密钥与元数据：密文拼接后一次性异或（bytes.translate），并由同一个 AES-ECB 对象一次解密
+    （ECB 各分组相互独立，拼接后的明文可按原偏移切分）。结果与输入顺序一致，解码失败的项以 ValueError 代替，
+    校验规则与 NCMCodec.derive_key / decrypt_metadata 相同。每次调用各自创建 AES 对象，可在多个线程中同时使用。
+    """
+
+    @classmethod
+    def derive_keys(cls, key_blobs: Sequence[bytes]) -> List[Union[bytes, ValueError]]:
+        """
+        Batch counterpart of NCMCodec.derive_key.
+        NCMCodec.derive_key 的批量版本。
+
+        :param key_blobs: Sequence[bytes] 每项为密钥长度与加密密钥（132字节）
+        :return: List[Union[bytes, ValueError]] RC4音频密钥或错误
+        """
+        results: List[Union[bytes, ValueError]] = [ValueError("Derive RC4 key failed")] * len(key_blobs)
+        valid_indexes = []
+        for index, blob in enumerate(key_blobs):
+            if len(blob) < 132:
+                results[index] = ValueError("Key related bytes length is less than 132")
+            elif int.from_bytes(blob[:4], byteorder="little") != 128:
+                results[index] = ValueError("Derive RC4 key failed：Key length is not 128")
+            else:
+                valid_indexes.append(index)
+
+        cipher_text = b"".join(key_blobs[index][4:132] for index in valid_indexes).translate(_AUDIO_KEY_XOR_TABLE)
+        plain_text = AES.new(NCMCodec.AUDIO_KEY, mode=AES.MODE_ECB).decrypt(cipher_text)
+
+        prefix_length = len(NCMCodec.AUDIO_KEY_PREFIX)
+        for position, index in enumerate(valid_indexes):
+            decrypted_raw = plain_text[position * 128:(position + 1) * 128]
+            try:
+                if not decrypted_raw.startswith(NCMCodec.AUDIO_KEY_PREFIX):
+                    raise ValueError("Metadata prefix is not correct")
+                results[index] = _unpad(decrypted_raw[prefix_length:])
+            except ValueError as e:
+                results[index] = ValueError(f"Derive RC4 key failed：{e}")
+        return results
+
+    @classmethod
+    def decrypt_metadata(cls, metadata_blobs: Sequence[bytes]) -> List[Union[dict, ValueError]]:
+        """
+        Batch counterpart of NCMCodec.decrypt_metadata.
+        NCMCodec.decrypt_metadata 的批量版本。
+
+        :param metadata_blobs: Sequence[bytes] 每项为加密元数据
+        :return: List[Union[dict, ValueError]] 元数据字典或错误
+        """
+        results: List[Union[dict, ValueError]] = [ValueError("Empty metadata")] * len(metadata_blobs)
+        xored = b"".join(metadata_blobs).translate(_METADATA_XOR_TABLE)
+
+        # 各项 base64 需单独解码（拼接后中间的填充符会截断解码），解码后的 AES 密文再拼接为一次解密
+        cipher_blocks = []
+        valid_indexes = []
+        offset = 0
+        prefix_length = len(NCMCodec.METADATA_PREFIX)
+        for index, blob in enumerate(metadata_blobs):
+            item = xored[offset:offset + len(blob)]
+            offset += len(blob)
+            try:
+                if not item:
+                    raise ValueError("Empty metadata")
+                if not item.startswith(NCMCodec.METADATA_PREFIX):
+                    raise ValueError("Metadata prefix is not correct")
+                try:
+                    aes_cipher_text = binascii.a2b_base64(item[prefix_length:])
+                except binascii.Error as e:
+                    raise ValueError(f"Decode base64 error: {e}")
+                if not aes_cipher_text or len(aes_cipher_text) % AES_BLOCK_SIZE:
+                    raise ValueError("Data must be aligned to block boundary in ECB mode")
+            except ValueError as e:
+                results[index] = ValueError(f"Decode JSON error: {e}")
+                continue
+            cipher_blocks.append(aes_cipher_text)
+            valid_indexes.append(index)
+
+        metadata_cipher = AES.new(NCMCodec.METADATA_KEY, mode=AES.MODE_ECB)
+        plain_text = memoryview(metadata_cipher.decrypt(b"".join(cipher_blocks)))
+        offset = 0
+        for cipher_block, index in zip(cipher_blocks, valid_indexes):
+            decrypted_raw = bytes(plain_text[offset:offset + len(cipher_block)])
+            offset += len(cipher_block)
+            try:
+                metadata_json = _unpad(decrypted_raw).decode("utf-8")
+                if "music:" in metadata_json:
+                    metadata_json = metadata_json.split("music:", 1)[1]
+                results[index] = json.loads(metadata_json)
+            except (ValueError, UnicodeDecodeError) as e:
+                results[index] = ValueError(f"Decode JSON error: {e}")
+        return results
+
+    @classmethod
+    def decode_metadata(cls, headers: Sequence[NCMHeader]) -> List[Union[NCMMetadata, ValueError]]:
+        """
+        Decrypt the metadata of many headers and build NCMMetadata objects.
+        批量解密文件头中的元数据并生成 NCMMetadata。
+
+        :param headers: Sequence[NCMHeader]
+        :return: List[Union[NCMMetadata, ValueError]]
+        """
+        return [item if isinstance(item, ValueError) else _load_metadata(item)
+                for item in cls.decrypt_metadata([header.metadata_data for header in headers])]
+
+
+def _load_metadata(data: Any) -> Union[NCMMetadata, ValueError]:
+    # 字段缺失或类型不符的元数据与解密失败一样作为单个文件的错误返回，不中断整组解码
+    try:
+        return NCMMetadata.load_from_dict(data)
+    except (TypeError, KeyError, AttributeError, IndexError, ValueError) as e:
+        return ValueError(f"Invalid metadata: {e}")
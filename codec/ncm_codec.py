@@ -8,6 +8,11 @@ from Crypto.Cipher import AES
 
 
 class NCMCodec:
+    """
+    Stateless codec: class attributes are immutable constants and every call creates its own AES object,
+    so all methods are safe to call from any number of threads (including free-threaded builds).
+    无状态编解码器：类属性均为不可变常量，每次调用各自创建 AES 对象，所有方法均可在多个线程中同时调用（包括无 GIL 构建）。
+    """
     AUDIO_KEY_HEX = "687A4852416D736F356B496E62617857"
     METADATA_KEY_HEX = "2331346C6A6B5F215C5D2630553C2728"
     AUDIO_KEY = bytes.fromhex(AUDIO_KEY_HEX)
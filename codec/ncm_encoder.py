@@ -0,0 +1,95 @@
+import base64
+import json
+import zlib
+
+from Crypto.Cipher import AES
+
+from codec.ncm_codec import NCMCodec
+
+
+class NCMEncoder:
+    """
+    Inverse of NCMCodec, used to build synthetic NCM files for benchmarks and round-trip checks.
+    NCMCodec 的逆运算，用于生成基准测试与往返校验所需的合成 NCM 文件。
+    """
+    KEY_GAP = b"\x00\x00"  # 文件头与密钥长度之间的2字节间隔
+    COVER_GAP = b"\x00" * 5  # CRC32 之后的5字节间隔
+
+    @staticmethod
+    def _pkcs7_pad(data: bytes) -> bytes:
+        padding_length = 16 - len(data) % 16
+        return data + bytes([padding_length]) * padding_length
+
+    @classmethod
+    def encrypt_key(cls, rc4_key: bytes) -> bytes:
+        """
+        Encrypt the RC4 key, inverse of NCMCodec.derive_key.
+        加密音频RC4密钥，结果包含4字节长度与128字节密文。
+
+        :param rc4_key: bytes 长度需在 95 ~ 110 字节之间，保证密文恰为128字节
+        :return: bytes
+        :raise: ValueError
+        """
+        plain = cls._pkcs7_pad(NCMCodec.AUDIO_KEY_PREFIX + rc4_key)
+        if len(plain) != 128:
+            raise ValueError("RC4 key length must be between 95 and 110")
+
+        cipher_text = AES.new(NCMCodec.AUDIO_KEY, mode=AES.MODE_ECB).encrypt(plain)
+        encrypted_key = bytes([b ^ NCMCodec.AUDIO_XOR_VALUE for b in cipher_text])
+        return len(encrypted_key).to_bytes(4, byteorder="little") + encrypted_key
+
+    @classmethod
+    def encrypt_metadata(cls, metadata: dict) -> bytes:
+        """
+        Encrypt the metadata dict, inverse of NCMCodec.decrypt_metadata.
+        加密元数据字典，结果不含4字节长度前缀。
+
+        :param metadata: dict
+        :return: bytes
+        """
+        metadata_json = "music:" + json.dumps(metadata, ensure_ascii=False)
+        plain = cls._pkcs7_pad(metadata_json.encode("utf-8"))
+        cipher_text = AES.new(NCMCodec.METADATA_KEY, mode=AES.MODE_ECB).encrypt(plain)
+        with_prefix = NCMCodec.METADATA_PREFIX + base64.b64encode(cipher_text)
+        return bytes([b ^ NCMCodec.METADATA_XOR_VALUE for b in with_prefix])
+
+    @staticmethod
+    def encrypt_audio(audio: bytes, rc4_key: bytes) -> bytes:
+        """
+        Encrypt audio data. The NCM RC4 variant is a plain XOR stream, so this mirrors decrypt_audio.
+        加密音频数据。NCM 的 RC4 变体为异或流，加密与解密互为逆运算。
+
+        :param audio: bytes
+        :param rc4_key: bytes
+        :return: bytes
+        """
+        return NCMCodec.decrypt_audio(audio, rc4_key)
+
+    @classmethod
+    def build_file(cls, rc4_key: bytes, metadata: dict, cover_bytes: bytes, audio: bytes) -> bytes:
+        """
+        Assemble a complete NCM file in the layout DecryptionSession reads.
+        按 DecryptionSession 读取的布局拼装完整的 NCM 文件。
+
+        :param rc4_key: bytes
+        :param metadata: dict
+        :param cover_bytes: bytes
+        :param audio: bytes 明文音频
+        :return: bytes
+        """
+        encrypted_metadata = cls.encrypt_metadata(metadata)
+        encrypted_audio = cls.encrypt_audio(audio, rc4_key) if audio else b""
+        crc32 = zlib.crc32(cover_bytes).to_bytes(4, byteorder="little")
+
+        return b"".join([
+            NCMCodec.NCM_HEADER,
+            cls.KEY_GAP,
+            cls.encrypt_key(rc4_key),
+            len(encrypted_metadata).to_bytes(4, byteorder="little"),
+            encrypted_metadata,
+            crc32,
+            cls.COVER_GAP,
+            len(cover_bytes).to_bytes(4, byteorder="little"),
+            cover_bytes,
+            encrypted_audio,
+        ])
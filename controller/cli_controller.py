@@ -1,11 +1,19 @@
+import contextlib
+import itertools
+import os
 import sys
+import time
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, List, TYPE_CHECKING
 
 from domain.exceptions import NCMException
-from domain.models import NCMMetadata
-from session.decryption_session import DecryptionSession
+
+# 模型、解码会话、批量引擎及其依赖（dataclasses、pycryptodome、mutagen、multiprocessing）
+# 按命令在方法内延迟导入，使 --help 等命令无需加载这些模块，缩短CLI冷启动时间
+if TYPE_CHECKING:
+    from domain.models import NCMMetadata, BatchResult, TranscodeOptions, CoverOptions, ClipOptions, ExportResult
+    from session.scheduler import ByteProgress
 
 
 class CLIPresenter:
@@ -37,6 +45,55 @@ class CLIPresenter:
         if "完成" in msg:
             print()
 
+    @staticmethod
+    def display_batch_result(result: BatchResult, finished: int, total: int,
+                             progress: Optional[ByteProgress] = None) -> None:
+        status = (result.message or "完成") if result.success else f"失败：{result.message}"
+        if progress is None:
+            print(f"[{finished}/{total}] {Path(result.input_path).name} -> {status}")
+            return
+
+        from session.scheduler import format_eta
+        eta = format_eta(progress.eta()) if finished < total else "已完成"
+        print(f"[{finished}/{total} {progress.fraction() * 100:5.1f}% {eta}] "
+              f"{Path(result.input_path).name} -> {status}")
+
+    @staticmethod
+    def display_verify_result(result: BatchResult, finished: int, total: int) -> None:
+        # 大批量检查时只逐条输出损坏的文件，正常文件仅刷新计数
+        if not result.success:
+            print(f"\r[{finished}/{total}] {result.input_path} -> 损坏：{result.message}")
+        elif finished == total or finished % 100 == 0:
+            sys.stdout.write(f"\r已检查 {finished}/{total}")
+            sys.stdout.flush()
+
+    @staticmethod
+    def display_verify_summary(results: List[BatchResult], elapsed: float) -> None:
+        healthy_count = sum(1 for r in results if r.success)
+        speed = len(results) / elapsed if elapsed > 0 else 0
+        print(f"\r检查结束：正常 {healthy_count} 个，损坏 {len(results) - healthy_count} 个，"
+              f"耗时 {elapsed:.2f} 秒（{speed:.0f} 个/秒）")
+
+    @staticmethod
+    def display_checksums(export: ExportResult) -> None:
+        for algorithm, digest in export.file_digests.items():
+            print(f"{algorithm}: {digest}（音频数据：{export.audio_digests[algorithm]}）")
+
+    @staticmethod
+    def display_queue_status(db_path: str, counts: Dict[str, int]) -> None:
+        print(f"工作队列 {db_path}：待处理 {counts['pending']}，处理中 {counts['leased']}，"
+              f"完成 {counts['done']}，失败 {counts['failed']}")
+
+    @staticmethod
+    def display_batch_summary(results: List[BatchResult], elapsed: float) -> None:
+        from domain.models import SKIPPED_MESSAGE
+
+        success_count = sum(1 for r in results if r.success)
+        skipped_count = sum(1 for r in results if r.success and r.message == SKIPPED_MESSAGE)
+        skipped = f"（其中 {skipped_count} 个已存在，跳过）" if skipped_count else ""
+        print(f"批量解码结束：成功 {success_count} 个{skipped}，失败 {len(results) - success_count} 个，"
+              f"耗时 {elapsed:.2f} 秒")
+
 
 class CLIArgParser:
     def __init__(self):
@@ -49,9 +106,11 @@ class CLIArgParser:
 
     def _setup_arguments(self):
         self._parser.add_argument(
-            "input_file",
+            "input_files",
             type=str,
-            help="Input file path\t输入文件路径"
+            nargs="*",
+            help="Input files, directories or zip/tar archives, - for stdin\t"
+                 "输入文件、文件夹或 zip/tar 压缩包路径（文件夹将递归扫描 .ncm 文件，- 表示标准输入）"
         )
         self._parser.add_argument(
             "-p", "--preview",
@@ -61,25 +120,357 @@ class CLIArgParser:
         self._parser.add_argument(
             "-o", "--output",
             type=str,
-            help="Output file path\t输出文件路径（可选，默认同级目录）"
+            help="Output file path, - for stdout\t输出文件路径（可选，默认同级目录；- 表示标准输出；批量模式下为输出目录）"
+        )
+        self._parser.add_argument(
+            "-j", "--jobs",
+            type=int,
+            help="Parallel jobs\t批量模式并行进程数（默认 1）；守护进程模式下为进程池大小（默认 CPU 核数）"
+        )
+        self._parser.add_argument(
+            "--chunk-size",
+            type=str,
+            help="Read/decrypt chunk size (e.g. 256K, 4M) or auto to tune it per storage device\t"
+                 "分块大小（默认 1M，如 256K、4M，须为256字节的倍数）；auto 表示按存储设备自动调节并记录结果"
+        )
+        self._parser.add_argument(
+            "--prefetch",
+            type=int,
+            metavar="N",
+            help="Prefetch headers and first audio chunks of the next N files in batch mode, 0 to disable\t"
+                 "批量模式下在后台预取接下来 N 个文件的文件头与音频开头（默认 4，0 表示关闭）"
+        )
+        self._parser.add_argument(
+            "--executor",
+            choices=["auto", "thread", "process"],
+            default="auto",
+            help="Worker pool for -j: threads on free-threaded builds, processes otherwise\t"
+                 "并行方式：auto（默认，无 GIL 的自由线程构建使用线程池，否则使用进程池）/ thread / process"
+        )
+        self._parser.add_argument(
+            "--memory-budget",
+            type=str,
+            metavar="SIZE",
+            help="Memory budget for all in-flight conversions (e.g. 512M); shrinks chunks, then holds back new files\t"
+                 "批量模式下全部在途任务的内存预算（如 512M、2G）：超出时先缩小分块，再暂缓提交新文件"
+        )
+        self._parser.add_argument(
+            "--skip-existing",
+            action="store_true",
+            help="Skip files whose output already exists, e.g. to resume an interrupted batch\t"
+                 "跳过输出文件已存在的文件，用于继续被中断的批量任务（输出总是先写入临时文件再改名，已存在的输出一定完整）"
+        )
+        self._parser.add_argument(
+            "--schedule",
+            choices=["auto", "input", "size", "location"],
+            default="auto",
+            help="Batch order: largest first to shorten parallel runs, or by directory/inode for spinning disks\t"
+                 "批量任务执行顺序：auto（默认，并行时大文件优先，否则按输入顺序）/ input / size（大文件优先）/ "
+                 "location（按目录与 inode，适合机械硬盘）"
+        )
+        self._parser.add_argument(
+            "-a", "--archive-output",
+            type=str,
+            help="Write all outputs into one zip/tar archive\t将全部输出直接写入一个 zip / tar 压缩包"
+        )
+        self._parser.add_argument(
+            "-f", "--format",
+            type=str,
+            help="Transcode to this format via an external encoder (mp3/opus/ogg/flac)\t"
+                 "经外部编码器转码为指定格式（mp3/opus/ogg/flac，默认使用 ffmpeg）"
+        )
+        self._parser.add_argument(
+            "--bitrate",
+            type=str,
+            default="320k",
+            help="Target bitrate for lossy formats\t有损格式的目标码率（默认 320k）"
+        )
+        self._parser.add_argument(
+            "--encoder",
+            type=str,
+            help="Custom encoder command reading stdin and writing stdout, {format}/{bitrate} are substituted\t"
+                 "自定义编码器命令（从标准输入读取、向标准输出写出，支持 {format} / {bitrate} 占位符）"
+        )
+        self._parser.add_argument(
+            "--clip",
+            type=float,
+            metavar="SECONDS",
+            help="Export only the first SECONDS of audio, cut on an MP3/FLAC frame boundary\t"
+                 "只导出开头 SECONDS 秒的片段（如曲库试听），在 MP3 / FLAC 帧边界处截断，只读取并解密所需的数据"
+        )
+        self._parser.add_argument(
+            "--clip-size",
+            type=str,
+            metavar="SIZE",
+            help="Export at most SIZE bytes of audio (e.g. 512K), cut on a frame boundary\t"
+                 "只导出不超过 SIZE（如 512K、1M）的开头片段，在帧边界处截断；与 --clip 同时指定时取较短者"
+        )
+        self._parser.add_argument(
+            "--cover-max-size",
+            type=int,
+            metavar="PX",
+            help="Resize embedded covers to at most PX pixels on the longer side\t"
+                 "嵌入前将封面缩放到最长边不超过 PX 像素并重新压缩为 JPEG"
+        )
+        self._parser.add_argument(
+            "--cover-quality",
+            type=int,
+            default=85,
+            help="JPEG quality of recompressed covers\t重新压缩封面的 JPEG 质量（1-95，默认 85）"
+        )
+        self._parser.add_argument(
+            "--checksum",
+            type=str,
+            metavar="ALGOS",
+            help="Hash outputs while writing them, comma-separated (sha256, md5, blake2b, xxh64...)\t"
+                 "导出时同时计算校验值，多个算法以逗号分隔（sha256 / md5 / blake2b / xxh64 等）"
+        )
+        self._parser.add_argument(
+            "--checksum-sidecar",
+            action="store_true",
+            help="Write <output>.<algorithm> checksum files\t为每个输出文件写出 <输出文件>.<算法> 校验文件"
+        )
+        self._parser.add_argument(
+            "--checksum-manifest",
+            type=str,
+            metavar="MANIFEST",
+            help="Write one checksum row per output to a .jsonl or .csv file\t将每个输出文件的校验值写入清单（.jsonl / .csv）"
+        )
+        self._parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Check files for corruption without exporting\t只检查文件是否损坏，不导出（校验文件头、密钥、元数据与音频开头）"
+        )
+        self._parser.add_argument(
+            "--export-metadata",
+            type=str,
+            metavar="CATALOG",
+            help="Write one metadata record per file to a .jsonl or .csv file, - for stdout\t"
+                 "将每个文件的元数据导出为一条记录（.jsonl / .csv，- 表示标准输出），只读取文件头"
+        )
+        self._parser.add_argument(
+            "--covers-only",
+            action="store_true",
+            help="Export only album covers, one per album, into the output directory\t"
+                 "只导出封面（按专辑与内容去重，输出到 -o 指定的目录，默认 ./covers）"
+        )
+        self._parser.add_argument(
+            "--queue",
+            type=str,
+            metavar="DB",
+            help="Shared SQLite work queue: enqueue the inputs, then convert leased batches until the queue is empty\t"
+                 "共享目录上的工作队列（SQLite）：加入输入文件后以租约逐批领取并转换，直到队列清空；多台机器可同时运行"
+        )
+        self._parser.add_argument(
+            "--queue-lease",
+            type=float,
+            default=300,
+            metavar="SECONDS",
+            help="Lease duration; leases of crashed workers are reclaimed after it expires\t"
+                 "租约时长（秒，默认 300），崩溃节点的任务在租约过期后被其他节点接管"
+        )
+        self._parser.add_argument(
+            "--queue-status",
+            action="store_true",
+            help="Show queue counts and exit (after enqueueing the inputs, if any)\t"
+                 "显示队列中各状态的文件数后退出（指定了输入文件时先加入队列，可用于只入队不转换）"
+        )
+        self._parser.add_argument(
+            "--queue-retry",
+            action="store_true",
+            help="Put failed queue entries back to pending\t将队列中失败的文件重新置为待处理"
+        )
+        daemon_group = self._parser.add_mutually_exclusive_group()
+        daemon_group.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Run the conversion daemon in the foreground\t在前台运行转换守护进程"
+        )
+        daemon_group.add_argument(
+            "--stop-daemon",
+            action="store_true",
+            help="Stop the running conversion daemon\t停止正在运行的转换守护进程"
+        )
+        daemon_group.add_argument(
+            "--no-daemon",
+            action="store_true",
+            help="Always convert in-process\t不使用守护进程，始终在当前进程中转换"
+        )
+        self._parser.add_argument(
+            "--socket",
+            type=str,
+            help="Daemon socket path\t守护进程套接字路径（默认读取 NCM_DAEMON_SOCKET 环境变量）"
         )
 
-    def parse(self) -> Namespace:
-        return self._parser.parse_args()
+    def parse(self, argv: Optional[List[str]] = None) -> Namespace:
+        args = self._parser.parse_args(argv)
+        if not args.input_files and not (args.daemon or args.stop_daemon or args.queue):
+            self._parser.error("the following arguments are required: input_files")
+        # 支持管道写法 `ncm - -`：第二个位置参数 - 视为标准输出
+        if len(args.input_files) == 2 and args.input_files[1] == "-" and not args.output:
+            args.input_files, args.output = args.input_files[:1], "-"
+        if "-" in args.input_files and len(args.input_files) > 1:
+            self._parser.error("stdin (-) cannot be combined with other inputs")
+        from session.chunk_tuner import parse_chunk_size
+        # 记录是否显式指定，显式指定时随请求发送给守护进程，否则使用守护进程启动时的分块大小
+        args.chunk_size_given = args.chunk_size is not None
+        try:
+            args.chunk_size = parse_chunk_size(args.chunk_size or "1M")
+        except (ValueError, KeyError):
+            self._parser.error("--chunk-size must be auto or a positive multiple of 256 (e.g. 256K, 4M)")
+        if args.memory_budget:
+            from session.memory_budget import parse_size
+            try:
+                args.memory_budget = parse_size(args.memory_budget)
+            except (ValueError, KeyError):
+                self._parser.error("--memory-budget must be a size such as 512M or 2G")
+        if args.clip is not None and args.clip <= 0:
+            self._parser.error("--clip must be positive")
+        if args.clip_size:
+            from session.memory_budget import parse_size
+            try:
+                args.clip_size = parse_size(args.clip_size)
+            except (ValueError, KeyError):
+                self._parser.error("--clip-size must be a size such as 512K or 1M")
+        if args.encoder and not args.format:
+            self._parser.error("--encoder requires --format")
+        if args.checksum_sidecar and (args.archive_output or args.output == "-"):
+            self._parser.error("--checksum-sidecar requires file outputs")
+        if args.skip_existing and args.archive_output:
+            self._parser.error("--skip-existing requires file outputs")
+        if args.cover_max_size is not None and args.cover_max_size <= 0:
+            self._parser.error("--cover-max-size must be positive")
+        if not 1 <= args.cover_quality <= 95:
+            self._parser.error("--cover-quality must be between 1 and 95")
+        return args
 
 
 class CLIController:
-    def __init__(self):
+    def __init__(self, argv: Optional[List[str]] = None):
         self._parser = CLIArgParser()
         self._presenter = CLIPresenter()
-        self._args: Optional[Namespace] = self._parser.parse()
+        self._args: Optional[Namespace] = self._parser.parse(argv)
+
+    def _is_batch(self) -> bool:
+        from session.archive_source import is_archive
+
+        input_path = self._args.input_files[0]
+        return len(self._args.input_files) > 1 or Path(input_path).is_dir() or is_archive(input_path)
+
+    def _is_streaming(self) -> bool:
+        return self._args.input_files == ["-"] or (self._args.output == "-" and not self._is_batch())
+
+    def _get_transcode_options(self) -> Optional[TranscodeOptions]:
+        if not self._args.format:
+            return None
+
+        from domain.models import TranscodeOptions
+        from codec.format_converter import parse_command
+
+        command = parse_command(self._args.encoder) if self._args.encoder else None
+        return TranscodeOptions(self._args.format.lower().lstrip("."), self._args.bitrate, command)
+
+    def _get_clip_options(self) -> Optional[ClipOptions]:
+        if not (self._args.clip or self._args.clip_size):
+            return None
+
+        from domain.models import ClipOptions
+
+        return ClipOptions(self._args.clip or 0.0, self._args.clip_size or 0)
+
+    def _prefetch_depth(self) -> int:
+        if self._args.prefetch is not None:
+            return self._args.prefetch
+
+        from session.prefetcher import DEFAULT_PREFETCH_DEPTH
+
+        return DEFAULT_PREFETCH_DEPTH
+
+    def _get_cover_options(self) -> Optional[CoverOptions]:
+        if self._args.cover_max_size is None:
+            return None
+
+        from domain.models import CoverOptions
+
+        return CoverOptions(self._args.cover_max_size, self._args.cover_quality)
+
+    def _get_digests(self) -> List[str]:
+        if not (self._args.checksum or self._args.checksum_sidecar or self._args.checksum_manifest):
+            return []
+
+        from session.checksum import DEFAULT_ALGORITHM, parse_algorithms
+
+        return parse_algorithms(self._args.checksum or DEFAULT_ALGORITHM)
+
+    def _record_checksums(self, results: List[BatchResult]) -> None:
+        """按需写出校验文件与校验清单"""
+        from session.checksum import ChecksumManifest, write_sidecars
+
+        if self._args.checksum_sidecar:
+            for result in results:
+                if result.success and result.export is not None:
+                    write_sidecars(result.export)
+        if self._args.checksum_manifest:
+            manifest_path = Path(self._args.checksum_manifest).resolve()
+            with open(manifest_path, "w", encoding="utf-8", newline="") as f:
+                manifest = ChecksumManifest(f, self._get_digests(), ChecksumManifest.detect_format(str(manifest_path)))
+                manifest.write_results(results)
+            print(f"校验清单已写入：{manifest_path}")
+
+    def _get_cover_transform(self):
+        # 不经由 session.batch_engine 导入，单文件命令无需加载 multiprocessing / concurrent.futures
+        cover_options = self._get_cover_options()
+        if cover_options is None:
+            return None
+
+        from codec.cover_processor import get_cover_processor
+
+        return get_cover_processor(cover_options).process
 
     def _execute(self):
-        file_path_str = self._args.input_file
+        if self._args.daemon:
+            self._run_daemon()
+            return
+        if self._args.stop_daemon:
+            self._stop_daemon()
+            return
+        if self._args.queue:
+            self._execute_queue()
+            return
+        if self._args.verify:
+            self._execute_verify()
+            return
+        if self._args.export_metadata:
+            self._execute_export_metadata()
+            return
+        if self._args.covers_only:
+            self._execute_covers()
+            return
+        # 单个文件转码同样走只前向读取的流式路径，音频直接送入编码器
+        if self._is_streaming() or (self._args.format and not self._is_batch() and not self._args.archive_output):
+            self._execute_stream()
+            return
+        # 守护进程使用自身的进程池、不预取也不做内存准入控制，
+        # 显式指定 -j / --executor / --prefetch / --memory-budget 时在当前进程中执行
+        in_process = (self._args.no_daemon or self._args.archive_output or self._args.format
+                      or self._args.cover_max_size or self._get_digests() or self._get_clip_options()
+                      or self._args.jobs is not None or self._args.executor != "auto" or self._args.prefetch
+                      or self._args.memory_budget)
+        if not in_process and self._execute_via_daemon():
+            return
+
+        if self._is_batch() or self._args.archive_output:
+            self._execute_batch()
+            return
+
+        from domain.models import BatchResult
+        from session.decryption_session import DecryptionSession
+
+        file_path_str = self._args.input_files[0]
         file_path = Path(file_path_str).resolve()
         print(f"Input File: {file_path}")
 
-        session = DecryptionSession(str(file_path))
+        session = DecryptionSession(str(file_path), self._get_cover_transform())
         metadata = session.get_metadata()
         self._presenter.display_metadata(metadata)
 
@@ -88,14 +479,322 @@ class CLIController:
 
         print("正在解码...")
         output_path = self._get_output_path(metadata.format)
-        session.export_with_chunk(str(output_path), progress_callback=self._presenter.display_progress)
+        digests = self._get_digests()
+        export = session.export_with_chunk(str(output_path), self._args.chunk_size, self._presenter.display_progress,
+                                           digests, clip=self._get_clip_options())
         print(f"导出成功，Output File: {output_path}")
+        if digests:
+            self._presenter.display_checksums(export)
+            self._record_checksums([BatchResult(str(file_path), str(output_path), True, export=export)])
+
+    def _execute_stream(self):
+        """
+        Forward-only conversion between stdin/stdout and files, so the CLI can sit in a shell pipeline.
+        标准输入/输出的流式转换，只前向读取并分块写出，可用于管道，例如 curl … | ncm - - | ffmpeg …
+        """
+        from domain.models import BatchResult
+        from session.batch_engine import export_stream, select_converter
+        from session.stream_session import StreamDecryptionSession
+
+        to_stdout = self._args.output == "-" or (self._args.input_files == ["-"] and not self._args.output)
+        # 音频写入标准输出时，提示信息全部改写到标准错误
+        with contextlib.ExitStack() as stack:
+            if self._args.input_files == ["-"]:
+                input_stream, name = sys.stdin.buffer, "<stdin>"
+            else:
+                input_stream = stack.enter_context(open(Path(self._args.input_files[0]).resolve(), "rb"))
+                name = input_stream.name
+            output_stream = sys.stdout.buffer if to_stdout else None
+            if to_stdout:
+                stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+
+            print(f"Input File: {name}")
+            session = StreamDecryptionSession(input_stream, name, self._get_cover_transform())
+            metadata = session.get_metadata()
+            self._presenter.display_metadata(metadata)
+
+            if self._args.preview:
+                return
+
+            converter = select_converter(metadata.format, self._get_transcode_options())
+            output_format = converter.options.target_format if converter else metadata.format
+            if output_stream is None:
+                from session.atomic_output import atomic_output
+
+                output_path = self._get_output_path(output_format)
+                # 写入临时文件，完成后才改名为输出文件；失败或按下 Ctrl+C 时不留下不完整的输出
+                temp_path = stack.enter_context(atomic_output(str(output_path)))
+                output_stream = stack.enter_context(open(temp_path, "wb"))
+            else:
+                output_path = "<stdout>"
+
+            # 标准输入无法预知音频大小，进度仅显示已处理量
+            total_size = 0 if input_stream is sys.stdin.buffer else \
+                os.fstat(input_stream.fileno()).st_size - session.get_audio_offset()
+
+            print(f"正在解码并转码为 {output_format}..." if converter else "正在解码...")
+            digests = self._get_digests()
+            export = export_stream(session, output_stream, converter, self._args.chunk_size,
+                                   self._presenter.display_progress, total_size, str(output_path), digests,
+                                   self._get_clip_options())
+            print(f"导出成功，Output File: {output_path}")
+            if digests:
+                self._presenter.display_checksums(export)
+                self._record_checksums([BatchResult(name, str(output_path), True, export=export)])
+
+    def _execute_batch(self):
+        from session.batch_engine import BatchEngine, expand_tasks, iter_metadata
+
+        if self._args.preview:
+            for input_path, metadata, error in iter_metadata(self._args.input_files):
+                print(f"Input File: {input_path}")
+                if metadata is None:
+                    self._presenter.display_error(error)
+                else:
+                    self._presenter.display_metadata(metadata)
+            return
+
+        from session.scheduler import ByteProgress, task_bytes
+
+        tasks = expand_tasks(self._args.input_files, self._args.output)
+        sizes = task_bytes(tasks)
+        progress = ByteProgress(sum(sizes.values()))
+        print(f"共找到 {len(tasks)} 个文件，共 {progress.total_bytes / 1024 / 1024:.1f} MB")
+
+        def on_result(result: BatchResult, finished: int, total: int):
+            # 进度按字节计算；tar 包成员不在 sizes 中，按其解密后的大小计入
+            progress.add(sizes.get(result.input_path, result.input_size))
+            self._presenter.display_batch_result(result, finished, total, progress)
+
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            sink = None
+            if self._args.archive_output:
+                from session.archive_sink import ArchiveSink
+                sink = stack.enter_context(ArchiveSink(self._args.archive_output))
+                print(f"输出压缩包：{sink.archive_path}")
+
+            engine = BatchEngine(jobs=self._args.jobs or 1, chunk_size=self._args.chunk_size, sink=sink,
+                                 transcode=self._get_transcode_options(),
+                                 cover_options=self._get_cover_options(), digests=self._get_digests(),
+                                 executor=self._args.executor, prefetch=self._prefetch_depth(),
+                                 schedule=self._args.schedule, memory_budget=self._args.memory_budget or 0,
+                                 skip_existing=self._args.skip_existing, clip=self._get_clip_options())
+            results = engine.run(tasks, result_callback=on_result)
+        self._presenter.display_batch_summary(results, time.perf_counter() - start)
+        if engine.digests:
+            self._record_checksums(results)
+
+        if not all(r.success for r in results):
+            raise NCMException("部分文件解码失败")
+
+    def _execute_queue(self):
+        """
+        Cooperative conversion through a shared work queue. Every node runs the same command; the inputs are
+        enqueued idempotently and each node converts leased batches with its own BatchEngine (-j processes).
+        通过共享工作队列协同转换。每个节点运行同一条命令：输入文件幂等地加入队列，各节点以自己的 BatchEngine（-j 个进程）转换领取到的批次。
+        """
+        from session.batch_engine import BatchEngine, expand_tasks
+        from session.work_queue import WorkQueue, run_queue
+
+        if self._args.archive_output:
+            raise NCMException("工作队列模式不支持 -a/--archive-output")
+
+        with WorkQueue(self._args.queue, self._args.queue_lease) as queue:
+            if self._args.queue_retry:
+                print(f"已将 {queue.retry_failed()} 个失败的文件重新置为待处理")
+            if self._args.input_files:
+                added = queue.add(expand_tasks(self._args.input_files, self._args.output))
+                print(f"新加入队列 {added} 个文件（{queue.db_path}）")
+            if self._args.queue_status:
+                # 与输入文件同时指定时只加入队列，不转换
+                self._presenter.display_queue_status(queue.db_path, queue.counts())
+                return
+
+            jobs = self._args.jobs or 1
+            engine = BatchEngine(jobs=jobs, chunk_size=self._args.chunk_size,
+                                 transcode=self._get_transcode_options(),
+                                 cover_options=self._get_cover_options(), digests=self._get_digests(),
+                                 executor=self._args.executor, prefetch=self._prefetch_depth(),
+                                 schedule=self._args.schedule, memory_budget=self._args.memory_budget or 0,
+                                 skip_existing=self._args.skip_existing, clip=self._get_clip_options())
+            results = []
+
+            def convert(batch, on_result):
+                def callback(result: BatchResult, finished: int, total: int):
+                    on_result(result)
+                    results.append(result)
+                    self._presenter.display_batch_result(result, finished, total)  # 计数为本批次内的进度
+
+                engine.run(batch, result_callback=callback)
+
+            start = time.perf_counter()
+            # 每批的任务数为并行数的数倍，进程池启动开销可以摊薄，节点崩溃时需要重做的工作也不多
+            run_queue(queue, convert, batch_size=max(16, jobs * 4))
+            self._presenter.display_batch_summary(results, time.perf_counter() - start)
+            self._presenter.display_queue_status(queue.db_path, queue.counts())
+
+        if engine.digests:
+            self._record_checksums(results)
+        if not all(r.success for r in results):
+            raise NCMException("部分文件解码失败")
+
+    def _execute_verify(self):
+        from session.batch_engine import expand_tasks
+        from session.verifier import verify_library
+
+        tasks = expand_tasks(self._args.input_files)
+        print(f"共找到 {len(tasks)} 个文件")
+
+        start = time.perf_counter()
+        results = verify_library(tasks, jobs=self._args.jobs or os.cpu_count() or 1,
+                                 result_callback=self._presenter.display_verify_result)
+        self._presenter.display_verify_summary(results, time.perf_counter() - start)
+
+        if not all(r.success for r in results):
+            raise NCMException(f"发现 {sum(1 for r in results if not r.success)} 个损坏的文件")
+
+    def _execute_export_metadata(self):
+        """
+        Export a machine-readable metadata catalog instead of the console output of display_metadata.
+        导出机器可读的元数据目录，替代解析 --preview 的控制台输出。
+        """
+        from session.batch_engine import expand_tasks
+        from session.catalog import CatalogWriter, iter_catalog
+
+        catalog_path = self._args.export_metadata
+        to_stdout = catalog_path == "-"
+        catalog_format = "jsonl" if to_stdout else CatalogWriter.detect_format(catalog_path)
+
+        with contextlib.ExitStack() as stack:
+            if to_stdout:
+                output = sys.stdout
+                stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+            else:
+                output = stack.enter_context(open(catalog_path, "w", encoding="utf-8", newline=""))
+
+            tasks = expand_tasks(self._args.input_files)
+            print(f"共找到 {len(tasks)} 个文件")
+
+            start = time.perf_counter()
+            writer = CatalogWriter(output, catalog_format)
+            count = failed_count = 0
+            for record in iter_catalog(tasks, jobs=self._args.jobs or os.cpu_count() or 1):
+                writer.write(record)
+                count += 1
+                if record["error"]:
+                    failed_count += 1
+                    self._presenter.display_error(f"{record['path']}：{record['error']}")
+
+            output_name = "<stdout>" if to_stdout else str(Path(catalog_path).resolve())
+            print(f"已导出 {count} 条记录（失败 {failed_count} 个）到 {output_name}，"
+                  f"耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def _execute_covers(self):
+        from session.batch_engine import expand_tasks
+        from session.cover_exporter import CoverExporter
+
+        tasks = expand_tasks(self._args.input_files)
+        exporter = CoverExporter(self._args.output or "covers")
+        print(f"共找到 {len(tasks)} 个文件，封面输出目录：{exporter.output_dir}")
+
+        start = time.perf_counter()
+        results = exporter.export(tasks, jobs=self._args.jobs or 1,
+                                  result_callback=self._presenter.display_batch_result)
+        failed_count = sum(1 for r in results if not r.success)
+        print(f"封面导出结束：写出 {exporter.written_count} 张，硬链接 {exporter.linked_count} 张，"
+              f"失败 {failed_count} 个，耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def _run_daemon(self):
+        from session.conversion_daemon import ConversionDaemon
+
+        daemon = ConversionDaemon(self._args.socket, jobs=self._args.jobs, chunk_size=self._args.chunk_size)
+        print(f"守护进程已启动，进程数 {daemon.jobs}，Socket: {daemon.socket_path}")
+        daemon.serve_forever()
+
+    def _stop_daemon(self):
+        from session.daemon_client import DaemonClient
+
+        if not DaemonClient(self._args.socket).shutdown():
+            raise NCMException("守护进程未运行")
+        print("守护进程已停止")
+
+    def _execute_via_daemon(self) -> bool:
+        """
+        Submit the job to a running daemon and stream its events. Returns False when no daemon is available.
+        若守护进程正在运行，则提交任务并输出其事件流；守护进程不可用时返回假，由调用方在当前进程中执行。
+        """
+        from session.daemon_client import DaemonClient, DaemonUnavailableError
+
+        inputs = [str(Path(p).resolve()) for p in self._args.input_files]
+        batch = self._is_batch()
+        output = str(Path(self._args.output).resolve()) if self._args.output else None
+        payload = {"type": "preview" if self._args.preview else "convert", "inputs": inputs,
+                   "output_dir": output if batch else None, "output_path": None if batch else output,
+                   "schedule": self._args.schedule, "skip_existing": self._args.skip_existing}
+        if self._args.chunk_size_given:
+            payload["chunk_size"] = self._args.chunk_size
+
+        events = DaemonClient(self._args.socket).request(payload)
+        try:
+            first_event = next(events, None)
+        except DaemonUnavailableError:
+            return False
+
+        if first_event is not None:
+            self._display_daemon_events(itertools.chain([first_event], events), batch)
+        return True
+
+    def _display_daemon_events(self, events, batch: bool):
+        from domain.models import NCMMetadata, BatchResult, SKIPPED_MESSAGE
+
+        start = time.perf_counter()
+        results = []
+        progress_finished = False
+
+        for event in events:
+            match event["type"]:
+                case "accepted" if batch:
+                    print(f"共找到 {event['total']} 个文件")
+                case "accepted":
+                    print(f"Input File: {Path(self._args.input_files[0]).resolve()}")
+                case "metadata":
+                    if batch or self._args.preview:
+                        print(f"Input File: {event['input_path']}")
+                    self._presenter.display_metadata(NCMMetadata(**event["metadata"]))
+                    if not self._args.preview:
+                        print("正在解码...")
+                case "progress":
+                    self._presenter.display_progress(event["current"], event["total"], event["msg"])
+                    progress_finished = "完成" in event["msg"]
+                case "result":
+                    result = BatchResult(**{k: v for k, v in event.items() if k not in ("type", "finished", "total")})
+                    results.append(result)
+                    if batch:
+                        self._presenter.display_batch_result(result, event["finished"], event["total"])
+                    elif not result.success:
+                        raise NCMException(result.message)
+                    elif result.message == SKIPPED_MESSAGE:
+                        print(f"{SKIPPED_MESSAGE}，Output File: {result.output_path}")
+                    else:
+                        if not progress_finished:
+                            print()
+                        print(f"导出成功，Output File: {result.output_path}")
+                case "error" if batch:
+                    self._presenter.display_error(event["message"])
+                case "error":
+                    raise NCMException(event["message"])
+
+        if batch and not self._args.preview:
+            self._presenter.display_batch_summary(results, time.perf_counter() - start)
+            if not all(r.success for r in results):
+                raise NCMException("部分文件解码失败")
 
     def _get_output_path(self, audio_format: str) -> Path:
         if self._args.output:
             return Path(self._args.output).resolve()
 
-        input_path = Path(self._args.input_file).resolve()
+        input_path = Path(self._args.input_files[0]).resolve()
         output_name = input_path.stem + "." + audio_format
         return input_path.parent / output_name
 
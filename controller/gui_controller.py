@@ -3,9 +3,11 @@ from typing import Optional
 
 from PySide6.QtCore import QThread, Signal, QObject, Slot, QTimer
 
-from domain.exceptions import NCMException
-from domain.models import NCMMetadata
+from domain.exceptions import NCMException, NCMCancelledException
+from domain.models import BatchTask, NCMMetadata
+from session.cancellation import CancellationToken
 from session.decryption_session import DecryptionSession
+from session.scheduler import ByteProgress, describe_tasks, format_eta, resolve_schedule, schedule_order
 
 
 class DecryptWorker(QThread):
@@ -18,6 +20,11 @@ class DecryptWorker(QThread):
         self.session = session
         self.output_file = output_file
         self.preview_only = preview_only
+        self.cancel_token = CancellationToken()
+
+    def cancel(self):
+        """请求停止：导出在下一个分块之前结束并删除临时文件，之后不再发出任何信号"""
+        self.cancel_token.cancel()
 
     def run(self):
         try:
@@ -37,11 +44,14 @@ class DecryptWorker(QThread):
                 percent = int(current * 100 / total)
                 self.signal_progress_updated.emit(min(percent, 100), 100, msg)
 
-            self.session.export_with_chunk(self.output_file, progress_callback=progress_cb)
+            self.session.export_with_chunk(self.output_file, progress_callback=progress_cb,
+                                           cancel_token=self.cancel_token)
             self.signal_progress_updated.emit(100, 100, "解码完成")
 
             self.signal_task_finished.emit(False, metadata, cover_bytes, self.output_file)
 
+        except NCMCancelledException:
+            return
         except NCMException as e:
             self.signal_error_occurred.emit(str(e))
         except Exception as e:
@@ -68,6 +78,8 @@ class GUIController(QObject):
     signal_decryption_finished = Signal(str)
     signal_batch_update_progress = Signal(int, str)
     signal_batch_decryption_finished = Signal(int)
+    signal_batch_update_overall = Signal(int, int, str)  # 批量总体进度：百分比（按字节），已完成数量，剩余时间
+    signal_batch_decryption_cancelled = Signal(int)  # 批量任务被取消：已完成数量
 
     def __init__(self, parent: Optional[QObject] = None):
         super().__init__(parent)
@@ -79,7 +91,10 @@ class GUIController(QObject):
         self.decrypt_worker: Optional[DecryptWorker] = None
 
         self.batch_mode = False
-        self.batch_queue = []  # 存储 (row_index, file_path) 的元组
+        self.batch_queue = []  # 存储 (row_index, file_path) 的元组，按调度策略排序
+        self.batch_sizes = []  # 与 batch_queue 对应的文件字节数
+        self.batch_progress: Optional[ByteProgress] = None
+        self.batch_schedule = "input"
         self.current_batch_index = 0
         self.total_batch_count = 0
 
@@ -99,6 +114,10 @@ class GUIController(QObject):
     def set_batch_output_file(self, file_path: Optional[str] = None):
         self.batch_output_file = Path(file_path).resolve() if file_path else None
 
+    def set_batch_schedule(self, policy: str):
+        """设置批量任务执行顺序：input / size / location，见 session.scheduler"""
+        self.batch_schedule = resolve_schedule(policy)
+
     def start_preview(self):
         if not self.current_session:
             self.signal_show_message.emit("info", "请先选择 NCM 文件！")
@@ -136,13 +155,35 @@ class GUIController(QObject):
         if not tasks:
             return
 
+        # 按调度策略排序，同时记录各文件大小，总体进度与剩余时间按字节计算
+        footprints = describe_tasks([BatchTask(file_path) for _, file_path in tasks])
+        order = schedule_order(footprints, self.batch_schedule)
+
         self.batch_mode = True
-        self.batch_queue = tasks
+        self.batch_queue = [tasks[i] for i in order]
+        self.batch_sizes = [footprints[i].size for i in order]
+        self.batch_progress = ByteProgress(sum(self.batch_sizes))
         self.total_batch_count = len(tasks)
         self.current_batch_index = 0
 
         self._run_next_batch_task()
 
+    def cancel_batch_decryption(self):
+        """取消批量任务：当前文件在下一个分块之前停止且不留下部分输出，尚未开始的文件保持等待状态"""
+        if not self.batch_mode:
+            return
+        self.batch_mode = False
+        self._stop_worker()
+        if self.current_batch_index < self.total_batch_count:
+            row_idx, _ = self.batch_queue[self.current_batch_index]
+            self.signal_batch_update_progress.emit(row_idx, "已取消")
+        self.signal_batch_decryption_cancelled.emit(self.current_batch_index)
+
+    def shutdown(self):
+        """窗口关闭前调用：取消正在进行的任务并等待工作线程退出"""
+        self.batch_mode = False
+        self._stop_worker()
+
     def _run_next_batch_task(self):
         if self.current_batch_index >= self.total_batch_count or not self.batch_mode:
             self.batch_mode = False
@@ -192,8 +233,9 @@ class GUIController(QObject):
         )
 
     def _stop_worker(self):
+        # 协作式取消而不是 terminate()：工作线程在分块之间退出，关闭文件句柄并删除临时文件，不会留下截断的输出
         if self.decrypt_worker and self.decrypt_worker.isRunning():
-            self.decrypt_worker.terminate()
+            self.decrypt_worker.cancel()
             self.decrypt_worker.wait()
         self.decrypt_worker = None
 
@@ -218,18 +260,41 @@ class GUIController(QObject):
 
     @Slot(int, int, int, str)
     def _on_batch_worker_progress(self, row_idx, current, total, msg):
+        if not self.batch_mode:
+            return  # 取消前已发出、尚未处理的进度信号
         status_msg = f"处理中-{int(current / total * 100)}%"
         self.signal_batch_update_progress.emit(row_idx, status_msg)
+        if self.current_batch_index < len(self.batch_sizes):
+            self._emit_batch_overall(self.batch_sizes[self.current_batch_index] * current // total)
 
     @Slot(int, str)
     def _on_batch_worker_finished(self, row_idx, output_path):
+        if not self.batch_mode:
+            return
         self.signal_batch_update_progress.emit(row_idx, "完成")
-        self.current_batch_index += 1
-        self._run_next_batch_task()
+        self._advance_batch()
 
     @Slot(int, str)
     def _on_batch_worker_error(self, row_idx, msg):
         # 若当前任务失败，则在通知UI后执行下一个任务
+        if not self.batch_mode:
+            return
         self.signal_batch_update_progress.emit(row_idx, "失败")
+        self._advance_batch()
+
+    def _advance_batch(self):
+        if self.batch_progress and self.current_batch_index < len(self.batch_sizes):
+            self.batch_progress.add(self.batch_sizes[self.current_batch_index])
         self.current_batch_index += 1
+        self._emit_batch_overall()
         self._run_next_batch_task()
+
+    def _emit_batch_overall(self, in_flight: int = 0):
+        """
+        :param in_flight: int 当前文件中已处理的字节数
+        """
+        if not self.batch_progress:
+            return
+        percent = int(self.batch_progress.fraction(in_flight) * 100)
+        self.signal_batch_update_overall.emit(percent, self.current_batch_index,
+                                              format_eta(self.batch_progress.eta(in_flight)))
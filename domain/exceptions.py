@@ -9,3 +9,6 @@ class NCMDecryptionException(NCMException):
 
 class NCMExportException(NCMException):
     pass
+
+class NCMCancelledException(NCMException):
+    pass
@@ -0,0 +1,287 @@
+import sys
+from array import array
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from domain.models import FrozenNCMMetadata, NCMMetadata
+
+"""
+筛选条件：与字段值比较的值，或对字段值求真假的函数；artist 字段的值为歌手名时匹配包含该歌手的曲目
+"""
+Condition = Union[Any, Callable[[Any], bool]]
+
+AnyMetadata = Union[NCMMetadata, FrozenNCMMetadata]
+
+
+class _DictionaryColumn:
+    """字典编码列：每个不同的值只保存一份，各行保存整数编号"""
+    def __init__(self):
+        self.values: List[Hashable] = []
+        self.index: Dict[Hashable, int] = {}
+        self.codes = array("I")
+        self._postings: Optional[List[array]] = None  # 各编号对应的行号，首次筛选时建立
+        self._members: Dict[int, Dict[Hashable, List[int]]] = {}  # 元组值：第 n 项中的各元素 -> 包含它的编号
+
+    def append(self, value: Hashable) -> None:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+            self._members.clear()
+        self.codes.append(code)
+        self._postings = None
+
+    def postings(self) -> List[array]:
+        if self._postings is None:
+            self._postings = [array("I") for _ in self.values]
+            for row, code in enumerate(self.codes):
+                self._postings[code].append(row)
+        return self._postings
+
+    def rows_for(self, codes: set) -> List[int]:
+        """返回编号属于 codes 的全部行号（升序），借助倒排表无需扫描整列"""
+        postings = self.postings()
+        if len(codes) == 1:
+            return list(postings[next(iter(codes))])
+        return sorted(row for code in codes for row in postings[code])
+
+    def count(self, codes: set) -> int:
+        postings = self.postings()
+        return sum(len(postings[code]) for code in codes)
+
+    def member_codes(self, position: int, item: Hashable) -> set:
+        """元组值的第 position 项中包含 item 的全部编号"""
+        members = self._members.get(position)
+        if members is None:
+            members = self._members[position] = {}
+            for code, value in enumerate(self.values):
+                for member in value[position]:
+                    members.setdefault(member, []).append(code)
+        return set(members.get(item, ()))
+
+    def __getitem__(self, row: int) -> Hashable:
+        return self.values[self.codes[row]]
+
+    def matching_codes(self, condition: Condition) -> set:
+        """条件对每个不同的值只求一次，返回满足条件的编号"""
+        if callable(condition):
+            return {code for code, value in enumerate(self.values) if condition(value)}
+        code = self.index.get(condition)
+        return set() if code is None else {code}
+
+    def ranks(self, key: Callable[[Hashable], Any] = lambda value: value) -> List[int]:
+        """返回各编号对应的值在全部不同值中的排序名次，排序时只需比较整数"""
+        order = sorted(range(len(self.values)), key=lambda code: key(self.values[code]))
+        ranks = [0] * len(self.values)
+        for rank, code in enumerate(order):
+            ranks[code] = rank
+        return ranks
+
+
+class MetadataTable:
+    """
+    Columnar container for large metadata collections (scans, dedup, catalog views). Repetitive fields
+    (artists, album, album id, format) are dictionary-encoded and numbers are stored in typed arrays, so a row
+    costs a few dozen bytes instead of a full object. Filters on encoded fields evaluate the condition once
+    per distinct value, and sorts compare integer ranks. Rows are materialized as NCMMetadata on access.
+    大批量元数据（扫描、去重、曲库视图）的列式容器。重复度高的字段（歌手、专辑、专辑编号、格式）采用字典编码，数值保存在定长数组中，
+    每行只占几十字节而不是一个完整对象。编码字段的筛选条件对每个不同的值只求一次，排序只比较整数名次。访问单行时才生成 NCMMetadata。
+    """
+    ENCODED_FIELDS = ("artists", "album", "album_id", "format")  # artists 为 (artist, artist_ids) 组合
+    NUMERIC_FIELDS = ("duration", "bitrate")
+    PLAIN_FIELDS = ("path", "music_id", "title")
+
+    def __init__(self, records: Iterable[Union[AnyMetadata, Tuple[str, AnyMetadata]]] = ()):
+        """
+        :param records: Iterable NCMMetadata / FrozenNCMMetadata，或（路径，元数据）元组
+        """
+        self._plain: Dict[str, List[str]] = {name: [] for name in self.PLAIN_FIELDS}
+        self._encoded: Dict[str, _DictionaryColumn] = {name: _DictionaryColumn() for name in self.ENCODED_FIELDS}
+        self._numeric: Dict[str, array] = {name: array("q") for name in self.NUMERIC_FIELDS}
+        self.extend(records)
+
+    def append(self, metadata: AnyMetadata, path: str = "") -> None:
+        self._plain["path"].append(path)
+        self._plain["music_id"].append(metadata.music_id)
+        self._plain["title"].append(metadata.title)
+        # 歌手列表按元组字典编码，相同的歌手组合在表内只保留一份
+        self._encoded["artists"].append((tuple(metadata.artist), tuple(metadata.artist_ids)))
+        self._encoded["album"].append(metadata.album)
+        self._encoded["album_id"].append(metadata.album_id)
+        self._encoded["format"].append(metadata.format)
+        self._numeric["duration"].append(metadata.duration)
+        self._numeric["bitrate"].append(metadata.bitrate)
+
+    def extend(self, records: Iterable[Union[AnyMetadata, Tuple[str, AnyMetadata]]]) -> None:
+        for record in records:
+            if isinstance(record, tuple):
+                self.append(record[1], record[0])
+            else:
+                self.append(record)
+
+    def __len__(self) -> int:
+        return len(self._plain["path"])
+
+    def __getitem__(self, row: int) -> NCMMetadata:
+        artist, artist_ids = self._encoded["artists"][row]
+        return NCMMetadata(
+            music_id=self._plain["music_id"][row],
+            title=self._plain["title"][row],
+            artist=artist,
+            artist_ids=artist_ids,
+            album=self._encoded["album"][row],
+            album_id=self._encoded["album_id"][row],
+            format=self._encoded["format"][row],
+            duration=self._numeric["duration"][row],
+            bitrate=self._numeric["bitrate"][row],
+        )
+
+    def __iter__(self) -> Iterator[NCMMetadata]:
+        return (self[row] for row in range(len(self)))
+
+    def path(self, row: int) -> str:
+        return self._plain["path"][row]
+
+    def items(self) -> Iterator[Tuple[str, NCMMetadata]]:
+        """逐行返回（路径，NCMMetadata）"""
+        return ((self.path(row), self[row]) for row in range(len(self)))
+
+    def column(self, name: str) -> Sequence:
+        """返回整列的值，artist / artist_ids 为元组列表"""
+        if name in self._plain:
+            return self._plain[name]
+        if name in self._numeric:
+            return self._numeric[name]
+        if name in ("artist", "artist_ids"):
+            position = 0 if name == "artist" else 1
+            column = self._encoded["artists"]
+            return [column.values[code][position] for code in column.codes]
+        if name in self._encoded:
+            column = self._encoded[name]
+            return [column.values[code] for code in column.codes]
+        raise KeyError(name)
+
+    def distinct(self, name: str) -> List[Any]:
+        """字典编码字段（album / album_id / format）的全部不同值，按首次出现顺序"""
+        return list(self._encoded[name].values)
+
+    def _encoded_condition(self, name: str, condition: Condition) -> Tuple[_DictionaryColumn, set]:
+        """返回字典编码字段的列及满足条件的编号"""
+        if name in ("artist", "artist_ids"):
+            position = 0 if name == "artist" else 1
+            column = self._encoded["artists"]
+            if callable(condition):
+                return column, column.matching_codes(lambda value: condition(value[position]))
+            # 单个值匹配包含它的曲目，元组 / 列表匹配完全相同的歌手列表
+            if isinstance(condition, (list, tuple)):
+                return column, column.matching_codes(lambda value: value[position] == tuple(condition))
+            return column, column.member_codes(position, condition)
+        column = self._encoded[name]
+        return column, column.matching_codes(condition)
+
+    def filter_rows(self, **conditions: Condition) -> List[int]:
+        """
+        Return the row numbers matching every condition, e.g. filter_rows(artist="周杰伦", format="flac",
+        duration=lambda ms: ms > 300_000). Only the most selective encoded condition is expanded into rows;
+        the others are checked row by row against integer codes.
+        返回满足全部条件的行号，例如 filter_rows(artist="周杰伦", format="flac", duration=lambda ms: ms > 300_000)。
+        只展开匹配行数最少的字典编码条件，其余条件逐行比较整数编号。
+        """
+        encoded = []
+        tests = []
+        for name, condition in conditions.items():
+            if name in self._encoded or name in ("artist", "artist_ids"):
+                column, codes = self._encoded_condition(name, condition)
+                encoded.append((column.count(codes), column, codes))
+            elif name in self._plain or name in self._numeric:
+                values = self._plain.get(name, self._numeric.get(name))
+                tests.append((values, condition if callable(condition) else (lambda value, c=condition: value == c)))
+            else:
+                raise KeyError(name)
+
+        if encoded:
+            encoded.sort(key=lambda item: item[0])
+            _, column, codes = encoded[0]
+            rows = column.rows_for(codes)
+            tests = [(column.codes, codes) for _, column, codes in encoded[1:]] + tests
+        else:
+            rows = range(len(self))
+        for values, test in tests:
+            if isinstance(test, set):
+                rows = [row for row in rows if values[row] in test]
+            else:
+                rows = [row for row in rows if test(values[row])]
+        return list(rows)
+
+    def filter(self, **conditions: Condition) -> "MetadataTable":
+        """返回满足全部条件的行组成的新表，条件见 filter_rows"""
+        return self.take(self.filter_rows(**conditions))
+
+    def sort_rows(self, *names: str, reverse: bool = False) -> List[int]:
+        """按一个或多个字段排序的行号（稳定排序），字典编码字段按名次比较，artist 按歌手列表排序"""
+        key_columns = []
+        for name in names:
+            if name in ("artist", "artist_ids"):
+                position = 0 if name == "artist" else 1
+                column = self._encoded["artists"]
+                ranks = column.ranks(lambda value: tuple("" if v is None else str(v) for v in value[position]))
+                key_columns.append([ranks[code] for code in column.codes])
+            elif name in self._encoded:
+                column = self._encoded[name]
+                ranks = column.ranks(str)
+                key_columns.append([ranks[code] for code in column.codes])
+            elif name in self._plain or name in self._numeric:
+                key_columns.append(self._plain.get(name, self._numeric.get(name)))
+            else:
+                raise KeyError(name)
+
+        rows = range(len(self))
+        if not key_columns:
+            return list(rows)
+        keys = key_columns[0] if len(key_columns) == 1 else list(zip(*key_columns))
+        return sorted(rows, key=keys.__getitem__, reverse=reverse)
+
+    def sort_by(self, *names: str, reverse: bool = False) -> "MetadataTable":
+        return self.take(self.sort_rows(*names, reverse=reverse))
+
+    def take(self, rows: Iterable[int]) -> "MetadataTable":
+        """按行号取出若干行组成新表，字典编码的值在新表中共用"""
+        table = MetadataTable()
+        for row in rows:
+            for name, values in self._plain.items():
+                table._plain[name].append(values[row])
+            for name, column in self._encoded.items():
+                table._encoded[name].append(column[row])
+            for name, values in self._numeric.items():
+                table._numeric[name].append(values[row])
+        return table
+
+    def duplicates(self, *names: str) -> List[List[int]]:
+        """
+        Group rows with equal values in the given fields (music_id by default) and return groups of two or more.
+        按指定字段（默认 music_id）分组，返回包含两行及以上的重复组（行号列表）。
+        """
+        names = names or ("music_id",)
+        columns = [self.column(name) for name in names]
+        groups: Dict[tuple, List[int]] = {}
+        for row in range(len(self)):
+            groups.setdefault(tuple(column[row] for column in columns), []).append(row)
+        return [rows for rows in groups.values() if len(rows) > 1]
+
+    def nbytes(self) -> int:
+        """估算的内存占用（字节），共享的驻留字符串只计一次"""
+        seen = set()
+
+        def size(value) -> int:
+            if id(value) in seen:
+                return 0
+            seen.add(id(value))
+            if isinstance(value, tuple):
+                return sys.getsizeof(value) + sum(size(item) for item in value)
+            return sys.getsizeof(value)
+
+        total = sum(sys.getsizeof(values) + sum(size(value) for value in values) for values in self._plain.values())
+        total += sum(values.itemsize * len(values) for values in self._numeric.values())
+        for column in self._encoded.values():
+            total += column.codes.itemsize * len(column.codes) + sys.getsizeof(column.index)
+            total += sys.getsizeof(column.values) + sum(size(value) for value in column.values)
+        return total
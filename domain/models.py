@@ -1,9 +1,30 @@
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
 
+ARTIST_TUPLE_CACHE_SIZE = 4096  # 共享歌手元组的缓存条数，按最近使用淘汰，长期运行的守护进程与 GUI 中不会无限增长
 
-@dataclass
+
+@lru_cache(maxsize=ARTIST_TUPLE_CACHE_SIZE)
+def _shared_tuple(values: tuple) -> tuple:
+    # 缓存命中时返回首次传入的相同元组，近期出现过的同一组歌手只保留一份
+    return values
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+@dataclass(slots=True)
 class NCMMetadata:
+    """
+    Track metadata. Slotted, with artist and album strings interned, so records from the same artists and
+    albums share their strings. Use freeze() for an immutable, hashable copy, and
+    domain.metadata_table.MetadataTable for bulk collections.
+    曲目元数据。使用 __slots__，歌手与专辑字符串经过驻留，同一歌手 / 专辑的曲目共用这些字符串。
+    需要不可变、可哈希的副本时使用 freeze()，大批量集合见 domain.metadata_table.MetadataTable。
+    """
     music_id: str
     title: str
     artist: List[str]
@@ -14,6 +35,12 @@ class NCMMetadata:
     duration: int
     bitrate: int
 
+    def __post_init__(self):
+        # 也接受元组（例如由 FrozenNCMMetadata 或 MetadataTable 生成时），统一转为列表并驻留字符串
+        self.artist = [_intern(name) for name in self.artist]
+        self.artist_ids = list(self.artist_ids)
+        self.album, self.album_id, self.format = _intern(self.album), _intern(self.album_id), _intern(self.format)
+
     @classmethod
     def load_from_dict(cls, data: Dict[str, Any]) -> NCMMetadata:
         return cls(
@@ -28,3 +55,117 @@ class NCMMetadata:
             bitrate=data.get("bitrate", 0)
         )
 
+    def freeze(self) -> FrozenNCMMetadata:
+        return FrozenNCMMetadata(self.music_id, self.title, tuple(self.artist), tuple(self.artist_ids),
+                                 self.album, self.album_id, self.format, self.duration, self.bitrate)
+
+
+@dataclass(frozen=True, slots=True)
+class FrozenNCMMetadata:
+    """
+    Immutable, hashable variant of NCMMetadata with artists as tuples. Identical artist tuples are shared
+    through a bounded LRU cache, so large in-memory collections stay small.
+    NCMMetadata 的不可变、可哈希版本，歌手列表为元组。相同的歌手元组经有界的 LRU 缓存共用，大量记录常驻内存时占用更少。
+    """
+    music_id: str
+    title: str
+    artist: Tuple[str, ...]
+    artist_ids: Tuple[Optional[int], ...]
+    album: str
+    album_id: str
+    format: str
+    duration: int
+    bitrate: int
+
+    def __post_init__(self):
+        object.__setattr__(self, "artist", _shared_tuple(tuple(_intern(name) for name in self.artist)))
+        object.__setattr__(self, "artist_ids", _shared_tuple(tuple(self.artist_ids)))
+        for name in ("album", "album_id", "format"):
+            object.__setattr__(self, name, _intern(getattr(self, name)))
+
+    def thaw(self) -> NCMMetadata:
+        return NCMMetadata(self.music_id, self.title, list(self.artist), list(self.artist_ids),
+                           self.album, self.album_id, self.format, self.duration, self.bitrate)
+
+
+@dataclass
+class NCMHeader:
+    key_data: bytes  # 密钥长度与加密密钥（132字节）
+    metadata_data: bytes  # 加密元数据
+    cover_length: int
+    audio_offset: int
+
+
+@dataclass(frozen=True)
+class HeaderLayout:
+    """解析后的文件头：RC4 密钥、元数据与封面 / 音频位置，用于文件头缓存"""
+    rc4_key: bytes
+    metadata: NCMMetadata
+    cover_length: int
+    audio_offset: int  # 封面数据紧接在音频之前，位于 audio_offset - cover_length
+
+
+@dataclass
+class CoverImage:
+    input_path: str
+    album_id: str
+    data: bytes
+    digest: str = ""  # 封面内容的 sha256
+    error: str = ""
+
+
+@dataclass
+class BatchTask:
+    input_path: str
+    output_dir: Optional[str] = None  # 为空时输出到源文件同级目录
+    output_path: Optional[str] = None  # 指定时优先于 output_dir
+    member: Optional[str] = None  # input_path 为 zip 包时的成员名；压缩包任务为空时转换包内全部 .ncm 文件
+
+
+@dataclass(frozen=True)
+class TaskFootprint:
+    size: int = 0  # 需要读取并解密的字节数，无法获取时为0
+    location: Tuple[str, int, int] = ("", 0, 0)  # （所在目录，inode，压缩包内偏移），用于按磁盘位置排序
+
+
+@dataclass
+class ExportResult:
+    output_path: str
+    audio_size: int = 0  # 解密后的音频字节数
+    file_size: int = 0  # 最终输出文件（含封面标签）字节数
+    audio_digests: Dict[str, str] = field(default_factory=dict)  # 算法 -> 解密音频数据的十六进制摘要
+    file_digests: Dict[str, str] = field(default_factory=dict)  # 算法 -> 最终输出文件的十六进制摘要
+
+
+@dataclass
+class BatchResult:
+    input_path: str
+    output_path: str
+    success: bool
+    message: str = ""
+    input_size: int = 0
+    elapsed: float = 0.0
+    export: Optional[ExportResult] = None  # 导出时计算了校验值才有
+
+
+SKIPPED_MESSAGE = "已存在，跳过"  # 输出文件已存在而跳过的任务的 BatchResult.message
+
+
+@dataclass(frozen=True)
+class TranscodeOptions:
+    target_format: str  # mp3 / opus / flac 等
+    bitrate: str = "320k"  # 有损格式的目标码率
+    command: Optional[Tuple[str, ...]] = None  # 自定义编码器命令，为空时使用 target_format 对应的预设
+
+
+@dataclass(frozen=True)
+class CoverOptions:
+    max_dimension: int = 0  # 封面最大边长（像素），0 表示不缩放
+    quality: int = 85  # 重新编码的 JPEG 质量
+    cache_dir: Optional[str] = None  # 多进程共享的处理结果缓存目录
+
+
+@dataclass(frozen=True)
+class ClipOptions:
+    seconds: float = 0.0  # 片段时长上限（秒），0 表示不按时长截取
+    max_bytes: int = 0  # 片段音频字节数上限（含音频开头的标签与 FLAC 元数据块），0 表示不按大小截取
@@ -1,18 +1,27 @@
 import os
 from pathlib import Path
 
-from PySide6.QtCore import Qt, Slot
+from PySide6.QtCore import Qt, Slot, QSize
+from PySide6.QtGui import QIcon, QImage, QPixmap
 from PySide6.QtWidgets import QTableWidget, QHeaderView, QAbstractItemView, QWidget, QVBoxLayout, \
-    QHBoxLayout, QPushButton, QLabel, QFileDialog, QTableWidgetItem, QProgressBar, QLineEdit, QMessageBox, QFrame
+    QHBoxLayout, QPushButton, QLabel, QFileDialog, QTableWidgetItem, QProgressBar, QLineEdit, QMessageBox, QFrame, \
+    QComboBox
 
 from controller.gui_controller import GUIController
+from gui.thumbnail_cache import ThumbnailLoader
+
+THUMBNAIL_SIZE = QSize(32, 32)
+# 处理顺序选项：显示文本，调度策略（见 session.scheduler）
+SCHEDULE_OPTIONS = [("列表顺序", "input"), ("大文件优先", "size"), ("按磁盘位置", "location")]
 
 
 # noinspection PyAttributeOutsideInit
 class BatchTaskPage(QWidget):
-    def __init__(self, controller, parent=None):
+    def __init__(self, controller, thumbnail_loader: ThumbnailLoader = None, parent=None):
         super().__init__(parent)
         self.controller: GUIController = controller
+        self.thumbnail_loader = thumbnail_loader or ThumbnailLoader(parent=self)
+        self.batch_interrupted = False  # 上一次批量任务被停止，再次开始时跳过已完成的文件
 
         self.setup_ui()
 
@@ -42,10 +51,17 @@ class BatchTaskPage(QWidget):
         self.btn_add_dir = QPushButton("📁 添加文件夹")
         self.btn_clear = QPushButton("🗑️ 清空列表")
         self.btn_remove_sel = QPushButton("❌ 移除选中")
+        self.lbl_schedule = QLabel("处理顺序:")
+        self.combo_schedule = QComboBox()
+        for text, policy in SCHEDULE_OPTIONS:
+            self.combo_schedule.addItem(text, policy)
+        self.combo_schedule.setToolTip("大文件优先：最大的文件最先开始；按磁盘位置：按目录与 inode 排序，减少机械硬盘寻道")
 
         top_bar.addWidget(self.btn_add_files)
         top_bar.addWidget(self.btn_add_dir)
         top_bar.addStretch()
+        top_bar.addWidget(self.lbl_schedule)
+        top_bar.addWidget(self.combo_schedule)
         top_bar.addWidget(self.btn_remove_sel)
         top_bar.addWidget(self.btn_clear)
 
@@ -63,6 +79,8 @@ class BatchTaskPage(QWidget):
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.table.setFrameShape(QFrame.Shape.NoFrame)
+        self.table.setIconSize(THUMBNAIL_SIZE)
+        self.table.verticalHeader().setDefaultSectionSize(THUMBNAIL_SIZE.height() + 8)
 
         container_layout.addWidget(self.table)
         self.layout.addWidget(self.table_container)
@@ -104,11 +122,19 @@ class BatchTaskPage(QWidget):
         self.btn_start_batch.setFixedHeight(45)
         self.btn_start_batch.setEnabled(False)
 
+        self.btn_cancel_batch = QPushButton("停止")
+        self.btn_cancel_batch.setFixedHeight(45)
+        self.btn_cancel_batch.setVisible(False)
+
+        action_layout = QHBoxLayout()
+        action_layout.addWidget(self.btn_start_batch)
+        action_layout.addWidget(self.btn_cancel_batch)
+
         # 组合布局
         bottom_container.addLayout(status_info_layout)
         bottom_container.addWidget(self.batch_progress_bar)
         bottom_container.addSpacing(10)
-        bottom_container.addWidget(self.btn_start_batch)
+        bottom_container.addLayout(action_layout)
 
         self.layout.addLayout(bottom_container)
 
@@ -119,9 +145,14 @@ class BatchTaskPage(QWidget):
         self.btn_clear.clicked.connect(self.clear_table)
         self.btn_remove_sel.clicked.connect(self.remove_selected)
         self.btn_start_batch.clicked.connect(self.on_start_batch_clicked)
+        self.btn_cancel_batch.clicked.connect(self.controller.cancel_batch_decryption)
+        self.combo_schedule.currentIndexChanged.connect(self.on_schedule_changed)
 
         self.controller.signal_batch_update_progress.connect(self.on_batch_update_progress)
         self.controller.signal_batch_decryption_finished.connect(self.on_batch_decryption_finished)
+        self.controller.signal_batch_decryption_cancelled.connect(self.on_batch_decryption_cancelled)
+        self.controller.signal_batch_update_overall.connect(self.on_batch_update_overall)
+        self.thumbnail_loader.signal_thumbnail_ready.connect(self.on_thumbnail_ready)
 
     def on_add_files_clicked(self):
         """手动点击添加文件按钮"""
@@ -157,31 +188,54 @@ class BatchTaskPage(QWidget):
             self.edit_output.setText(dir_path)
             self.controller.set_batch_output_file(dir_path)
 
+    def on_schedule_changed(self, index):
+        self.controller.set_batch_schedule(self.combo_schedule.itemData(index))
+
     def on_start_batch_clicked(self):
         tasks = []
         for row in range(self.table.rowCount()):
+            # 停止后再次开始时只处理尚未完成的文件：输出总是完成后才改名生成，已完成的文件无需重做
+            if self.batch_interrupted and self.table.item(row, 2).text() == "完成":
+                continue
             path = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
             tasks.append((row, path))
 
         if tasks:
-            count = self.table.rowCount()
+            count = len(tasks)
             self.lbl_batch_status.setText(f"正在解码")
             self.lbl_batch_percent.setText(f"0 / {count}")
             self.btn_start_batch.setEnabled(False)
+            self.btn_cancel_batch.setVisible(True)
             self.controller.start_batch_decryption(tasks)
 
     @Slot(int, str)
     def on_batch_update_progress(self, row_idx, msg):
         self.update_item_status(row_idx, msg)
-        if msg == "完成":
-            self.update_overall_progress(row_idx + 1, self.table.rowCount())
+
+    @Slot(int, int, str)
+    def on_batch_update_overall(self, percent, finished, eta):
+        # 任务可能不按表格顺序执行，总体进度以控制器按字节计算的结果为准
+        total = self.controller.total_batch_count
+        self.batch_progress_bar.setValue(percent)
+        self.lbl_batch_percent.setText(f"{finished} / {total}")
+        if finished < total:
+            self.lbl_batch_status.setText(f"正在解码（{eta}）")
 
     @Slot(int)
     def on_batch_decryption_finished(self, total):
+        self.batch_interrupted = False
+        self.btn_cancel_batch.setVisible(False)
         self.show_message_dialog("info", "批量解码任务全部完成！")
         self.update_overall_progress(total, total)
         self.btn_start_batch.setEnabled(True)
 
+    @Slot(int)
+    def on_batch_decryption_cancelled(self, finished):
+        self.batch_interrupted = True
+        self.btn_cancel_batch.setVisible(False)
+        self.lbl_batch_status.setText(f"已停止，完成 {finished} 个文件")
+        self.btn_start_batch.setEnabled(True)
+
     @Slot(str, str)
     def show_message_dialog(self, level, msg):
         if level == "error":
@@ -224,7 +278,7 @@ class BatchTaskPage(QWidget):
             self.table.insertRow(row)
 
             path_obj = Path(path)
-            file_size = os.path.getsize(path) / (1024 * 1024)  # MB
+            file_size = os.path.getsize(path)
 
             # 填充单元格
             # 第0列存文件名，并关联 UserRole 存储全路径
@@ -232,8 +286,11 @@ class BatchTaskPage(QWidget):
             name_item.setData(Qt.ItemDataRole.UserRole, path)
 
             self.table.setItem(row, 0, name_item)
+            # 封面缩略图在线程池中读取与缩放，完成后再显示
+            self.thumbnail_loader.request_file(f"batch:{path}", path, THUMBNAIL_SIZE)
 
-            size_item = QTableWidgetItem(f"{file_size:.2f} MB")
+            size_item = QTableWidgetItem(f"{file_size / (1024 * 1024):.2f} MB")
+            size_item.setData(Qt.ItemDataRole.UserRole, file_size)
             size_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.table.setItem(row, 1, size_item)
 
@@ -243,6 +300,17 @@ class BatchTaskPage(QWidget):
 
         self._update_ui_state()
 
+    @Slot(str, QImage)
+    def on_thumbnail_ready(self, tag: str, image: QImage):
+        if not tag.startswith("batch:") or image.isNull():
+            return
+        path = tag.removeprefix("batch:")
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and item.data(Qt.ItemDataRole.UserRole) == path:
+                item.setIcon(QIcon(QPixmap.fromImage(image)))
+                return
+
     def _is_already_in_list(self, path):
         """检查路径是否已存在于表格中"""
         for row in range(self.table.rowCount()):
@@ -253,7 +321,8 @@ class BatchTaskPage(QWidget):
     def _update_ui_state(self):
         """根据表格内容更新按钮和标签状态"""
         count = self.table.rowCount()
-        self.lbl_batch_status.setText(f"待处理文件: {count}")
+        total_size = sum(self.table.item(row, 1).data(Qt.ItemDataRole.UserRole) or 0 for row in range(count))
+        self.lbl_batch_status.setText(f"待处理文件: {count}（共 {total_size / (1024 * 1024):.1f} MB）")
         self.lbl_batch_percent.setText(f"0 / {count}")
         self.btn_start_batch.setEnabled(count > 0)
 
@@ -276,6 +345,7 @@ class BatchTaskPage(QWidget):
             status_item.setText(status_text)
 
     def clear_table(self):
+        self.thumbnail_loader.clear_pending()
         self.table.setRowCount(0)
         self.batch_progress_bar.setValue(0)
         self._update_ui_state()
@@ -8,14 +8,17 @@ from PySide6.QtWidgets import QWidget, QHBoxLayout, QLabel, QLineEdit, QPushButt
 
 from controller.gui_controller import GUIController
 from domain.models import NCMMetadata
+from gui.thumbnail_cache import ThumbnailLoader
 from gui.widgets import VolumePopup
 
 
 # noinspection PyAttributeOutsideInit
 class MainPage(QWidget):
-    def __init__(self, controller, parent=None):
+    def __init__(self, controller, thumbnail_loader: ThumbnailLoader = None, parent=None):
         super().__init__(parent)
         self.controller: GUIController = controller
+        self.thumbnail_loader = thumbnail_loader or ThumbnailLoader(parent=self)
+        self._cover_request_id = 0  # 只显示最近一次请求的封面，丢弃切换文件前未完成的结果
 
         self.main_layout = QVBoxLayout(self)
         self.main_layout.setSpacing(20)
@@ -226,6 +229,7 @@ class MainPage(QWidget):
         self.controller.signal_update_progress.connect(self.update_progress_ui)
         self.controller.signal_update_metadata.connect(self.update_metadata_ui)
         self.controller.signal_update_cover_bytes.connect(self.update_cover_ui)
+        self.thumbnail_loader.signal_thumbnail_ready.connect(self.on_thumbnail_ready)
         self.controller.signal_show_message.connect(self.show_message_dialog)
         self.controller.signal_set_export_btn_enabled.connect(self.btn_start.setEnabled)
         self.controller.signal_decryption_finished.connect(self.on_decryption_finished)
@@ -270,16 +274,15 @@ class MainPage(QWidget):
     def update_cover_ui(self, cover_bytes: bytes):
         if not cover_bytes:
             return
-        # 将字节流转换为 QPixmap
-        image = QImage.fromData(cover_bytes)
-        pixmap = QPixmap.fromImage(image)
-        # 缩放图片以适应 Label，保持比例
-        scaled_pixmap = pixmap.scaled(
-            self.cover_label.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
-        self.cover_label.setPixmap(scaled_pixmap)
+        # 解码与缩放在缩略图线程池中完成，结果按封面哈希与尺寸缓存
+        self._cover_request_id += 1
+        self.thumbnail_loader.request(f"main:{self._cover_request_id}", cover_bytes, self.cover_label.size())
+
+    @Slot(str, QImage)
+    def on_thumbnail_ready(self, tag: str, image: QImage):
+        if tag != f"main:{self._cover_request_id}" or image.isNull():
+            return
+        self.cover_label.setPixmap(QPixmap.fromImage(image))
         self.cover_label.setText("")  # 移除文字提示
 
     @Slot(str, str)
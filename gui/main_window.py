@@ -2,12 +2,14 @@ import os
 import sys
 from pathlib import Path
 
+from PySide6.QtCore import QStandardPaths
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QMainWindow, QTabWidget
 
 from controller.gui_controller import GUIController
 from gui.batch_task_page import BatchTaskPage
 from gui.main_page import MainPage
+from gui.thumbnail_cache import ThumbnailCache, ThumbnailLoader
 
 
 def get_resource_path(relative_path):
@@ -24,6 +26,11 @@ class NCMConverterGUI(QMainWindow):
         # 实例化控制器
         self.controller = GUIController()
 
+        # 两个页面共用的封面缩略图加载器，缩略图同时缓存在用户缓存目录中
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+        self.thumbnail_loader = ThumbnailLoader(
+            ThumbnailCache(disk_dir=os.path.join(cache_dir, "thumbnails") if cache_dir else None), parent=self)
+
         # 初始化UI
         self.setup_ui()
 
@@ -38,8 +45,8 @@ class NCMConverterGUI(QMainWindow):
         self.setCentralWidget(self.central_widget)
 
         # 实例化页面并添加进主部件
-        self.page_single = MainPage(self.controller)
-        self.page_batch = BatchTaskPage(self.controller)
+        self.page_single = MainPage(self.controller, self.thumbnail_loader)
+        self.page_batch = BatchTaskPage(self.controller, self.thumbnail_loader)
         self.central_widget.addTab(self.page_single, "单文件解析")
         self.central_widget.addTab(self.page_batch, "批量解析")
 
@@ -103,6 +110,11 @@ class NCMConverterGUI(QMainWindow):
                     }
                 """)
 
+    def closeEvent(self, event):
+        # 运行中的 QThread 随窗口销毁会导致进程崩溃，先让工作线程在下一个分块之前退出
+        self.controller.shutdown()
+        super().closeEvent(event)
+
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
@@ -0,0 +1,170 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QSize, Qt, Signal, QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QImage, QImageReader
+
+from domain.exceptions import NCMException
+from session.decryption_session import DecryptionSession
+
+"""
+缩略图缓存键：封面 sha256，目标宽度，目标高度
+"""
+ThumbnailKey = Tuple[str, int, int]
+
+
+class ThumbnailCache:
+    """
+    LRU cache of scaled cover thumbnails keyed by cover hash and target size, kept in memory and
+    optionally mirrored to PNG files on disk so they survive restarts. Safe to use from worker threads.
+    按封面哈希与目标尺寸缓存缩放后的缩略图（LRU）。内存缓存之外可选写入磁盘 PNG 文件，重启后仍可复用。可在工作线程中使用。
+    """
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None):
+        """
+        :param max_entries: int 内存中最多保留的缩略图数量
+        :param disk_dir: Optional[str] 磁盘缓存目录，为空时只使用内存缓存
+        """
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._images: OrderedDict[ThumbnailKey, QImage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(cover_bytes: bytes, size: QSize) -> ThumbnailKey:
+        return hashlib.sha256(cover_bytes).hexdigest(), size.width(), size.height()
+
+    def _disk_path(self, key: ThumbnailKey) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        digest, width, height = key
+        return self.disk_dir / digest[:2] / f"{digest}_{width}x{height}.png"
+
+    def get(self, key: ThumbnailKey) -> Optional[QImage]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+
+        disk_path = self._disk_path(key)
+        if disk_path is not None and disk_path.is_file():
+            image = QImage(str(disk_path))
+            if not image.isNull():
+                self._remember(key, image)
+                return image
+        return None
+
+    def put(self, key: ThumbnailKey, image: QImage) -> None:
+        self._remember(key, image)
+
+        disk_path = self._disk_path(key)
+        if disk_path is not None and not disk_path.exists():
+            try:
+                disk_path.parent.mkdir(parents=True, exist_ok=True)
+                # 先写临时文件再改名，避免其他线程读到写了一半的图片
+                temp_path = disk_path.with_suffix(f".{threading.get_ident()}.tmp")
+                if image.save(str(temp_path), "PNG"):
+                    temp_path.replace(disk_path)
+            except OSError:
+                pass  # 磁盘缓存只是加速手段，写入失败时忽略
+
+    def _remember(self, key: ThumbnailKey, image: QImage) -> None:
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+
+
+def render_thumbnail(cover_bytes: bytes, size: QSize) -> QImage:
+    """
+    Decode and scale a cover to fit size. QImageReader.setScaledSize lets the JPEG decoder
+    downscale while decoding, so a 3000×3000 cover is never fully decoded.
+    解码并缩放封面以适应 size。QImageReader.setScaledSize 使 JPEG 解码器在解码时直接缩小，
+    3000×3000 的封面无需完整解码。
+    """
+    buffer = QBuffer()
+    buffer.setData(QByteArray(cover_bytes))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+
+    source_size = reader.size()
+    if source_size.isValid():
+        reader.setScaledSize(source_size.scaled(size, Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return image
+    if image.width() > size.width() or image.height() > size.height():
+        image = image.scaled(size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    return image
+
+
+class _ThumbnailSignals(QObject):
+    signal_thumbnail_ready = Signal(str, QImage)  # 缩略图完成信号：请求标识，缩略图（失败时为空图片）
+
+
+class _ThumbnailJob(QRunnable):
+    def __init__(self, cache: ThumbnailCache, signals: _ThumbnailSignals, tag: str, size: QSize,
+                 cover_bytes: Optional[bytes] = None, file_path: Optional[str] = None):
+        super().__init__()
+        self.cache = cache
+        self.signals = signals
+        self.tag = tag
+        self.size = size
+        self.cover_bytes = cover_bytes
+        self.file_path = file_path
+
+    def run(self):
+        image = QImage()
+        try:
+            cover_bytes = self.cover_bytes
+            if cover_bytes is None:
+                # 只读取文件头与封面，不读取音频
+                cover_bytes = DecryptionSession(self.file_path).get_cover_bytes()
+            if cover_bytes:
+                key = self.cache.make_key(cover_bytes, self.size)
+                image = self.cache.get(key)
+                if image is None:
+                    image = render_thumbnail(cover_bytes, self.size)
+                    if not image.isNull():
+                        self.cache.put(key, image)
+        except (NCMException, ValueError, OSError):
+            image = QImage()
+        self.signals.signal_thumbnail_ready.emit(self.tag, image)
+
+
+class ThumbnailLoader(QObject):
+    """
+    Produces thumbnails on a thread pool so decoding and scaling never block the GUI thread.
+    Results arrive through signal_thumbnail_ready with the tag given in the request; receivers
+    turn the QImage into a QPixmap on the GUI thread.
+    在线程池中生成缩略图，解码与缩放不占用 GUI 线程。结果通过 signal_thumbnail_ready 连同请求标识返回，
+    接收方在 GUI 线程中将 QImage 转为 QPixmap。
+    """
+    signal_thumbnail_ready = Signal(str, QImage)
+
+    def __init__(self, cache: Optional[ThumbnailCache] = None, max_threads: int = 2,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.cache = cache or ThumbnailCache()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_threads)
+        self._signals = _ThumbnailSignals()
+        self._signals.signal_thumbnail_ready.connect(self.signal_thumbnail_ready)
+
+    def request(self, tag: str, cover_bytes: bytes, size: QSize) -> None:
+        """为已在内存中的封面生成缩略图"""
+        self._pool.start(_ThumbnailJob(self.cache, self._signals, tag, size, cover_bytes=cover_bytes))
+
+    def request_file(self, tag: str, file_path: str, size: QSize) -> None:
+        """读取 NCM 文件中的封面并生成缩略图"""
+        self._pool.start(_ThumbnailJob(self.cache, self._signals, tag, size, file_path=file_path))
+
+    def clear_pending(self) -> None:
+        self._pool.clear()
+
+    def wait(self, timeout_ms: int = -1) -> bool:
+        return self._pool.waitForDone(timeout_ms)
@@ -0,0 +1,148 @@
+import contextlib
+import io
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Callable, Optional
+
+from domain.exceptions import NCMExportException
+from session.atomic_output import temp_path_for
+
+TAR_WRITE_MODES = {
+    ".tar": "w|",
+    ".tar.gz": "w|gz", ".tgz": "w|gz",
+    ".tar.bz2": "w|bz2", ".tbz2": "w|bz2",
+    ".tar.xz": "w|xz", ".txz": "w|xz",
+}
+
+
+class ArchiveSink:
+    """
+    Single writer that streams converted tracks into one zip or tar archive.
+    Workers hand finished tracks over through a bounded queue and a background thread appends them
+    sequentially, so a large batch turns into a few large sequential writes instead of many loose files.
+    Zip entries are stored without compression because the audio is already compressed.
+    将转换结果写入单个 zip / tar 压缩包的写入器。各任务通过有界队列提交结果，由后台线程顺序追加，
+    大批量任务因此变为少量大块顺序写入。音频本身已压缩，zip 条目以不压缩方式存储。
+    压缩包先写入同目录的临时文件，正常关闭后才改名为目标文件；出错或被中断时删除临时文件，不会留下缺少部分曲目的压缩包。
+    """
+    def __init__(self, archive_path: str, max_pending: int = 8, buffer_size: int = 8 * 1024 * 1024):
+        """
+        :param archive_path: str .zip / .tar / .tar.gz / .tar.bz2 / .tar.xz
+        :param max_pending: int 队列中最多等待写入的文件数，用于限制内存占用
+        :param buffer_size: int 输出文件缓冲区大小
+        """
+        self.archive_path = str(Path(archive_path).resolve())
+        lower_path = self.archive_path.lower()
+        self._tar_mode = next((mode for suffix, mode in TAR_WRITE_MODES.items() if lower_path.endswith(suffix)), None)
+        if self._tar_mode is None and not lower_path.endswith(".zip"):
+            raise NCMExportException(f"不支持的压缩包格式：{archive_path}")
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._names = set()
+        self._names_lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+
+        Path(self.archive_path).parent.mkdir(parents=True, exist_ok=True)
+        self._temp_path = temp_path_for(self.archive_path)
+        self._file = open(self._temp_path, "wb", buffering=buffer_size)
+        try:
+            if self._tar_mode:
+                self._archive = tarfile.open(fileobj=self._file, mode=self._tar_mode)
+            else:
+                self._archive = zipfile.ZipFile(self._file, mode="w", compression=zipfile.ZIP_STORED)
+        except (OSError, tarfile.TarError) as e:
+            self._file.close()
+            self._discard()
+            raise NCMExportException(f"创建压缩包失败：{e}")
+
+        self._writer = threading.Thread(target=self._write_loop, name="ncm-archive-writer", daemon=True)
+        self._writer.start()
+
+    def _unique_name(self, arcname: str) -> str:
+        path = PurePosixPath(arcname)
+        with self._names_lock:
+            candidate, index = arcname, 2
+            while candidate in self._names:
+                candidate = str(path.with_name(f"{path.stem} ({index}){path.suffix}"))
+                index += 1
+            self._names.add(candidate)
+        return candidate
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            arcname, data, on_written = item
+            if self._error is not None:
+                # 出错后继续取出队列元素，避免提交方阻塞
+                if on_written:
+                    on_written()
+                continue
+
+            try:
+                if self._tar_mode:
+                    info = tarfile.TarInfo(arcname)
+                    info.size = len(data)
+                    info.mtime = int(time.time())
+                    self._archive.addfile(info, io.BytesIO(data))
+                else:
+                    info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    self._archive.writestr(info, data)
+            except BaseException as e:
+                self._error = e
+            if on_written:
+                on_written()
+
+    def add(self, arcname: str, data: bytes, on_written: Optional[Callable[[], None]] = None) -> str:
+        """
+        Queue a converted track, blocking while the queue is full. Returns the name used in the archive.
+        提交一个转换后的文件，队列已满时阻塞。返回实际写入压缩包的文件名（重名时自动追加序号）。
+
+        :param on_written: Optional[Callable] 该文件写入压缩包（或因出错被丢弃）后在写入线程中调用，可用于释放内存预算
+        """
+        if self._error is not None:
+            raise NCMExportException(f"写入压缩包失败：{self._error}")
+        arcname = self._unique_name(arcname)
+        self._queue.put((arcname, data, on_written))
+        return arcname
+
+    def _discard(self):
+        with contextlib.suppress(OSError):
+            self._temp_path.unlink()
+
+    def close(self, discard: bool = False):
+        """
+        :param discard: bool 为真时丢弃已写入的内容（例如批量任务被中断），不生成目标压缩包
+        """
+        self._queue.put(None)
+        self._writer.join()
+        try:
+            try:
+                self._archive.close()
+            finally:
+                self._file.close()
+        except BaseException as e:
+            self._error = self._error or e
+        if discard or self._error is not None:
+            self._discard()
+        else:
+            try:
+                os.replace(self._temp_path, self.archive_path)
+            except OSError as e:
+                self._error = e
+                self._discard()
+        if self._error is not None:
+            raise NCMExportException(f"写入压缩包失败：{self._error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(discard=exc_type is not None)
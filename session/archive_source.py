@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterator, List, Tuple
+
+# CLI 启动时需要调用 is_archive 判断输入类型，tarfile / zipfile 仅在真正读取压缩包时导入
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_archive(path: str) -> bool:
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_zip(path: str) -> bool:
+    return str(path).lower().endswith(".zip")
+
+
+def member_stem(member: str) -> str:
+    """
+    Return the member's path inside the archive without its extension, e.g. "a/x" for "a/x.ncm", so members
+    with the same name in different folders get different outputs. Absolute paths and ".." are dropped so the
+    output never leaves the output directory.
+    返回成员在压缩包内去掉扩展名的相对路径（如 a/x.ncm 为 a/x），使不同文件夹中的同名成员输出到不同位置。
+    绝对路径与 .. 会被去除，输出不会超出输出目录。
+    """
+    path = PurePosixPath(member.replace("\\", "/"))
+    folders = [part for part in path.parent.parts if part not in ("/", ".", "..")]
+    return str(PurePosixPath(*folders, path.stem))
+
+
+def list_zip_members(archive_path: str) -> List[str]:
+    """列出 zip 包中的 .ncm 成员，zip 成员可独立随机读取，因此可拆分为多个并行任务"""
+    import zipfile
+
+    with zipfile.ZipFile(archive_path) as archive:
+        return [info.filename for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".ncm")]
+
+
+@contextmanager
+def open_archive_member(archive_path: str, member: str) -> Iterator[BinaryIO]:
+    """打开 zip 包中的单个成员，返回边读边解压的流"""
+    import zipfile
+
+    with zipfile.ZipFile(archive_path) as archive, archive.open(member) as stream:
+        yield stream
+
+
+def iter_archive_members(archive_path: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yield (member name, stream) for every .ncm member in archive order without extracting to disk.
+    Tar archives are read in streaming mode so compressed tarballs are decompressed exactly once;
+    each stream is only valid until the next member is requested.
+    按包内顺序逐个返回 .ncm 成员名及其数据流，不解压到磁盘。tar 包以流模式读取，压缩包只需解压一遍；
+    每个数据流仅在请求下一个成员前有效。
+    """
+    import tarfile
+    import zipfile
+
+    if is_zip(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in list_zip_members(archive_path):
+                with archive.open(member) as stream:
+                    yield member, stream
+        return
+
+    with tarfile.open(archive_path, mode="r|*") as archive:
+        for info in archive:
+            if not info.isfile() or not info.name.lower().endswith(".ncm"):
+                continue
+            stream = archive.extractfile(info)
+            if stream is None:
+                continue
+            with stream:
+                yield info.name, stream
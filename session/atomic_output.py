@@ -0,0 +1,44 @@
+import contextlib
+import os
+import threading
+from pathlib import Path
+from typing import Iterator
+
+"""
+原子输出：先写入目标目录中的隐藏临时文件，全部写完（含封面标签）后再改名为目标文件。任务失败、被取消或进程被中断时
+删除临时文件，目标路径上要么是完整的输出，要么保持原样，因此已存在的输出文件总是完整的，重新运行时可以放心跳过。
+进程被强制结束时可能残留 .part 临时文件，但不会被当作输出。
+"""
+TEMP_SUFFIX = ".part"
+
+
+def temp_path_for(output_path: str) -> Path:
+    """与目标文件位于同一目录（同一文件系统，改名为原子操作）的临时文件路径，包含进程与线程号，并发写入互不干扰"""
+    target = Path(output_path)
+    return target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}{TEMP_SUFFIX}")
+
+
+@contextlib.contextmanager
+def atomic_output(output_path: str) -> Iterator[str]:
+    """
+    Yield a temporary path next to output_path and move it into place when the block completes.
+    On any exception (including cancellation and KeyboardInterrupt) the temporary file is removed.
+    Existing non-regular targets (e.g. /dev/null, FIFOs) are written directly.
+    返回与 output_path 同目录的临时路径，代码块正常结束后改名为目标文件；发生任何异常（包括取消与 KeyboardInterrupt）时删除临时文件。
+    目标为已存在的非普通文件（如 /dev/null、命名管道）时直接写入。
+
+    :param output_path: str 目标文件路径
+    """
+    target = Path(output_path)
+    if target.exists() and not target.is_file():
+        yield output_path
+        return
+
+    temp_path = temp_path_for(output_path)
+    try:
+        yield str(temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            temp_path.unlink()
+        raise
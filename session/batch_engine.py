@@ -0,0 +1,534 @@
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import replace
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from codec.cover_processor import get_cover_processor
+from codec.format_converter import FormatConverter
+from domain.exceptions import NCMException
+from domain.models import BatchTask, BatchResult, ClipOptions, CoverOptions, ExportResult, NCMMetadata, \
+    TranscodeOptions, SKIPPED_MESSAGE
+from session.archive_source import is_archive, is_zip, list_zip_members, member_stem, \
+    open_archive_member, iter_archive_members
+from session.archive_sink import ArchiveSink
+from session.atomic_output import atomic_output
+from session.checksum import DigestSet, DigestWriter
+from session.chunk_tuner import DEFAULT_CHUNK_SIZE
+from session.decryption_session import CoverTransform, DecryptionSession, ProgressCallback
+from session.prefetcher import DEFAULT_PREFETCH_DEPTH, Prefetcher
+from session.memory_budget import MemoryBudget
+from session.scheduler import describe_tasks, order_tasks, resolve_schedule, schedule_order
+from session.stream_session import StreamDecryptionSession
+
+"""
+批量结果回调类型注解：单个任务结果，已完成数量，总数量
+"""
+BatchResultCallback = Callable[[BatchResult, int, int], None]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+"""
+并行执行方式：auto 在自由线程（无 GIL）构建上使用线程池，否则使用进程池
+"""
+EXECUTOR_KINDS = ("auto", "thread", "process")
+
+
+def is_free_threaded() -> bool:
+    """当前解释器是否为自由线程构建且运行时未重新启用 GIL"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def resolve_executor_kind(kind: str = "auto") -> str:
+    if kind not in EXECUTOR_KINDS:
+        raise NCMException(f"不支持的并行方式：{kind}")
+    if kind == "auto":
+        return "thread" if is_free_threaded() else "process"
+    return kind
+
+
+def create_executor(jobs: int, kind: str = "auto", initializer: Optional[Callable] = None,
+                    initargs: tuple = ()) -> Executor:
+    """
+    Create the worker pool for parallel tasks. Threads share one process, so there is no pickling of
+    tasks and results and no interpreter start-up per worker, but they only scale across cores when the
+    GIL is disabled; on GIL builds "auto" therefore picks a process pool.
+    创建并行任务的工作池。线程共享同一进程，无需序列化任务与结果，也没有子进程启动开销，但只有在 GIL 关闭时才能利用多核，
+    因此 auto 在带 GIL 的构建上选择进程池。
+
+    :param jobs: int 并行线程 / 进程数
+    :param kind: str auto / thread / process
+    :param initializer: Optional[Callable] 每个工作线程 / 进程的初始化函数
+    :param initargs: tuple 初始化函数参数
+    """
+    if resolve_executor_kind(kind) == "thread":
+        return ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="ncm-worker",
+                                  initializer=initializer, initargs=initargs)
+    return ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs)
+
+
+def collect_ncm_files(paths: Iterable[str]) -> List[str]:
+    """
+    Expand files and directories into a de-duplicated list of .ncm file paths.
+    Archives given explicitly are kept as they are and expanded by expand_tasks.
+    将文件与文件夹（递归）展开为去重后的 .ncm 文件路径列表。直接指定的压缩包原样保留，由 expand_tasks 展开。
+    """
+    return [file_path for file_path, _ in _walk_ncm_files(paths)]
+
+
+def _walk_ncm_files(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """逐个返回去重后的（.ncm 文件路径，相对于所在输入文件夹的子目录），直接指定的文件子目录为空"""
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                folder = os.path.relpath(root, path)
+                for file in sorted(files):
+                    if not file.lower().endswith(".ncm"):
+                        continue
+                    resolved = str(Path(root, file).resolve())
+                    if resolved not in seen:
+                        seen.add(resolved)
+                        yield resolved, "" if folder == os.curdir else folder
+        else:
+            resolved = str(Path(path).resolve())
+            if resolved not in seen:
+                seen.add(resolved)
+                yield resolved, ""
+
+
+def expand_tasks(paths: Iterable[str], output_dir: Optional[str] = None) -> List[BatchTask]:
+    """
+    Build batch tasks from files, directories and archives. Zip members become one task each so they
+    can run in parallel; a tar archive stays a single task because compressed tarballs can only be
+    read efficiently front to back.
+    根据文件、文件夹与压缩包生成批量任务。zip 包按成员拆分以便并行；tar 包只能高效地顺序读取，因此整体作为一个任务。
+    指定输出目录时，递归扫描到的文件保留其在输入文件夹中的子目录，不同子目录中的同名文件不会互相覆盖。
+    """
+    tasks = []
+    for file_path, folder in _walk_ncm_files(paths):
+        task_output_dir = os.path.join(output_dir, folder) if output_dir and folder else output_dir
+        if is_zip(file_path):
+            try:
+                tasks.extend(BatchTask(file_path, output_dir=task_output_dir, member=member)
+                             for member in list_zip_members(file_path))
+                continue
+            except (OSError, zipfile.BadZipFile):
+                pass  # 作为整体任务保留，由 run_task 报告错误
+        tasks.append(BatchTask(file_path, output_dir=task_output_dir))
+    return tasks
+
+
+def iter_metadata(paths: Iterable[str]) -> Iterator[Tuple[str, Optional[NCMMetadata], str]]:
+    """
+    Yield (input path, metadata, error message) for every .ncm file and archive member, reading headers only.
+    逐个返回 .ncm 文件与压缩包成员的（路径，元数据，错误信息），只读取文件头。
+    """
+    for file_path in collect_ncm_files(paths):
+        if not is_archive(file_path):
+            try:
+                yield file_path, DecryptionSession(file_path).get_metadata(), ""
+            except (NCMException, ValueError, OSError) as e:
+                yield file_path, None, str(e)
+            continue
+
+        try:
+            for member, stream in iter_archive_members(file_path):
+                input_path = str(Path(file_path) / member)
+                try:
+                    yield input_path, StreamDecryptionSession(stream, input_path).get_metadata(), ""
+                except (NCMException, ValueError) as e:
+                    yield input_path, None, str(e)
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+            yield file_path, None, f"读取压缩包失败：{e}"
+
+
+def resolve_output_path(task: BatchTask, audio_format: str, member: Optional[str] = None) -> str:
+    if task.output_path:
+        return str(Path(task.output_path).resolve())
+
+    input_path = Path(task.input_path).resolve()
+    output_dir = Path(task.output_dir).resolve() if task.output_dir else input_path.parent
+    stem = member_stem(member) if member else input_path.stem
+    return str(output_dir / (stem + "." + audio_format))
+
+
+@lru_cache(maxsize=None)
+def _get_converter(transcode: TranscodeOptions, max_encoders: int = 1) -> FormatConverter:
+    # 每个进程共用一个转换器，同一进程内并发的编码器数量由其信号量限制
+    return FormatConverter(transcode, max_encoders)
+
+
+def select_converter(audio_format: str, transcode: Optional[TranscodeOptions],
+                     max_encoders: int = 1) -> Optional[FormatConverter]:
+    """源格式与目标格式相同时无需转码，返回 None。线程池模式下所有线程共用一个转换器，max_encoders 为线程数"""
+    if transcode is None or transcode.target_format == audio_format:
+        return None
+    return _get_converter(transcode, max_encoders)
+
+
+def select_cover_transform(cover_options: Optional[CoverOptions]) -> Optional[CoverTransform]:
+    """未指定封面处理选项时返回 None；否则返回本进程共用的 CoverProcessor，同一封面只处理一次"""
+    if cover_options is None:
+        return None
+    return get_cover_processor(cover_options).process
+
+
+def export_stream(session: StreamDecryptionSession, output: BinaryIO, converter: Optional[FormatConverter],
+                   chunk_size: int, progress_callback: Optional[ProgressCallback] = None, total_size: int = 0,
+                   output_path: str = "", digests: Sequence[str] = (),
+                   clip: Optional[ClipOptions] = None) -> ExportResult:
+    """写出音频；指定 digests 时同时计算解密音频与输出数据的哈希，指定 clip 时只写出开头的片段"""
+    audio_digests = DigestSet(digests) if digests else None
+    file_digests = DigestSet(digests) if digests else None
+    if file_digests is not None:
+        output = DigestWriter(output, file_digests)
+
+    if converter is None:
+        audio_size = session.export_to_stream(output, chunk_size, progress_callback, total_size, audio_digests,
+                                              clip=clip)
+    else:
+        audio_size = session.transcode_to_stream(output, converter, chunk_size, progress_callback, total_size,
+                                                 audio_digests, clip=clip)
+
+    if file_digests is None:
+        return ExportResult(output_path, audio_size)
+    return ExportResult(output_path, audio_size, file_digests.size,
+                        audio_digests.hexdigests(), file_digests.hexdigests())
+
+
+def _convert_stream(task: BatchTask, input_path: str, member: Optional[str], stream: BinaryIO, chunk_size: int,
+                    progress_callback: Optional[ProgressCallback] = None,
+                    transcode: Optional[TranscodeOptions] = None,
+                    cover_options: Optional[CoverOptions] = None, digests: Sequence[str] = (),
+                    max_encoders: int = 1, skip_existing: bool = False,
+                    clip: Optional[ClipOptions] = None) -> BatchResult:
+    start = time.perf_counter()
+    output_path = ""
+
+    try:
+        session = StreamDecryptionSession(stream, input_path, select_cover_transform(cover_options))
+        audio_format = session.get_metadata().format
+        converter = select_converter(audio_format, transcode, max_encoders)
+        if converter:
+            audio_format = converter.options.target_format
+        output_path = resolve_output_path(task, audio_format, member)
+        if skip_existing and os.path.isfile(output_path):
+            return BatchResult(input_path, output_path, True, SKIPPED_MESSAGE, 0, time.perf_counter() - start)
+        # 普通文件可预知音频大小，用于显示进度百分比
+        total_size = 0 if member else os.fstat(stream.fileno()).st_size - session.get_audio_offset()
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(output_path) as temp_path, open(temp_path, "wb") as f:
+            export = export_stream(session, f, converter, chunk_size, progress_callback, total_size,
+                                    output_path, digests, clip)
+        input_size = session.get_audio_offset() + export.audio_size
+        return BatchResult(input_path, output_path, True, "完成", input_size, time.perf_counter() - start,
+                           export if digests else None)
+
+    except (NCMException, ValueError, OSError) as e:
+        return BatchResult(input_path, output_path, False, str(e), 0, time.perf_counter() - start)
+
+
+def convert_task(task: BatchTask, chunk_size: int = 1024 * 1024,
+                 progress_callback: Optional[ProgressCallback] = None,
+                 cover_options: Optional[CoverOptions] = None, digests: Sequence[str] = (),
+                 skip_existing: bool = False, clip: Optional[ClipOptions] = None) -> BatchResult:
+    """
+    Convert a single task. Module-level so that it can be pickled into worker processes.
+    执行单个转换任务。定义在模块级以便传递给子进程。
+    """
+    start = time.perf_counter()
+    output_path = ""
+    input_size = 0
+
+    try:
+        session = DecryptionSession(task.input_path, select_cover_transform(cover_options))
+        input_size = session.file_size
+        metadata = session.get_metadata()
+        output_path = resolve_output_path(task, metadata.format)
+        if skip_existing and os.path.isfile(output_path):
+            # 输出总是先写入临时文件再改名，已存在的输出文件一定是完整的
+            return BatchResult(task.input_path, output_path, True, SKIPPED_MESSAGE, 0, time.perf_counter() - start)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        export = session.export_with_chunk(output_path, chunk_size, progress_callback, digests, clip=clip)
+        return BatchResult(task.input_path, output_path, True, "完成", input_size, time.perf_counter() - start,
+                           export if digests else None)
+
+    except (NCMException, ValueError, OSError) as e:
+        return BatchResult(task.input_path, output_path, False, str(e), input_size, time.perf_counter() - start)
+
+
+def iter_task_streams(task: BatchTask) -> Iterator[Tuple[str, Optional[str], BinaryIO]]:
+    """逐个返回任务对应的（显示路径，压缩包成员名，只前向数据流），普通文件的成员名为 None"""
+    if task.member:
+        with open_archive_member(task.input_path, task.member) as stream:
+            yield str(Path(task.input_path) / task.member), task.member, stream
+    elif is_archive(task.input_path):
+        for member, stream in iter_archive_members(task.input_path):
+            yield str(Path(task.input_path) / member), member, stream
+    else:
+        with open(task.input_path, "rb") as stream:
+            yield task.input_path, None, stream
+
+
+def run_task(task: BatchTask, chunk_size: int = 1024 * 1024,
+             progress_callback: Optional[ProgressCallback] = None,
+             transcode: Optional[TranscodeOptions] = None,
+             cover_options: Optional[CoverOptions] = None, digests: Sequence[str] = (),
+             max_encoders: int = 1, skip_existing: bool = False,
+             clip: Optional[ClipOptions] = None) -> List[BatchResult]:
+    """
+    Run a task of any kind (plain file, zip member or whole archive) and return its results.
+    Transcoding always goes through the forward-only stream session so audio is piped straight into the encoder.
+    执行任意类型的任务（普通文件、zip 成员或整个压缩包），返回结果列表。转码时统一使用流式会话，音频直接送入编码器。
+
+    :param skip_existing: bool 输出文件已存在时跳过转换（只读取文件头以确定输出路径）
+    :param clip: Optional[ClipOptions] 指定时只导出每首音频开头的片段，只读取切点之前的数据
+    """
+    if not task.member and not is_archive(task.input_path) and transcode is None:
+        return [convert_task(task, chunk_size, progress_callback, cover_options, digests, skip_existing, clip)]
+
+    results = []
+    try:
+        for input_path, member, stream in iter_task_streams(task):
+            results.append(_convert_stream(task, input_path, member, stream, chunk_size, progress_callback,
+                                           transcode, cover_options, digests, max_encoders, skip_existing, clip))
+    except (OSError, KeyError, tarfile.TarError, zipfile.BadZipFile) as e:
+        results.append(BatchResult(task.input_path, "", False, f"读取压缩包失败：{e}"))
+    return results
+
+
+def render_task(task: BatchTask, chunk_size: int = 1024 * 1024,
+                transcode: Optional[TranscodeOptions] = None,
+                cover_options: Optional[CoverOptions] = None, digests: Sequence[str] = (),
+                max_encoders: int = 1, clip: Optional[ClipOptions] = None) -> List[Tuple[BatchResult, bytes]]:
+    """
+    Convert a task in memory for an ArchiveSink. Each result's output_path holds the suggested archive name.
+    在内存中转换任务，供 ArchiveSink 写入压缩包。结果的 output_path 为建议的压缩包内文件名。
+    """
+    rendered = []
+    try:
+        for input_path, member, stream in iter_task_streams(task):
+            start = time.perf_counter()
+            try:
+                session = StreamDecryptionSession(stream, input_path, select_cover_transform(cover_options))
+                audio_format = session.get_metadata().format
+                converter = select_converter(audio_format, transcode, max_encoders)
+                if converter:
+                    audio_format = converter.options.target_format
+                buffer = io.BytesIO()
+                stem = member_stem(member) if member else Path(input_path).stem
+                arcname = stem + "." + audio_format
+                export = export_stream(session, buffer, converter, chunk_size, output_path=arcname, digests=digests,
+                                       clip=clip)
+                input_size = session.get_audio_offset() + export.audio_size
+                rendered.append((BatchResult(input_path, arcname, True, "完成", input_size, time.perf_counter() - start,
+                                             export if digests else None), buffer.getvalue()))
+            except (NCMException, ValueError, OSError) as e:
+                rendered.append((BatchResult(input_path, "", False, str(e), 0, time.perf_counter() - start), b""))
+    except (OSError, KeyError, tarfile.TarError, zipfile.BadZipFile) as e:
+        rendered.append((BatchResult(task.input_path, "", False, f"读取文件失败：{e}"), b""))
+    return rendered
+
+
+def map_in_pool(func: Callable[[T], R], items: List[T], jobs: int = 1, executor_kind: str = "auto") -> Iterator[R]:
+    """
+    Apply a header-only function to every item in input order. Each call is only a few KB of work,
+    so items are shipped to worker processes in chunks rather than one submission per file
+    (thread pools ignore the chunk size).
+    按输入顺序对每个元素执行只读文件头的函数。单次调用只有几KB的工作量，因此成批分发给子进程，而不是逐个提交（线程池忽略分批大小）。
+
+    :param func: Callable 模块级函数，以便传递给子进程
+    :param items: List 待处理元素
+    :param jobs: int 并行线程 / 进程数，1 表示在当前进程中顺序执行
+    :param executor_kind: str auto / thread / process，见 create_executor
+    """
+    if jobs <= 1 or len(items) <= 1:
+        yield from map(func, items)
+        return
+
+    chunk_size = max(1, min(256, len(items) // (jobs * 8)))
+    with create_executor(jobs, executor_kind) as executor:
+        yield from executor.map(func, items, chunksize=chunk_size)
+
+
+class BatchEngine:
+    def __init__(self, jobs: int = 1, chunk_size: int = 1024 * 1024,
+                 initializer: Optional[Callable] = None, initargs: tuple = (),
+                 sink: Optional[ArchiveSink] = None, transcode: Optional[TranscodeOptions] = None,
+                 cover_options: Optional[CoverOptions] = None, digests: Sequence[str] = (),
+                 executor: str = "auto", prefetch: int = DEFAULT_PREFETCH_DEPTH, schedule: str = "auto",
+                 memory_budget: int = 0, skip_existing: bool = False, clip: Optional[ClipOptions] = None):
+        """
+        :param jobs: int 并行线程 / 进程数，1 表示在当前进程中顺序执行
+        :param chunk_size: int 分块解密大小
+        :param initializer: Optional[Callable] 工作线程 / 子进程初始化函数（顺序执行时在当前进程调用一次）
+        :param initargs: tuple 初始化函数参数
+        :param sink: Optional[ArchiveSink] 指定时转换结果写入该压缩包，而不是输出为单独的文件
+        :param transcode: Optional[TranscodeOptions] 指定时经外部编码器转码，每个进程同时只运行一个编码器
+        :param cover_options: Optional[CoverOptions] 指定时在嵌入前缩放并重新压缩封面，处理在各子进程中进行
+        :param digests: Sequence[str] 导出时同时计算的哈希算法，结果记录在 BatchResult.export 中
+        :param executor: str auto / thread / process，auto 在自由线程构建上使用线程池，否则使用进程池
+        :param prefetch: int 在后台 I/O 线程中预取接下来多少个文件的文件头与音频开头，0 表示不预取
+        :param schedule: str 任务执行顺序 auto / input / size / location，见 session.scheduler
+        :param memory_budget: int 全部在途任务（分块缓冲区、封面、待写入压缩包的结果）的内存预算字节数，0 表示不限制；
+                              超出时先缩小新任务的分块大小，仍然不够则暂缓提交新文件，见 session.memory_budget
+        :param skip_existing: bool 跳过输出文件已存在的任务，用于继续被中断的批量任务；压缩包输出模式下无效
+        :param clip: Optional[ClipOptions] 指定时只导出每首音频开头的片段（如曲库试听），见 codec.audio_clip
+        """
+        self.jobs = max(1, jobs)
+        self.chunk_size = chunk_size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.sink = sink
+        self.transcode = transcode
+        self.cover_options = cover_options
+        self.digests = tuple(digests)
+        self.executor_kind = resolve_executor_kind(executor)
+        self.prefetch = max(0, prefetch)
+        self.schedule = resolve_schedule(schedule, self.jobs)
+        self.memory_budget = max(0, memory_budget)
+        self.skip_existing = skip_existing
+        self.clip = clip
+
+    def _finish(self, task_output, release: Callable[[], None] = lambda: None) -> List[BatchResult]:
+        """
+        普通模式下直接返回结果；压缩包模式下将转换数据提交给写入器。
+        release 在任务占用的内存可以释放时调用：普通模式下立即调用，压缩包模式下在最后一个文件写入压缩包后调用
+        """
+        if self.sink is None:
+            release()
+            return task_output
+
+        # 写入器按提交顺序写出，最后一个文件写出时，该任务的全部数据都已离开内存
+        last_index = max((index for index, (result, _) in enumerate(task_output) if result.success), default=None)
+        if last_index is None:
+            release()
+
+        task_results = []
+        for index, (result, data) in enumerate(task_output):
+            if result.success:
+                try:
+                    arcname = self.sink.add(result.output_path, data, release if index == last_index else None)
+                    result.output_path = str(Path(self.sink.archive_path) / arcname)
+                    if result.export is not None:
+                        result.export.output_path = result.output_path
+                except NCMException as e:
+                    result.success, result.message = False, str(e)
+                    if index == last_index:
+                        release()
+            task_results.append(result)
+        return task_results
+
+    def run(self, tasks: List[BatchTask],
+            result_callback: Optional[BatchResultCallback] = None) -> List[BatchResult]:
+        """
+        Run all tasks in the order chosen by the schedule policy and return results in completion order.
+        按调度策略决定的顺序执行全部任务，按完成顺序返回结果。
+        """
+        budget = MemoryBudget(self.memory_budget) if self.memory_budget else None
+        if budget is not None:
+            footprints = describe_tasks(tasks)
+            order = schedule_order(footprints, self.schedule)
+            tasks, sizes = [tasks[i] for i in order], [footprints[i].size for i in order]
+        else:
+            tasks = order_tasks(tasks, self.schedule, self.jobs)
+            sizes = [0] * len(tasks)
+        results = []
+        total = len(tasks)
+
+        def collect(task_results: List[BatchResult]):
+            # 整个压缩包作为一个任务时会返回多个结果，总数随之修正
+            nonlocal total
+            total += len(task_results) - 1
+            for result in task_results:
+                results.append(result)
+                if result_callback:
+                    result_callback(result, len(results), total)
+
+        worker = render_task if self.sink else run_task
+        options = {"transcode": self.transcode, "cover_options": self.cover_options, "digests": self.digests}
+        if self.skip_existing and self.sink is None:
+            options["skip_existing"] = True
+        if self.clip is not None:
+            options["clip"] = self.clip
+        read_ahead = self.chunk_size or DEFAULT_CHUNK_SIZE
+
+        def admit(index: int, block: bool) -> Optional[Tuple[int, int]]:
+            """预留第 index 个任务的内存，返回（预留字节数，分块大小）；未设置预算时不限制"""
+            if budget is None:
+                return 0, self.chunk_size
+            return budget.admit(sizes[index], self.chunk_size, self.sink is not None, block)
+
+        def releaser(reserved: int) -> Callable[[], None]:
+            return (lambda: budget.release(reserved)) if budget is not None else (lambda: None)
+
+        if self.jobs == 1 or total <= 1:
+            if self.initializer:
+                self.initializer(*self.initargs)
+            # 窗口从下一个任务开始，每完成一个任务前移一个
+            with Prefetcher(tasks[1:], self.prefetch, read_ahead) as prefetcher:
+                for index, task in enumerate(tasks):
+                    # 压缩包模式下可能仍有等待写入的结果，预算不足时等待写入线程释放
+                    reserved, chunk_size = admit(index, block=True)
+                    collect(self._finish(worker(task, chunk_size, **options), releaser(reserved)))
+                    prefetcher.advance()
+            return results
+
+        cache_dir = None
+        if self.executor_kind == "thread":
+            # 全部线程共用一个转换器，编码器并发数与线程数相同
+            options["max_encoders"] = self.jobs
+        elif self.cover_options is not None and self.cover_options.cache_dir is None:
+            # 各子进程的内存缓存互不共享，借助临时目录使同一封面在整个批量任务中只处理一次
+            cache_dir = tempfile.TemporaryDirectory(prefix="ncm_covers_")
+            options["cover_options"] = replace(self.cover_options, cache_dir=cache_dir.name)
+
+        # 滑动窗口提交：已完成但尚未处理的结果（压缩包模式下为整首音频）不会无限堆积
+        max_pending = self.jobs * 2
+        next_index = 0
+        # 窗口起点为已完成的任务数，其后 jobs 个任务正在处理，再之后的 prefetch 个任务需要预取
+        prefetcher = Prefetcher(tasks, self.jobs + self.prefetch if self.prefetch else 0, read_ahead)
+        with prefetcher, create_executor(min(self.jobs, total), self.executor_kind,
+                                         self.initializer, self.initargs) as executor:
+            futures = {}
+
+            def submit_ready():
+                nonlocal next_index
+                while next_index < len(tasks) and len(futures) < max_pending:
+                    # 没有在途任务时等待额度（只可能被压缩包写入线程释放），否则预算已满就暂缓提交新文件
+                    admission = admit(next_index, block=not futures)
+                    if admission is None:
+                        return
+                    reserved, chunk_size = admission
+                    task = tasks[next_index]
+                    next_index += 1
+                    futures[executor.submit(worker, task, chunk_size, **options)] = (task, reserved)
+
+            submit_ready()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, reserved = futures.pop(future)
+                    prefetcher.advance()
+                    try:
+                        task_results = self._finish(future.result(), releaser(reserved))
+                    except Exception as e:
+                        releaser(reserved)()
+                        task_results = [BatchResult(task.input_path, "", False, str(e))]
+                    submit_ready()
+                    collect(task_results)
+
+        if cache_dir is not None:
+            cache_dir.cleanup()
+        return results
@@ -0,0 +1,25 @@
+import threading
+
+from domain.exceptions import NCMCancelledException
+
+"""
+协作式取消。调用方持有 CancellationToken 并在任意线程中调用 cancel()，会话在每个分块之间检查，
+抛出 NCMCancelledException 后由 atomic_output 删除未完成的临时文件，不会像强制终止线程那样留下截断的输出或未关闭的句柄。
+"""
+
+
+class CancellationToken:
+    """线程安全的取消标记，可在多个会话之间共用"""
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise NCMCancelledException("任务已取消")
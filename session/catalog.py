@@ -0,0 +1,108 @@
+import csv
+import json
+import tarfile
+import zipfile
+from dataclasses import asdict, fields
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from codec.header_decoder import BatchHeaderDecoder
+from domain.exceptions import NCMException
+from domain.models import BatchTask, NCMHeader, NCMMetadata
+from session.batch_engine import iter_task_streams, map_in_pool
+from session.stream_session import read_header, remaining_size, skip_bytes
+
+"""
+曲库元数据导出：每个 .ncm 文件一条记录，包含 NCMMetadata 的全部字段以及路径、文件大小、音频大小与封面大小。
+只解析文件头，不读取封面与音频数据（流模式读取的 tar 包除外）。
+"""
+CATALOG_FIELDS = ["path", "file_size", "audio_size", "cover_size",
+                  *(field.name for field in fields(NCMMetadata)), "error"]
+CSV_LIST_SEPARATOR = ";"
+DECODE_GROUP_SIZE = 64  # 每组批量解码的任务数
+
+CatalogRecord = Dict[str, Any]
+
+
+def _read_sizes(stream: BinaryIO, input_path: str) -> Tuple[CatalogRecord, Optional[NCMHeader]]:
+    """读取文件头并跳过封面与音频，返回尚未填入元数据的记录与待解码的文件头"""
+    record: CatalogRecord = dict.fromkeys(CATALOG_FIELDS, None)
+    record["path"] = input_path
+    try:
+        header = read_header(stream, input_path)
+        skip_bytes(stream, header.cover_length)
+        audio_size = remaining_size(stream)
+        record |= {"file_size": header.audio_offset + audio_size, "audio_size": max(audio_size, 0),
+                   "cover_size": header.cover_length}
+        if audio_size <= 0:
+            record["error"] = "没有音频数据，文件可能被截断"
+        return record, header
+    except (NCMException, ValueError, TypeError, KeyError, AttributeError, IndexError, OSError) as e:
+        record["error"] = str(e)
+        return record, None
+
+
+def catalog_tasks(tasks: List[BatchTask]) -> List[CatalogRecord]:
+    """
+    Build the catalog records of a group of tasks. Headers are read one by one, then the metadata
+    of the whole group is decrypted at once by BatchHeaderDecoder. Module-level for worker processes.
+    生成一组任务的目录记录：先逐个读取文件头，再由 BatchHeaderDecoder 一次解密整组元数据。定义在模块级以便传递给子进程。
+    """
+    records = []
+    pending: List[Tuple[CatalogRecord, NCMHeader]] = []
+    for task in tasks:
+        try:
+            for input_path, member, stream in iter_task_streams(task):
+                record, header = _read_sizes(stream, input_path)
+                records.append(record)
+                if header is not None:
+                    pending.append((record, header))
+        except (OSError, KeyError, tarfile.TarError, zipfile.BadZipFile) as e:
+            records.append(dict.fromkeys(CATALOG_FIELDS, None) | {"path": task.input_path,
+                                                                  "error": f"读取文件失败：{e}"})
+
+    decoded = BatchHeaderDecoder.decode_metadata([header for _, header in pending])
+    for (record, _), metadata in zip(pending, decoded):
+        if isinstance(metadata, ValueError):
+            record["error"] = f"元数据解析失败：{metadata}"
+        else:
+            record |= asdict(metadata)
+    return records
+
+
+def iter_catalog(tasks: List[BatchTask], jobs: int = 1) -> Iterator[CatalogRecord]:
+    """按输入顺序逐条返回目录记录。任务按组分发，文件头解析在进程池中并行执行，每组的元数据批量解码"""
+    groups = [tasks[i:i + DECODE_GROUP_SIZE] for i in range(0, len(tasks), DECODE_GROUP_SIZE)]
+    for records in map_in_pool(catalog_tasks, groups, jobs):
+        yield from records
+
+
+class CatalogWriter:
+    """
+    Write catalog records as JSON Lines or CSV. CSV list fields are joined with ";".
+    以 JSON Lines 或 CSV 格式写出目录记录，CSV 中的列表字段以分号连接。
+    """
+    FORMATS = ("jsonl", "csv")
+
+    def __init__(self, output: TextIO, catalog_format: str = "jsonl"):
+        if catalog_format not in self.FORMATS:
+            raise NCMException(f"不支持的导出格式：{catalog_format}")
+        self.output = output
+        self.catalog_format = catalog_format
+        self._csv_writer = None
+        if catalog_format == "csv":
+            self._csv_writer = csv.DictWriter(output, fieldnames=CATALOG_FIELDS)
+            self._csv_writer.writeheader()
+
+    @staticmethod
+    def detect_format(output_path: str) -> str:
+        return "csv" if output_path.lower().endswith(".csv") else "jsonl"
+
+    def write(self, record: CatalogRecord) -> None:
+        if self._csv_writer is None:
+            self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+
+        row = {key: CSV_LIST_SEPARATOR.join("" if v is None else str(v) for v in value)
+               if isinstance(value, (list, tuple)) else value
+               for key, value in record.items()}
+        self._csv_writer.writerow(row)
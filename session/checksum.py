@@ -0,0 +1,128 @@
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Sequence, TextIO
+
+from domain.exceptions import NCMException
+from domain.models import BatchResult, ExportResult
+
+"""
+可选的 xxHash 算法（需安装 xxhash 包），其余算法由 hashlib 提供
+"""
+XXHASH_ALGORITHMS = ("xxh32", "xxh64", "xxh3_64", "xxh3_128", "xxh128")
+DEFAULT_ALGORITHM = "sha256"
+MANIFEST_FORMATS = ("jsonl", "csv")
+
+
+def new_hasher(algorithm: str):
+    """创建指定算法的哈希对象，不支持的算法抛出 NCMException"""
+    if algorithm in XXHASH_ALGORITHMS:
+        try:
+            import xxhash
+        except ImportError:
+            raise NCMException(f"校验算法 {algorithm} 需要安装 xxhash：pip install xxhash")
+        return getattr(xxhash, algorithm)()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise NCMException(f"不支持的校验算法：{algorithm}")
+
+
+def parse_algorithms(value: str) -> List[str]:
+    """解析逗号分隔的算法列表并检查是否可用，例如 "sha256,md5" """
+    algorithms = list(dict.fromkeys(item.strip().lower() for item in value.split(",") if item.strip()))
+    for algorithm in algorithms:
+        new_hasher(algorithm)
+    return algorithms
+
+
+class DigestSet:
+    """
+    Feed the same data to several hash algorithms at once.
+    将同一份数据同时交给多个哈希算法计算。
+    """
+    def __init__(self, algorithms: Sequence[str]):
+        self._hashers = {algorithm: new_hasher(algorithm) for algorithm in algorithms}
+        self.size = 0
+
+    def update(self, data: bytes) -> None:
+        for hasher in self._hashers.values():
+            hasher.update(data)
+        self.size += len(data)
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {algorithm: hasher.hexdigest() for algorithm, hasher in self._hashers.items()}
+
+
+class DigestWriter:
+    """
+    Binary writer that hashes everything written through it, so the final file is checksummed
+    while it is produced instead of being read back afterwards.
+    对写入的全部数据计算哈希的输出流包装，写出的同时完成整个文件的校验，无需事后重新读取。
+    """
+    def __init__(self, output: BinaryIO, digests: DigestSet):
+        self.output = output
+        self.digests = digests
+
+    def write(self, data: bytes) -> int:
+        self.digests.update(data)
+        return self.output.write(data)
+
+    def flush(self) -> None:
+        self.output.flush()
+
+
+def write_sidecars(result: ExportResult) -> List[str]:
+    """
+    Write one "<output>.<algorithm>" file per algorithm in the coreutils format ("<digest>  <name>"),
+    so they can be checked with sha256sum -c and similar tools.
+    每种算法写出一个 "<输出文件>.<算法>" 校验文件，格式与 coreutils 相同，可直接用 sha256sum -c 等工具校验。
+
+    :return: List[str] 写出的校验文件路径
+    """
+    output_path = Path(result.output_path)
+    sidecar_paths = []
+    for algorithm, digest in result.file_digests.items():
+        sidecar_path = output_path.with_name(f"{output_path.name}.{algorithm}")
+        sidecar_path.write_text(f"{digest}  {output_path.name}\n", encoding="utf-8")
+        sidecar_paths.append(str(sidecar_path))
+    return sidecar_paths
+
+
+class ChecksumManifest:
+    """
+    Write one manifest row per exported file as JSON Lines or CSV. Digests of the whole output file
+    are stored under the algorithm name, digests of the decrypted audio under "audio_<algorithm>".
+    以 JSON Lines 或 CSV 格式为每个导出文件写出一行清单。整个输出文件的哈希以算法名为列名，
+    解密后音频数据的哈希以 "audio_<算法>" 为列名。
+    """
+    def __init__(self, output: TextIO, algorithms: Sequence[str], manifest_format: str = "jsonl"):
+        if manifest_format not in MANIFEST_FORMATS:
+            raise NCMException(f"不支持的清单格式：{manifest_format}")
+        self.output = output
+        self.fields = ["input_path", "output_path", "file_size", "audio_size",
+                       *algorithms, *(f"audio_{algorithm}" for algorithm in algorithms)]
+        self._csv_writer = None
+        if manifest_format == "csv":
+            self._csv_writer = csv.DictWriter(output, fieldnames=self.fields)
+            self._csv_writer.writeheader()
+
+    @staticmethod
+    def detect_format(output_path: str) -> str:
+        return "csv" if output_path.lower().endswith(".csv") else "jsonl"
+
+    def write(self, input_path: str, result: ExportResult) -> None:
+        row = {"input_path": input_path, "output_path": result.output_path,
+               "file_size": result.file_size, "audio_size": result.audio_size}
+        row |= result.file_digests
+        row |= {f"audio_{algorithm}": digest for algorithm, digest in result.audio_digests.items()}
+        if self._csv_writer is None:
+            self.output.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self._csv_writer.writerow(row)
+
+    def write_results(self, results: Iterable[BatchResult]) -> None:
+        for result in results:
+            if result.success and result.export is not None:
+                self.write(result.input_path, result.export)
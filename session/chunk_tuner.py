@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+"""
+分块大小自动调节。chunk_size 为 AUTO_CHUNK_SIZE 时，会话在最初的若干分块中测量 读取+解密 的吞吐量，
+在 MIN_CHUNK_SIZE 与 MAX_CHUNK_SIZE 之间按倍数调整分块大小；调节结果按存储设备记录在本地档案中，之后的运行直接复用。
+所有分块大小均为256的倍数（NCM 密钥流周期为256字节）。
+"""
+AUTO_CHUNK_SIZE = 0
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+SAMPLES_PER_SIZE = 2  # 每个候选大小测量的完整分块数，取较快的一次
+MIN_IMPROVEMENT = 1.05  # 吞吐量至少提升5%才继续朝同一方向调整
+
+PROFILE_PATH_ENV = "NCM_CHUNK_PROFILE"
+STREAM_DEVICE = "stream"  # 标准输入、压缩包成员等无法确定设备的输入
+
+
+def parse_chunk_size(value: str) -> int:
+    """解析 "auto"、"512K"、"4M" 或字节数，非 auto 时必须为256的倍数"""
+    value = value.strip().lower()
+    if value == "auto":
+        return AUTO_CHUNK_SIZE
+    units = {"k": 1024, "m": 1024 * 1024}
+    size = int(value[:-1]) * units[value[-1]] if value[-1:] in units else int(value)
+    if size <= 0 or size % 256:
+        raise ValueError("chunk size must be a positive multiple of 256")
+    return size
+
+
+def default_profile_path() -> str:
+    if path := os.environ.get(PROFILE_PATH_ENV):
+        return path
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "ncm-converter", "chunk_profile.json")
+
+
+def device_of(path: str) -> str:
+    try:
+        return str(os.stat(path).st_dev)
+    except OSError:
+        return STREAM_DEVICE
+
+
+def device_of_stream(stream: BinaryIO) -> str:
+    try:
+        return str(os.fstat(stream.fileno()).st_dev)
+    except (AttributeError, OSError, ValueError):
+        return STREAM_DEVICE
+
+
+class ChunkProfile:
+    """
+    Small JSON file with the tuned chunk size of each storage device (keyed by st_dev).
+    Writes merge with the file on disk and replace it atomically, so concurrent worker processes
+    only ever lose each other's updates, never corrupt the file.
+    按存储设备（st_dev）记录调节结果的 JSON 文件。写入时与磁盘上的内容合并后原子替换，
+    多个子进程同时写入最多丢失彼此的更新，不会损坏文件。
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or default_profile_path())
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, device: str) -> Optional[int]:
+        chunk_size = self._load().get(device, {}).get("chunk_size")
+        if isinstance(chunk_size, int) and MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE and not chunk_size % 256:
+            return chunk_size
+        return None
+
+    def save(self, device: str, chunk_size: int, mb_per_second: float) -> None:
+        data = self._load()
+        data[device] = {"chunk_size": chunk_size, "mb_per_second": round(mb_per_second, 2),
+                        "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            temp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            temp_path.replace(self.path)
+        except OSError:
+            pass  # 档案只是加速手段，写入失败时忽略
+
+
+class ChunkTuner:
+    """
+    Hill-climbing chunk size search for one device. Starting from the initial size it doubles the chunk
+    while throughput keeps improving, otherwise tries halving, and settles on the fastest size seen.
+    Chunks cut short by the end of a file are not measured; one larger than the file stops the growth.
+    Thread-safe, so it can be shared by all sessions reading from the same device.
+    单个设备的分块大小爬山搜索：从初始大小开始，吞吐量持续提升时逐次加倍，否则尝试减半，最终停在测得最快的大小。
+    被文件末尾截断的分块不计入测量，分块大于文件本身时停止增大。线程安全，可由读取同一设备的所有会话共用。
+    """
+    def __init__(self, device: str = STREAM_DEVICE, profile: Optional[ChunkProfile] = None,
+                 initial_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param device: str 设备标识
+        :param profile: Optional[ChunkProfile] 指定时读取已有结果（直接采用，不再测量），调节完成后写回
+        :param initial_size: int 没有已有结果时的初始分块大小
+        """
+        self.device = device
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._initial_size = initial_size
+        self._size = initial_size
+        self._direction = 2  # 2 表示加倍，0.5 表示减半
+        self._samples = []
+        self._best_size = initial_size
+        self._best_throughput = 0.0
+        self.settled = False
+
+        if profile is not None and (stored_size := profile.get(device)) is not None:
+            self._size = self._best_size = stored_size
+            self.settled = True
+
+    @property
+    def chunk_size(self) -> int:
+        return self._size
+
+    def record(self, requested_size: int, read_size: int, seconds: float) -> None:
+        """
+        Report one chunk: the size that was requested, the bytes actually read and the read + decrypt time.
+        报告一个分块的测量结果：请求的大小、实际读取的字节数与读取+解密耗时。
+        """
+        if self.settled:
+            return
+        with self._lock:
+            if self.settled or requested_size != self._size:
+                return  # 已调节完成，或为其他线程以旧大小读取的分块
+            if read_size < requested_size:
+                # 分块被文件末尾截断：增大分块已无意义
+                if self._direction > 1 and read_size < requested_size // 2:
+                    self._settle(self._best_size if self._best_throughput else self._size // 2)
+                return
+            if seconds <= 0:
+                return
+
+            self._samples.append(read_size / seconds)
+            if len(self._samples) < SAMPLES_PER_SIZE:
+                return
+            throughput = max(self._samples)
+            self._samples = []
+            self._step(throughput)
+
+    def _step(self, throughput: float) -> None:
+        if throughput > self._best_throughput * MIN_IMPROVEMENT:
+            self._best_size, self._best_throughput = self._size, throughput
+            next_size = int(self._size * self._direction)
+        elif self._direction > 1 and self._best_size == self._initial_size:
+            # 第一次加倍就没有提升：从初始大小开始尝试减半
+            self._direction = 0.5
+            next_size = self._best_size // 2
+        else:
+            self._settle(self._best_size)
+            return
+
+        if not MIN_CHUNK_SIZE <= next_size <= MAX_CHUNK_SIZE:
+            self._settle(self._best_size)
+            return
+        self._size = next_size
+
+    def _settle(self, chunk_size: int) -> None:
+        chunk_size = min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        self._size = chunk_size - chunk_size % 256
+        self.settled = True
+        if self.profile is not None and self._best_throughput:
+            self.profile.save(self.device, self._size, self._best_throughput / 1024 / 1024)
+
+
+_tuners: Dict[str, ChunkTuner] = {}
+_tuners_lock = threading.Lock()
+
+
+def get_tuner(device: str) -> ChunkTuner:
+    """返回本进程中该设备共用的调节器，首次使用时读取本地档案"""
+    with _tuners_lock:
+        tuner = _tuners.get(device)
+        if tuner is None:
+            profile = ChunkProfile() if device != STREAM_DEVICE else None
+            tuner = _tuners[device] = ChunkTuner(device, profile)
+        return tuner
@@ -0,0 +1,269 @@
+import itertools
+import json
+import multiprocessing
+import os
+import socketserver
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from domain.exceptions import NCMException
+from domain.models import BatchTask, BatchResult
+from session.batch_engine import expand_tasks, iter_metadata, run_task
+from session.daemon_client import DaemonClient, default_socket_path, is_owned_by_current_user
+from session.scheduler import SCHEDULE_POLICIES, order_tasks
+
+"""
+子进程全局状态：守护进程通过初始化函数注入的进度队列
+"""
+_progress_queue = None
+
+
+def _init_worker(progress_queue) -> None:
+    """预先加载解码依赖并完成一次AES初始化，使首个任务无需承担导入与预热开销"""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+    import mutagen.id3  # noqa: F401
+    from Crypto.Cipher import AES
+    from codec.ncm_codec import NCMCodec
+
+    AES.new(NCMCodec.AUDIO_KEY, mode=AES.MODE_ECB)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _convert_with_progress(job_id: int, task: BatchTask, chunk_size: int,
+                           report_progress: bool, skip_existing: bool = False) -> List[BatchResult]:
+    progress_callback = None
+    if report_progress and _progress_queue is not None:
+        def progress_callback(current, total, msg):
+            _progress_queue.put((job_id, current, total, msg))
+
+    return run_task(task, chunk_size, progress_callback, skip_existing=skip_existing)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "_DaemonServer"
+
+    def handle(self):
+        self._write_lock = threading.Lock()
+        try:
+            request = json.loads(self.rfile.readline())
+            self.server.daemon.handle_request(request, self._emit)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except ValueError as e:
+            self._emit({"type": "error", "message": f"无效请求：{e}"})
+        self._emit({"type": "done"})
+
+    def _emit(self, event: dict) -> None:
+        with self._write_lock:
+            self.wfile.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):  # Windows 下不可用，由 ConversionDaemon 给出提示
+    class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, socket_path: str, daemon: "ConversionDaemon"):
+            self.daemon = daemon
+            super().__init__(socket_path, _RequestHandler)
+
+        def server_bind(self):
+            # 套接字只允许当前用户连接：以 0177 的 umask 创建，避免 chmod 之前的窗口期
+            previous_umask = os.umask(0o177)
+            try:
+                super().server_bind()
+            finally:
+                os.umask(previous_umask)
+            os.chmod(self.server_address, 0o600)
+
+
+class ConversionDaemon:
+    """
+    Local conversion daemon that keeps a warm worker pool behind a Unix domain socket.
+    本地转换守护进程：通过 Unix 域套接字接收任务，并维持一个已预热的进程池。
+    """
+    def __init__(self, socket_path: Optional[str] = None, jobs: Optional[int] = None,
+                 chunk_size: int = 1024 * 1024):
+        if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+            raise NCMException("当前平台不支持 Unix 域套接字，无法启动守护进程")
+
+        self.socket_path = socket_path or default_socket_path()
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+
+        self._job_ids = itertools.count(1)
+        self._progress_routes: Dict[int, Callable[[dict], None]] = {}
+        self._routes_lock = threading.Lock()
+        self._progress_queue = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._server: Optional[_DaemonServer] = None
+
+    def _prepare_socket(self):
+        directory = os.path.dirname(os.path.abspath(self.socket_path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # 所在目录属于其他用户时，对方可以替换其中的套接字
+        if not is_owned_by_current_user(directory) and os.stat(directory).st_uid != 0:
+            raise NCMException(f"套接字所在目录属于其他用户：{directory}")
+        if not os.path.exists(self.socket_path):
+            return
+        if not is_owned_by_current_user(self.socket_path):
+            raise NCMException(f"套接字已被其他用户占用：{self.socket_path}")
+        if DaemonClient(self.socket_path).is_available():
+            raise NCMException(f"守护进程已在运行：{self.socket_path}")
+        os.unlink(self.socket_path)  # 清理上次异常退出遗留的套接字文件
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context(),
+                                       initializer=_init_worker, initargs=(self._progress_queue,))
+        # 进程池按需创建子进程，提交与并行数相同的空任务以立即拉起并预热全部子进程
+        for future in [executor.submit(_warm_up) for _ in range(self.jobs)]:
+            future.result()
+        return executor
+
+    def _start_pool(self):
+        self._progress_queue = multiprocessing.get_context().Queue()
+        self._executor = self._create_executor()
+
+        threading.Thread(target=self._dispatch_progress, name="ncm-daemon-progress", daemon=True).start()
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Replace a pool broken by a dead worker (e.g. killed by the OOM killer), so later jobs run instead of failing.
+        工作进程异常退出（例如被 OOM killer 终止）后进程池不可再用，重建进程池，使之后的任务正常执行而不是全部失败。
+        """
+        with self._pool_lock:
+            if self._executor is not broken:
+                return  # 其他请求已经重建
+            self._executor = self._create_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, *args) -> Tuple[Future, ProcessPoolExecutor]:
+        """提交转换任务，返回 Future 及其所属的进程池；进程池已损坏时重建后再提交"""
+        with self._pool_lock:
+            executor = self._executor
+        try:
+            return executor.submit(_convert_with_progress, *args), executor
+        except BrokenProcessPool:
+            self._restart_pool(executor)
+            with self._pool_lock:
+                return self._executor.submit(_convert_with_progress, *args), self._executor
+
+    def _dispatch_progress(self):
+        while True:
+            item = self._progress_queue.get()
+            if item is None:
+                return
+            job_id, current, total, msg = item
+            with self._routes_lock:
+                route = self._progress_routes.get(job_id)
+            if route:
+                try:
+                    route({"type": "progress", "current": current, "total": total, "msg": msg})
+                except OSError:
+                    pass
+
+    def handle_request(self, request: dict, emit: Callable[[dict], None]) -> None:
+        request_type = request.get("type")
+        if request_type == "ping":
+            emit({"type": "pong", "pid": os.getpid(), "jobs": self.jobs})
+        elif request_type == "shutdown":
+            emit({"type": "bye"})
+            threading.Thread(target=self.shutdown, daemon=True).start()
+        elif request_type == "preview":
+            self._handle_preview(request, emit)
+        elif request_type == "convert":
+            self._handle_convert(request, emit)
+        else:
+            emit({"type": "error", "message": f"未知请求类型：{request_type}"})
+
+    @staticmethod
+    def _handle_preview(request: dict, emit: Callable[[dict], None]) -> bool:
+        success = True
+        for input_path, metadata, error in iter_metadata(request.get("inputs", [])):
+            if metadata is None:
+                emit({"type": "error", "input_path": input_path, "message": error})
+                success = False
+            else:
+                emit({"type": "metadata", "input_path": input_path, "metadata": asdict(metadata)})
+        return success
+
+    def _handle_convert(self, request: dict, emit: Callable[[dict], None]) -> None:
+        # 客户端显式指定的分块大小优先于守护进程启动时的设置，0 表示自动调节
+        chunk_size = request.get("chunk_size", self.chunk_size)
+        if type(chunk_size) is not int or chunk_size < 0 or chunk_size % 256:
+            raise ValueError(f"分块大小无效：{chunk_size}")
+        schedule = request.get("schedule", "auto")
+        if schedule not in SCHEDULE_POLICIES:
+            raise ValueError(f"不支持的调度策略：{schedule}")
+        skip_existing = bool(request.get("skip_existing", False))
+        tasks = expand_tasks(request.get("inputs", []), request.get("output_dir"))
+        report_progress = len(tasks) == 1 and not tasks[0].member and tasks[0].input_path.lower().endswith(".ncm")
+        if report_progress:
+            tasks[0].output_path = request.get("output_path")
+        total = len(tasks)
+        emit({"type": "accepted", "total": total})
+
+        # 单文件任务先返回元数据，元数据解析失败时不再提交转换
+        if report_progress and not self._handle_preview({"inputs": [tasks[0].input_path]}, emit):
+            return
+
+        futures = {}
+        for task in order_tasks(tasks, schedule, self.jobs):
+            job_id = next(self._job_ids)
+            if report_progress:
+                with self._routes_lock:
+                    self._progress_routes[job_id] = emit
+            future, executor = self._submit(job_id, task, chunk_size, report_progress, skip_existing)
+            futures[future] = (job_id, task.input_path, executor)
+
+        try:
+            finished = 0
+            for future in as_completed(futures):
+                job_id, input_path, executor = futures[future]
+                try:
+                    task_results = future.result()
+                except BrokenProcessPool:
+                    # 同一进程池中未完成的任务都会以此失败；重建进程池，守护进程继续可用
+                    self._restart_pool(executor)
+                    task_results = [BatchResult(input_path, "", False, "工作进程异常退出（可能内存不足），任务未完成")]
+                except Exception as e:
+                    task_results = [BatchResult(input_path, "", False, str(e))]
+                total += len(task_results) - 1
+                for result in task_results:
+                    finished += 1
+                    emit({"type": "result", "finished": finished, "total": total} | asdict(result))
+        except OSError:
+            # 客户端断开连接，取消尚未开始的任务
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            with self._routes_lock:
+                for job_id, _, _ in futures.values():
+                    self._progress_routes.pop(job_id, None)
+
+    def serve_forever(self) -> None:
+        self._prepare_socket()
+        self._start_pool()
+        self._server = _DaemonServer(self.socket_path, self)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._executor.shutdown(cancel_futures=True)
+            self._progress_queue.put(None)
+
+    def shutdown(self) -> None:
+        if self._server:
+            self._server.shutdown()
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from domain.exceptions import NCMException
+from domain.models import BatchTask, BatchResult, CoverImage
+from session.archive_source import is_archive
+from session.batch_engine import BatchResultCallback, iter_task_streams, map_in_pool
+from session.decryption_session import DecryptionSession
+from session.stream_session import StreamDecryptionSession
+
+COVER_NAME = "cover"
+
+
+def cover_extension(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return ".png"
+    return ".jpg"
+
+
+def _cover_image(input_path: str, album_id, data: bytes) -> CoverImage:
+    album_id = str(album_id) if album_id else ""
+    if not data:
+        return CoverImage(input_path, album_id, b"", error="文件不包含封面")
+    return CoverImage(input_path, album_id, data, hashlib.sha256(data).hexdigest())
+
+
+def extract_covers(task: BatchTask) -> List[CoverImage]:
+    """
+    Read the metadata and cover block of every file of a task without touching the audio.
+    Plain files go through DecryptionSession._extract_cover, which seeks straight to the cover.
+    Module-level for worker processes.
+    读取任务中每个文件的元数据与封面，不读取音频。普通文件经 DecryptionSession._extract_cover 直接定位到封面。
+    定义在模块级以便传递给子进程。
+    """
+    if not task.member and not is_archive(task.input_path):
+        try:
+            session = DecryptionSession(task.input_path)
+            return [_cover_image(task.input_path, session.get_metadata().album_id, session.get_cover_bytes())]
+        except (NCMException, ValueError, OSError) as e:
+            return [CoverImage(task.input_path, "", b"", error=str(e))]
+
+    covers = []
+    try:
+        for input_path, member, stream in iter_task_streams(task):
+            try:
+                session = StreamDecryptionSession(stream, input_path)
+                covers.append(_cover_image(input_path, session.get_metadata().album_id, session.get_cover_bytes()))
+            except (NCMException, ValueError) as e:
+                covers.append(CoverImage(input_path, "", b"", error=str(e)))
+    except (OSError, KeyError, tarfile.TarError, zipfile.BadZipFile) as e:
+        covers.append(CoverImage(task.input_path, "", b"", error=f"读取文件失败：{e}"))
+    return covers
+
+
+class CoverExporter:
+    """
+    Write covers into output_dir/<album_id>/cover.jpg, deduplicated by album and by content.
+    The first cover seen for an album wins; an image whose sha256 was already written for another
+    album is hard-linked instead of written again. Tracks without album_id are keyed by content hash.
+    将封面写入 output_dir/<专辑ID>/cover.jpg，并按专辑与内容去重：同一专辑只保留首次出现的封面；
+    内容（sha256）已写出过的封面在其他专辑目录中以硬链接代替重复写入；没有专辑ID的歌曲按内容哈希归档。
+    """
+    def __init__(self, output_dir: str):
+        self.output_dir = Path(output_dir).resolve()
+        self._album_paths: Dict[str, str] = {}
+        self._digest_paths: Dict[str, str] = {}
+        self.written_count = 0
+        self.linked_count = 0
+
+    def _target_path(self, cover: CoverImage) -> Path:
+        directory = cover.album_id or f"sha256-{cover.digest[:16]}"
+        return self.output_dir / directory / (COVER_NAME + cover_extension(cover.data))
+
+    def add(self, cover: CoverImage) -> BatchResult:
+        if cover.error:
+            return BatchResult(cover.input_path, "", False, cover.error)
+
+        album_key = cover.album_id or cover.digest
+        if existing := self._album_paths.get(album_key):
+            return BatchResult(cover.input_path, existing, True, "同专辑封面已导出，跳过")
+
+        target_path = self._target_path(cover)
+        try:
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            source_path = self._digest_paths.get(cover.digest)
+            if source_path and self._link(source_path, target_path):
+                message = "内容相同的封面已导出，已创建硬链接"
+                self.linked_count += 1
+            else:
+                target_path.write_bytes(cover.data)
+                message = "已导出"
+                self.written_count += 1
+        except OSError as e:
+            return BatchResult(cover.input_path, str(target_path), False, f"写入封面失败：{e}")
+
+        self._album_paths[album_key] = str(target_path)
+        self._digest_paths.setdefault(cover.digest, str(target_path))
+        return BatchResult(cover.input_path, str(target_path), True, message, len(cover.data))
+
+    @staticmethod
+    def _link(source_path: str, target_path: Path) -> bool:
+        # 跨文件系统或不支持硬链接时退回普通写入
+        try:
+            if target_path.exists():
+                target_path.unlink()
+            os.link(source_path, target_path)
+            return True
+        except OSError:
+            return False
+
+    def export(self, tasks: List[BatchTask], jobs: int = 1,
+               result_callback: Optional[BatchResultCallback] = None) -> List[BatchResult]:
+        """
+        Extract covers in parallel and write them in input order.
+        并行读取封面，并按输入顺序写出。
+
+        :param tasks: List[BatchTask]
+        :param jobs: int 并行进程数
+        :param result_callback: Optional[BatchResultCallback]
+        :return: List[BatchResult] 每个输入文件一个结果，output_path 为对应的封面路径
+        """
+        results = []
+        total = len(tasks)
+        for covers in map_in_pool(extract_covers, tasks, jobs):
+            total += len(covers) - 1
+            for cover in covers:
+                result = self.add(cover)
+                results.append(result)
+                if result_callback:
+                    result_callback(result, len(results), total)
+        return results
@@ -0,0 +1,93 @@
+import json
+import os
+import socket
+import tempfile
+from typing import Iterator, Optional
+
+"""
+守护进程客户端。CLI 每次调用都会加载本模块，因此只依赖标准库中的轻量模块，
+不导入解码会话、pycryptodome 与 mutagen。
+协议：每个连接发送一行 JSON 请求，守护进程以多行 JSON 事件流应答，最后一个事件的 type 为 done。
+"""
+SOCKET_PATH_ENV = "NCM_DAEMON_SOCKET"
+
+
+def default_socket_path() -> str:
+    if path := os.environ.get(SOCKET_PATH_ENV):
+        return path
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(runtime_dir, f"ncm-converter-{uid}.sock")  # XDG_RUNTIME_DIR 仅当前用户可访问
+    # 共享的临时目录中放在守护进程创建的私有（0700）子目录里，其他用户无法抢先创建套接字
+    return os.path.join(tempfile.gettempdir(), f"ncm-converter-{uid}", "daemon.sock")
+
+
+def is_owned_by_current_user(path: str) -> bool:
+    """路径属于当前用户时返回真；不支持 uid 的平台总是返回真"""
+    if not hasattr(os, "getuid"):
+        return True
+    return os.stat(path).st_uid == os.getuid()
+
+
+class DaemonUnavailableError(ConnectionError):
+    pass
+
+
+class DaemonClient:
+    def __init__(self, socket_path: Optional[str] = None, connect_timeout: float = 0.2):
+        self.socket_path = socket_path or default_socket_path()
+        self.connect_timeout = connect_timeout
+
+    def _connect(self) -> socket.socket:
+        if not hasattr(socket, "AF_UNIX") or not os.path.exists(self.socket_path):
+            raise DaemonUnavailableError(f"守护进程未运行：{self.socket_path}")
+        # 不向其他用户创建的套接字提交任务，否则任务与输入路径会被对方接收
+        if not is_owned_by_current_user(self.socket_path):
+            raise DaemonUnavailableError(f"套接字不属于当前用户：{self.socket_path}")
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailableError(f"无法连接守护进程：{e}")
+        sock.settimeout(None)
+        return sock
+
+    def request(self, payload: dict) -> Iterator[dict]:
+        """
+        Send one request and yield the daemon's events until "done".
+        发送一个请求并逐个返回守护进程的事件，直到 done 事件。
+
+        :raise: DaemonUnavailableError 连接失败；ConnectionError 传输中途断开
+        """
+        sock = self._connect()
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            stream.flush()
+
+            for line in stream:
+                event = json.loads(line)
+                if event.get("type") == "done":
+                    return
+                yield event
+
+        raise ConnectionError("守护进程连接中断")
+
+    def ping(self) -> Optional[dict]:
+        try:
+            return next(self.request({"type": "ping"}), None)
+        except (ConnectionError, ValueError):
+            return None
+
+    def is_available(self) -> bool:
+        return self.ping() is not None
+
+    def shutdown(self) -> bool:
+        try:
+            for _ in self.request({"type": "shutdown"}):
+                pass
+            return True
+        except ConnectionError:
+            return False
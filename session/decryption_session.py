@@ -1,23 +1,52 @@
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Callable
-
-import mutagen.id3 as id3
+from typing import Iterator, Optional, Callable, Sequence, TYPE_CHECKING
 
 from codec.ncm_codec import NCMCodec
 from domain.exceptions import NCMFileValidationException, NCMExportException
-from domain.models import NCMMetadata
+from domain.models import NCMMetadata, ExportResult, HeaderLayout
+from session.chunk_tuner import AUTO_CHUNK_SIZE, device_of, get_tuner
+from session.atomic_output import atomic_output
+
+if TYPE_CHECKING:
+    from domain.models import ClipOptions
+    from session.cancellation import CancellationToken
 
 """
 进度回调类型注解：目前进度，总进度，状态信息
 """
 ProgressCallback = Callable[[int, int, str], None]
 
+"""
+封面处理函数类型注解：原始封面 -> 嵌入输出文件的封面
+"""
+CoverTransform = Callable[[bytes], bytes]
+
 class DecryptionSession:
-    def __init__(self, ncm_file_path: str):
+    """
+    Each session owns its state and opens its own file handle per operation, so independent sessions
+    can run in parallel threads. Lazy header parsing is guarded by a lock, so a shared session is safe too.
+    每个会话持有独立的状态，每次操作各自打开文件句柄，不同会话可在多个线程中并行使用；
+    文件头的延迟解析由锁保护，同一会话被多个线程共用时也是安全的。
+    解析结果保存在本地文件头缓存中（见 session.header_cache），文件未改变时再次打开只需一次 stat。
+    """
+    def __init__(self, ncm_file_path: str, cover_transform: Optional[CoverTransform] = None,
+                 use_header_cache: bool = True):
+        """
+        :param ncm_file_path: str NCM文件路径
+        :param cover_transform: Optional[CoverTransform] 嵌入封面前对封面的处理（如缩放、重新压缩），不影响 get_cover_bytes
+        :param use_header_cache: bool 是否读写本地文件头缓存
+        """
+        self.cover_transform = cover_transform
         self.file_path_str: str = ncm_file_path
         self.file_path: Path = Path(ncm_file_path).resolve()
-        self.file_size: int = os.path.getsize(self.file_path)
+        try:
+            stat_result = os.stat(self.file_path)
+        except OSError:
+            raise NCMFileValidationException(f"目标文件不存在：{self.file_path}")
+        self.file_size: int = stat_result.st_size
 
         self._rc4_key: Optional[bytes] = None
         self._metadata: Optional[NCMMetadata] = None
@@ -25,10 +54,30 @@ class DecryptionSession:
         self._rc4_key_offset: int = 10
         self._metadata_offset: int = 142
         self._cover_offset: Optional[int] = None
+        self._cover_length: Optional[int] = None
         self._audio_offset: Optional[int] = None
         self._audio_size: Optional[int] = None
-
-        self._pre_check()
+        self._lock = threading.RLock()
+
+        self._header_cache = None
+        layout = None
+        if use_header_cache:
+            # 文件头缓存（及 sqlite3）按需导入，不使用缓存的调用方无需加载
+            from session.header_cache import get_header_cache, stat_key
+
+            self._header_cache = get_header_cache()
+            self._stat_key = stat_key(stat_result)
+            layout = self._header_cache.get(str(self.file_path), self._stat_key) if self._header_cache else None
+        if layout is not None:
+            # 缓存的文件头在首次解析时已校验过，文件未改变，无需再次检查
+            self._rc4_key = layout.rc4_key
+            self._metadata = layout.metadata
+            self._cover_length = layout.cover_length
+            self._audio_offset = layout.audio_offset
+            self._audio_size = self.file_size - layout.audio_offset
+            self._header_cache = None  # 已命中，无需写回
+        else:
+            self._pre_check()
 
     def _pre_check(self):
         if not os.path.isfile(self.file_path):
@@ -47,14 +96,15 @@ class DecryptionSession:
                 raise NCMFileValidationException(f"文件不是合法的NCM格式：{self.file_path}")
 
     def _extract_key(self):
-        if self._rc4_key is not None:
-            return
+        with self._lock:
+            if self._rc4_key is not None:
+                return
 
-        with open(self.file_path, "rb") as f:
-            f.seek(self._rc4_key_offset)
-            key_related_bytes = f.read(132)
+            with open(self.file_path, "rb") as f:
+                f.seek(self._rc4_key_offset)
+                key_related_bytes = f.read(132)
 
-            self._rc4_key = NCMCodec.derive_key(key_related_bytes)
+                self._rc4_key = NCMCodec.derive_key(key_related_bytes)
 
     def _extract_metadata(self):
         if self._metadata is not None:
@@ -77,6 +127,13 @@ class DecryptionSession:
         if self._cover_bytes is not None:
             return
 
+        if self._audio_offset is not None:
+            # 位置已知（来自文件头缓存）：直接读取封面
+            with open(self.file_path, "rb") as f:
+                f.seek(self._audio_offset - self._cover_length)
+                self._cover_bytes = f.read(self._cover_length)
+            return
+
         if self._cover_offset is None:
             self._extract_metadata()
 
@@ -88,14 +145,28 @@ class DecryptionSession:
             cover_length = int.from_bytes(cover_length_bytes, byteorder='little')
 
             self._cover_bytes = f.read(cover_length)
+            self._cover_length = len(self._cover_bytes)
 
-            self._audio_offset = f.tell()
-            self._audio_size = self.file_size - self._audio_offset
+            audio_offset = f.tell()
+            self._audio_size = self.file_size - audio_offset
+            self._audio_offset = audio_offset
+
+    def _store_header(self):
+        """文件头解析完成后写入缓存（密钥的派生开销很小，一并保存，之后解密无需再读取文件头）"""
+        if self._header_cache is None:
+            return
+        self._extract_key()
+        self._header_cache.put(str(self.file_path), self._stat_key,
+                               HeaderLayout(self._rc4_key, self._metadata, self._cover_length, self._audio_offset))
+        self._header_cache = None
 
     def _write_cover_to_file(self, output_path: str):
         """
         将封面信息写入文件，目前仅支持mp3
         """
+        # 仅在写入标签时导入 mutagen，预览与元数据读取无需加载
+        import mutagen.id3 as id3
+
         try:
             # 加载ID3标签
             try:
@@ -103,7 +174,9 @@ class DecryptionSession:
             except id3.error:
                 tags = id3.ID3()
 
-            cover_bytes = self._cover_bytes
+            cover_bytes = self.get_cover_bytes()
+            if cover_bytes and self.cover_transform:
+                cover_bytes = self.cover_transform(cover_bytes)
 
             if cover_bytes:
                 tags.add(
@@ -121,16 +194,26 @@ class DecryptionSession:
             raise IOError(str(e))
 
 
+    def _ensure_header(self, cover: bool = False) -> None:
+        """
+        Parse whatever part of the header is still missing. The check runs inside the lock and every field
+        is assigned once under it, so once this returns the fields can be read without locking.
+        在锁内检查并补全尚未解析的文件头；各字段只在锁内赋值一次，返回后无需加锁即可读取。
+
+        :param cover: bool 是否同时需要封面数据（命中文件头缓存时封面按需读取）
+        """
+        with self._lock:
+            if self._metadata is None or self._audio_size is None or (cover and self._cover_bytes is None):
+                self._extract_metadata()
+                self._extract_cover()
+                self._store_header()
+
     def preview(self):
-        self._extract_metadata()
-        self._extract_cover()
+        self._ensure_header(cover=True)
 
     def decrypt(self) -> bytes:
-        if self._audio_offset is None:
-            self.preview()
-
-        if self._rc4_key is None:
-            self._extract_key()
+        self._ensure_header()
+        self._extract_key()
 
         with open(self.file_path, "rb") as f:
             f.seek(self._audio_offset)
@@ -140,18 +223,37 @@ class DecryptionSession:
 
         return decrypted_audio_bytes
 
-    def decrypt_with_chunk(self, chunk_size: int = 1024 * 1024,
-                           progress_callback: Optional[ProgressCallback] = None) -> Optional[bytes]:
-        if self._audio_offset is None:
-            self.preview()
+    def iter_decrypted_chunks(self, chunk_size: int = 1024 * 1024,
+                              progress_callback: Optional[ProgressCallback] = None,
+                              cancel_token: Optional[CancellationToken] = None,
+                              clip: Optional[ClipOptions] = None) -> Iterator[bytes]:
+        """
+        Yield the decrypted audio chunk by chunk, so callers never need to hold the whole track in memory.
+        逐块返回解密后的音频，调用方无需在内存中保存整首音频。
 
-        if self._rc4_key is None:
-            self._extract_key()
+        :param chunk_size: int 分块大小；为 AUTO_CHUNK_SIZE 时按所在设备自动调节（见 session.chunk_tuner）
+        :param progress_callback: Optional[ProgressCallback]
+        :param cancel_token: Optional[CancellationToken] 每个分块之前检查，已取消时抛出 NCMCancelledException
+        :param clip: Optional[ClipOptions] 指定时只读取并解密切点之前的音频，作为一个分块返回截取的片段（见 codec.audio_clip）
+        """
+        self._ensure_header()
+        self._extract_key()
 
-        decrypted_audio = bytearray()
         processed_size = 0
         total_size = self._audio_size
 
+        if clip is not None:
+            from codec.audio_clip import CLIP_READ_SIZE, clip_audio
+
+            if progress_callback:
+                progress_callback(processed_size, total_size, "开始截取片段")
+            read_size = CLIP_READ_SIZE if chunk_size == AUTO_CHUNK_SIZE else min(chunk_size, CLIP_READ_SIZE)
+            yield clip_audio(self.iter_decrypted_chunks(read_size, cancel_token=cancel_token), clip)
+            if progress_callback:
+                progress_callback(total_size, total_size, "任务完成")
+            return
+        tuner = get_tuner(device_of(str(self.file_path))) if chunk_size == AUTO_CHUNK_SIZE else None
+
         with open(self.file_path, "rb") as f:
             f.seek(self._audio_offset)
 
@@ -159,14 +261,20 @@ class DecryptionSession:
                 progress_callback(processed_size, total_size, "开始任务")
 
             while True:
-                encrypted_chunk = f.read(chunk_size)
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                read_size = tuner.chunk_size if tuner else chunk_size
+                started = time.perf_counter()
+                encrypted_chunk = f.read(read_size)
                 if not encrypted_chunk:
                     break
 
                 decrypted_chunk = NCMCodec.decrypt_audio(encrypted_chunk, self._rc4_key)
-                decrypted_audio.extend(decrypted_chunk)
+                if tuner:
+                    tuner.record(read_size, len(encrypted_chunk), time.perf_counter() - started)
 
                 processed_size += len(decrypted_chunk)
+                yield decrypted_chunk
 
                 if progress_callback:
                     current = min(processed_size, total_size)
@@ -176,38 +284,102 @@ class DecryptionSession:
             if progress_callback:
                 progress_callback(total_size, total_size, "任务完成")
 
-            return bytes(decrypted_audio)
+    def decrypt_with_chunk(self, chunk_size: int = 1024 * 1024,
+                           progress_callback: Optional[ProgressCallback] = None) -> Optional[bytes]:
+        """
+        :param chunk_size: int 分块大小；为 AUTO_CHUNK_SIZE 时按所在设备自动调节（见 session.chunk_tuner）
+        :param progress_callback: Optional[ProgressCallback]
+        """
+        return b"".join(self.iter_decrypted_chunks(chunk_size, progress_callback))
+
+    def _export_with_digests(self, output_path: str, digests: Sequence[str], chunk_size: int,
+                             progress_callback: Optional[ProgressCallback],
+                             cancel_token: Optional[CancellationToken] = None,
+                             clip: Optional[ClipOptions] = None) -> ExportResult:
+        """
+        Single-pass export that hashes the decrypted audio and the final file while writing. The cover tag
+        is rendered up front (same bytes as _write_cover_to_file), so the output is never read back.
+        单次写出并同时计算解密音频与最终文件的哈希。封面标签预先生成（与 _write_cover_to_file 结果一致），无需回读输出文件。
+        """
+        from session.checksum import DigestSet, DigestWriter
+        from session.stream_session import StreamDecryptionSession
+
+        self._ensure_header()
+
+        audio_digests = DigestSet(digests)
+        file_digests = DigestSet(digests)
+        with open(self.file_path, "rb") as f:
+            session = StreamDecryptionSession(f, self.file_path_str, self.cover_transform)
+            try:
+                with atomic_output(output_path) as temp_path, open(temp_path, "wb") as output:
+                    audio_size = session.export_to_stream(DigestWriter(output, file_digests), chunk_size,
+                                                          progress_callback, self._audio_size, audio_digests,
+                                                          cancel_token, clip)
+            except (IOError, OSError) as e:
+                raise NCMExportException(f"导出音频失败：{str(e)}")
+
+        return ExportResult(output_path, audio_size, file_digests.size,
+                            audio_digests.hexdigests(), file_digests.hexdigests())
+
+    def export(self, output_path: str, digests: Sequence[str] = ()) -> ExportResult:
+        """
+        :param output_path: str 输出文件路径
+        :param digests: Sequence[str] 导出时计算的哈希算法（如 sha256、md5），为空时不计算
+        """
+        if digests:
+            return self._export_with_digests(output_path, digests, 1024 * 1024, None)
 
-    def export(self, output_path: str):
         decrypted_audio_bytes = self.decrypt()
 
         try:
-            with open(output_path, "wb") as f:
-                f.write(decrypted_audio_bytes)
-            self._write_cover_to_file(output_path)
+            with atomic_output(output_path) as temp_path:
+                with open(temp_path, "wb") as f:
+                    f.write(decrypted_audio_bytes)
+                self._write_cover_to_file(temp_path)
+            return ExportResult(output_path, len(decrypted_audio_bytes), os.path.getsize(output_path))
         except (IOError, OSError) as e:
             raise NCMExportException(f"导出音频失败：{str(e)}")
 
     def export_with_chunk(self, output_path: str,
                           chunk_size: int = 1024 * 1024,
-                          progress_callback: Optional[ProgressCallback] = None):
-        decrypted_audio_bytes = self.decrypt_with_chunk(chunk_size, progress_callback)
+                          progress_callback: Optional[ProgressCallback] = None,
+                          digests: Sequence[str] = (),
+                          cancel_token: Optional[CancellationToken] = None,
+                          clip: Optional[ClipOptions] = None) -> ExportResult:
+        """
+        Export in chunks to a temporary file that replaces output_path only when complete (see session.atomic_output).
+        分块导出到临时文件，完成后才替换 output_path（见 session.atomic_output）。
+
+        :param output_path: str 输出文件路径
+        :param chunk_size: int 分块大小
+        :param progress_callback: Optional[ProgressCallback]
+        :param digests: Sequence[str] 导出时计算的哈希算法，为空时不计算；计算时分块大小须为256的倍数
+        :param cancel_token: Optional[CancellationToken] 取消后抛出 NCMCancelledException，不留下部分输出
+        :param clip: Optional[ClipOptions] 指定时只导出开头的片段
+        """
+        if digests:
+            return self._export_with_digests(output_path, digests, chunk_size, progress_callback, cancel_token,
+                                             clip)
 
         try:
-            with open(output_path, "wb") as f:
-                f.write(decrypted_audio_bytes)
-            self._write_cover_to_file(output_path)
+            # 解密后的分块直接写出，内存中只保留当前分块
+            audio_size = 0
+            with atomic_output(output_path) as temp_path:
+                with open(temp_path, "wb") as f:
+                    for chunk in self.iter_decrypted_chunks(chunk_size, progress_callback, cancel_token, clip):
+                        f.write(chunk)
+                        audio_size += len(chunk)
+                self._write_cover_to_file(temp_path)
+            return ExportResult(output_path, audio_size, os.path.getsize(output_path))
         except (IOError, OSError) as e:
             raise NCMExportException(f"导出音频失败：{str(e)}")
 
     def get_metadata(self) -> NCMMetadata:
-        if self._metadata is None:
-            self.preview()
+        self._ensure_header()
         return self._metadata
 
     def get_cover_bytes(self) -> bytes:
-        if self._cover_offset is None:
-            self.preview()
+        self._ensure_header(cover=True)
         return self._cover_bytes
 
 
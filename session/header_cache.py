@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import sqlite3
+
+from domain.models import HeaderLayout, NCMMetadata
+
+"""
+解析后文件头的本地持久化缓存（SQLite）。以（路径，大小，修改时间，inode）为键保存 RC4 密钥、元数据与封面 / 音频位置，
+同一文件再次被预览、加入批量队列或传给 CLI 时只需一次 stat，无需重新解密文件头。文件被修改或替换后键不再匹配，自动重新解析。
+缓存按总字节数限制大小，超出时淘汰最久未使用的记录。缓存只是加速手段，读写失败时一律忽略。
+数据库中保存了各文件的 RC4 密钥，因此只允许当前用户读写（0600）。sqlite3 在首次连接时才导入，不增加 CLI 的启动开销。
+"""
+HEADER_CACHE_ENV = "NCM_HEADER_CACHE"  # 缓存数据库路径，设为 off 时禁用
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+TOUCH_INTERVAL = 3600  # 命中时最近使用时间的更新间隔（秒），避免每次命中都写数据库
+EVICT_CHECK_INTERVAL = 64  # 每写入多少条记录检查一次总大小
+ENTRY_OVERHEAD = 96  # 每条记录除密钥与元数据外的估算开销（路径以外的列、索引）
+
+StatKey = Tuple[int, int, int]  # （大小，修改时间纳秒，inode）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS headers (
+    path         TEXT PRIMARY KEY,
+    size         INTEGER NOT NULL,
+    mtime_ns     INTEGER NOT NULL,
+    inode        INTEGER NOT NULL,
+    rc4_key      BLOB NOT NULL,
+    metadata     TEXT NOT NULL,
+    cover_length INTEGER NOT NULL,
+    audio_offset INTEGER NOT NULL,
+    nbytes       INTEGER NOT NULL,
+    last_used    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS headers_last_used ON headers (last_used);
+"""
+
+
+def default_cache_path() -> Optional[str]:
+    """返回缓存数据库路径，被环境变量禁用时返回 None"""
+    if path := os.environ.get(HEADER_CACHE_ENV):
+        return None if path.lower() in ("off", "0", "none") else path
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "ncm-converter", "headers.db")
+
+
+def stat_key(stat_result: os.stat_result) -> StatKey:
+    return stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino
+
+
+def _restrict_permissions(db_path: str) -> None:
+    """以 0600 权限创建数据库文件；已有的数据库及其 WAL / SHM 文件也收紧为 0600（SQLite 创建后两者时沿用数据库文件的权限）"""
+    os.close(os.open(db_path, os.O_CREAT | os.O_RDWR, 0o600))
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.chmod(db_path + suffix, 0o600)
+        except OSError:
+            pass  # 不存在，或由其他用户创建（NCM_HEADER_CACHE 指向共享路径）
+
+
+class HeaderCache:
+    """
+    Size-bounded LRU cache of parsed headers, keyed by resolved path and validated against the file's
+    size, mtime and inode. Each thread and process uses its own connection; the database is in WAL mode,
+    so worker processes of a batch can share it.
+    按总大小限制的已解析文件头 LRU 缓存，以绝对路径为键，并校验文件的大小、修改时间与 inode。
+    每个线程与进程使用各自的连接；数据库为 WAL 模式，批量任务的各个子进程可以共用。
+    """
+    def __init__(self, db_path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param db_path: str 缓存数据库路径
+        :param max_bytes: int 缓存记录的总字节数上限
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        import sqlite3
+
+        connection = getattr(self._local, "connection", None)
+        # fork 出的子进程不能沿用父进程的连接
+        if connection is None or self._local.pid != os.getpid():
+            Path(self.db_path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            _restrict_permissions(self.db_path)
+            connection = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, path: str, key: StatKey) -> Optional[HeaderLayout]:
+        """
+        Return the cached layout of path if the file still has the given stat key, else None.
+        文件的 stat 键仍然一致时返回缓存的文件头，否则返回 None。
+        """
+        import sqlite3
+
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT size, mtime_ns, inode, rc4_key, metadata, cover_length, audio_offset, last_used "
+                "FROM headers WHERE path = ?", (path,)).fetchone()
+            if row is None or tuple(row[:3]) != key:
+                return None
+            now = time.time()
+            if now - row[7] > TOUCH_INTERVAL:
+                connection.execute("UPDATE headers SET last_used = ? WHERE path = ?", (now, path))
+            return HeaderLayout(row[3], NCMMetadata(**json.loads(row[4])), row[5], row[6])
+        except (sqlite3.Error, OSError, ValueError, TypeError):
+            return None
+
+    def put(self, path: str, key: StatKey, layout: HeaderLayout) -> None:
+        metadata = json.dumps(asdict(layout.metadata), ensure_ascii=False)
+        nbytes = len(path.encode()) + len(layout.rc4_key) + len(metadata.encode()) + ENTRY_OVERHEAD
+        import sqlite3
+
+        try:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, *key, layout.rc4_key, metadata, layout.cover_length, layout.audio_offset, nbytes, time.time()))
+            self._writes += 1
+            if self._writes % EVICT_CHECK_INTERVAL == 1:
+                self._evict(connection)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """总大小超出上限时淘汰最久未使用的记录，降到上限的90%"""
+        count, total = connection.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM headers").fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * 9 // 10
+        connection.execute(
+            "DELETE FROM headers WHERE path IN (SELECT path FROM headers ORDER BY last_used LIMIT ?)",
+            (count * excess // total + 1,))
+
+    def clear(self) -> None:
+        import sqlite3
+
+        try:
+            self._connect().execute("DELETE FROM headers")
+        except (sqlite3.Error, OSError):
+            pass
+
+    def stats(self) -> Tuple[int, int]:
+        """返回（记录数，总字节数）"""
+        import sqlite3
+
+        try:
+            return tuple(self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM headers").fetchone())
+        except (sqlite3.Error, OSError):
+            return 0, 0
+
+
+_cache: Optional[HeaderCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_header_cache() -> Optional[HeaderCache]:
+    """返回本进程共用的文件头缓存，被环境变量禁用时返回 None"""
+    global _cache
+    path = default_cache_path()
+    if path is None:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.db_path != path:
+            _cache = HeaderCache(path)
+        return _cache
@@ -0,0 +1,101 @@
+import threading
+from typing import Optional, Tuple
+
+from session.chunk_tuner import AUTO_CHUNK_SIZE, MAX_CHUNK_SIZE, MIN_CHUNK_SIZE
+
+"""
+批量转换的全局内存预算。BatchEngine 提交每个任务前按估算的内存占用预留额度，超出预算时先缩小该任务的分块大小，
+仍然不够则暂缓提交新文件，直到已提交的任务完成（压缩包模式下为写入压缩包）后释放额度。
+"""
+COVER_ALLOWANCE = 1024 * 1024  # 封面原始数据及其 ID3 标签的估算大小
+CHUNK_COPIES = 2  # 每个分块同时存在的副本数：读取的加密数据与解密结果
+
+
+def parse_size(value: str) -> int:
+    """解析 "512M"、"2G"、"64K" 或字节数"""
+    value = value.strip().lower().removesuffix("b")
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    size = int(float(value[:-1]) * units[value[-1]]) if value[-1:] in units else int(value)
+    if size <= 0:
+        raise ValueError("size must be positive")
+    return size
+
+
+def estimate_task_memory(task_size: int, chunk_size: int, in_memory_output: bool = False) -> int:
+    """
+    Estimate the peak memory of converting one task: the chunk buffers, the cover, and the whole
+    output when it is rendered in memory for an archive.
+    估算转换单个任务的内存峰值：分块缓冲区、封面，以及为写入压缩包而在内存中生成的整个输出。
+
+    :param task_size: int 任务的输入字节数
+    :param chunk_size: int 分块大小，AUTO_CHUNK_SIZE 按最大分块估算
+    :param in_memory_output: bool 输出是否完整保存在内存中（压缩包模式）
+    """
+    chunk_size = MAX_CHUNK_SIZE if chunk_size == AUTO_CHUNK_SIZE else chunk_size
+    estimate = CHUNK_COPIES * min(chunk_size, max(task_size, MIN_CHUNK_SIZE)) + COVER_ALLOWANCE
+    if in_memory_output:
+        estimate += task_size
+    return estimate
+
+
+class MemoryBudget:
+    """
+    Byte budget shared by everything a batch holds in memory at once. A reservation that does not fit waits
+    for releases, except when nothing is reserved: a single task larger than the whole budget still runs,
+    alone, instead of deadlocking. Thread-safe, releases may come from any thread (e.g. the archive writer).
+    批量任务同时占用内存的字节预算。超出预算的预留会等待其他额度释放；但没有任何预留时总是成功，
+    单个超过整个预算的任务会单独执行而不是死锁。线程安全，可在任意线程中释放（例如压缩包写入线程）。
+    """
+    def __init__(self, limit: int):
+        """
+        :param limit: int 预算字节数
+        """
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.used == 0 or self.used + nbytes <= self.limit
+
+    def try_reserve(self, nbytes: int) -> bool:
+        with self._condition:
+            if not self._fits(nbytes):
+                return False
+            self.used += nbytes
+            return True
+
+    def reserve(self, nbytes: int) -> None:
+        """预留额度，超出预算时阻塞直到其他额度释放"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(nbytes))
+            self.used += nbytes
+
+    def release(self, nbytes: int) -> None:
+        with self._condition:
+            self.used = max(0, self.used - nbytes)
+            self._condition.notify_all()
+
+    def admit(self, task_size: int, chunk_size: int, in_memory_output: bool = False,
+              block: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Reserve memory for one task, halving its chunk size (down to MIN_CHUNK_SIZE) until it fits.
+        Returns (reserved bytes, chunk size to use), or None if it does not fit and block is False;
+        with block the smallest estimate waits for room instead.
+        为单个任务预留内存，放不下时将分块大小逐次减半（最小为 MIN_CHUNK_SIZE）。返回（预留字节数，应使用的分块大小）；
+        仍然放不下时，block 为假返回 None，为真则以最小估算值等待额度释放。
+        """
+        candidate_sizes = [chunk_size]
+        candidate = MAX_CHUNK_SIZE if chunk_size == AUTO_CHUNK_SIZE else chunk_size
+        while candidate // 2 >= MIN_CHUNK_SIZE and candidate % 512 == 0:  # 减半后仍为256的倍数
+            candidate //= 2
+            candidate_sizes.append(candidate)
+
+        for size in candidate_sizes:
+            estimate = estimate_task_memory(task_size, size, in_memory_output)
+            if self.try_reserve(estimate):
+                return estimate, size
+
+        if not block:
+            return None
+        self.reserve(estimate)
+        return estimate, size
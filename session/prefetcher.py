@@ -0,0 +1,128 @@
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from codec.ncm_codec import NCMCodec
+from domain.exceptions import NCMException
+from domain.models import BatchTask, HeaderLayout, NCMHeader, NCMMetadata
+from session.archive_source import is_archive
+from session.header_cache import get_header_cache, stat_key
+from session.stream_session import read_header
+
+DEFAULT_PREFETCH_DEPTH = 4  # 预取正在处理的任务之后的文件数
+_DISCARD_READ_SIZE = 256 * 1024
+
+
+def _advise_willneed(fd: int, offset: int, length: int) -> bool:
+    """请求内核异步预读指定区间，平台不支持时返回 False"""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+        return True
+    except OSError:
+        return False
+
+
+def _cache_layout(file_path: str, stat_result: os.stat_result, header: NCMHeader) -> None:
+    """解密密钥与元数据并写入文件头缓存（已缓存时跳过），工作进程打开该文件时只需一次 stat"""
+    header_cache = get_header_cache()
+    if header_cache is None:
+        return
+    path, key = str(Path(file_path).resolve()), stat_key(stat_result)
+    if header_cache.get(path, key) is not None:
+        return
+    metadata = NCMMetadata.load_from_dict(NCMCodec.decrypt_metadata(header.metadata_data))
+    header_cache.put(path, key, HeaderLayout(NCMCodec.derive_key(header.key_data), metadata,
+                                             header.cover_length, header.audio_offset))
+
+
+def prefetch_file(file_path: str, read_ahead: int) -> None:
+    """
+    Warm one NCM file: read and parse the header (which validates it early and locates the cover), ask the
+    kernel to read ahead the cover and the first read_ahead bytes of audio with posix_fadvise(WILLNEED),
+    then decrypt the key and metadata while that I/O runs and store the layout in the header cache, so the
+    worker's DecryptionSession skips header parsing. Where fadvise is unavailable the range is read and discarded.
+    预热单个 NCM 文件：读取并解析文件头（同时尽早校验并定位封面），通过 posix_fadvise(WILLNEED) 请求内核异步预读
+    封面与音频开头 read_ahead 字节，并在预读进行的同时解密密钥与元数据、写入文件头缓存，使工作进程中的
+    DecryptionSession 无需再解析文件头；不支持 fadvise 的平台直接读取该区间后丢弃。
+    """
+    try:
+        with open(file_path, "rb") as f:
+            header = read_header(f, file_path)
+            offset, length = f.tell(), header.cover_length + read_ahead
+            advised = _advise_willneed(f.fileno(), offset, length)
+            _cache_layout(file_path, os.fstat(f.fileno()), header)
+            if advised:
+                return
+            while length > 0 and (data := f.read(min(_DISCARD_READ_SIZE, length))):
+                length -= len(data)
+    except (NCMException, ValueError, TypeError, KeyError, AttributeError, IndexError, OSError):
+        pass  # 预取只是加速手段，错误由正式转换时报告
+
+
+class Prefetcher:
+    """
+    Prefetch the next depth plain files of a batch on a single background I/O thread, so a worker that
+    picks up a new file finds its header, cover and first audio chunk already in the page cache.
+    The caller advances the window as tasks start (or finish, for pools); the thread never runs more than
+    depth files past it. Archive tasks are skipped because their members can only be reached through the archive.
+    在单独的后台 I/O 线程中预取批量任务里接下来 depth 个普通文件，使工作进程开始处理新文件时，
+    其文件头、封面与第一个音频分块已在页缓存中。调用方在任务开始（工作池中为任务完成）时推进窗口，
+    预取最多领先窗口起点 depth 个文件。压缩包任务只能经由压缩包读取，因此跳过。
+    """
+    def __init__(self, tasks: List[BatchTask], depth: int = DEFAULT_PREFETCH_DEPTH,
+                 read_ahead: int = 1024 * 1024):
+        """
+        :param tasks: List[BatchTask] 按提交顺序排列的任务
+        :param depth: int 领先于窗口起点的预取文件数
+        :param read_ahead: int 每个文件预读的音频字节数，通常为分块大小
+        """
+        self._paths: List[Optional[str]] = [
+            None if task.member or is_archive(task.input_path) else task.input_path for task in tasks]
+        self.depth = depth
+        self.read_ahead = read_ahead
+        self._position = 0
+        self._next = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ncm-prefetch", daemon=True)
+
+    def __enter__(self):
+        if self.depth > 0 and any(self._paths):
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def advance(self, count: int = 1) -> None:
+        """窗口起点前移 count 个任务，这些任务不再需要预取"""
+        with self._condition:
+            self._position += count
+            self._condition.notify()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                # 窗口起点之前的任务不再需要预取，直接跳到窗口内
+                self._next = max(self._next, self._position)
+                while not self._closed and self._next >= self._position + self.depth:
+                    self._condition.wait()
+                    self._next = max(self._next, self._position)
+                if self._next >= len(self._paths):
+                    return
+                if self._closed:
+                    return
+                path = self._paths[self._next]
+                self._next += 1
+            if path is not None:
+                prefetch_file(path, self.read_ahead)
@@ -0,0 +1,144 @@
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from domain.exceptions import NCMException
+from domain.models import BatchTask, TaskFootprint
+
+"""
+批量任务调度策略：
+input    按输入顺序执行
+size     大文件优先（LPT），并行执行时避免最大的文件最后才开始、其余工作进程空等，缩短总耗时
+location 按目录与 inode（压缩包内按成员偏移）排序，减少机械硬盘的寻道
+auto     并行执行时为 size，顺序执行时为 input（顺序执行时执行顺序不影响总耗时）
+"""
+SCHEDULE_POLICIES = ("auto", "input", "size", "location")
+
+
+def resolve_schedule(policy: str = "auto", jobs: int = 1) -> str:
+    if policy not in SCHEDULE_POLICIES:
+        raise NCMException(f"不支持的调度策略：{policy}")
+    if policy == "auto":
+        return "size" if jobs > 1 else "input"
+    return policy
+
+
+def _zip_footprints(archive_path: str) -> Dict[str, TaskFootprint]:
+    stat = os.stat(archive_path)
+    parent = str(Path(archive_path).parent)
+    with zipfile.ZipFile(archive_path) as archive:
+        return {info.filename: TaskFootprint(info.file_size, (parent, stat.st_ino, info.header_offset))
+                for info in archive.infolist()}
+
+
+def describe_tasks(tasks: List[BatchTask]) -> List[TaskFootprint]:
+    """
+    Stat every task once: its size (uncompressed size for zip members) and on-disk location.
+    Each zip archive is opened only once however many member tasks it has. Unreadable inputs get an
+    empty footprint and are reported when the task runs.
+    对每个任务执行一次 stat，得到其大小（zip 成员为解压后大小）与磁盘位置。每个 zip 包只打开一次；
+    无法读取的输入返回空的 TaskFootprint，错误在执行任务时报告。
+    """
+    zip_cache: Dict[str, Dict[str, TaskFootprint]] = {}
+    footprints = []
+    for task in tasks:
+        try:
+            if task.member:
+                if task.input_path not in zip_cache:
+                    zip_cache[task.input_path] = _zip_footprints(task.input_path)
+                footprint = zip_cache[task.input_path].get(task.member, TaskFootprint())
+            else:
+                stat = os.stat(task.input_path)
+                footprint = TaskFootprint(stat.st_size, (str(Path(task.input_path).parent), stat.st_ino, 0))
+        except (OSError, zipfile.BadZipFile):
+            zip_cache.setdefault(task.input_path, {})
+            footprint = TaskFootprint(location=(str(Path(task.input_path).parent), 0, 0))
+        footprints.append(footprint)
+    return footprints
+
+
+def schedule_order(footprints: List[TaskFootprint], policy: str) -> List[int]:
+    """
+    Return the indices of the tasks in execution order. Sorting is stable, so ties keep input order.
+    返回按执行顺序排列的任务下标。排序是稳定的，相同大小 / 位置的任务保持输入顺序。
+
+    :param footprints: List[TaskFootprint] describe_tasks 的结果
+    :param policy: str input / size / location，auto 需先经 resolve_schedule 解析
+    """
+    indices = list(range(len(footprints)))
+    if policy == "size":
+        indices.sort(key=lambda i: -footprints[i].size)
+    elif policy == "location":
+        indices.sort(key=lambda i: footprints[i].location)
+    elif policy != "input":
+        raise NCMException(f"不支持的调度策略：{policy}")
+    return indices
+
+
+def order_tasks(tasks: List[BatchTask], policy: str, jobs: int = 1) -> List[BatchTask]:
+    """按调度策略重新排列任务；input 策略不需要 stat，原样返回"""
+    policy = resolve_schedule(policy, jobs)
+    if policy == "input" or len(tasks) <= 1:
+        return list(tasks)
+    return [tasks[i] for i in schedule_order(describe_tasks(tasks), policy)]
+
+
+def task_bytes(tasks: List[BatchTask]) -> Dict[str, int]:
+    """
+    Map the input path of every plain file and zip member to its size, as reported in BatchResult.input_path.
+    Whole archives (tar) are keyed by the archive path.
+    返回每个普通文件与 zip 成员的输入路径（与 BatchResult.input_path 相同）到其大小的映射，整个压缩包以压缩包路径为键。
+    """
+    sizes = {}
+    for task, footprint in zip(tasks, describe_tasks(tasks)):
+        key = str(Path(task.input_path) / task.member) if task.member else task.input_path
+        sizes[key] = footprint.size
+    return sizes
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "剩余时间计算中"
+    seconds = int(seconds + 0.5)
+    if seconds >= 3600:
+        return f"剩余约 {seconds // 3600}小时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"剩余约 {seconds // 60}分{seconds % 60}秒"
+    return f"剩余约 {seconds}秒"
+
+
+class ByteProgress:
+    """
+    Batch progress and ETA measured in bytes rather than files, so one large file does not stall the
+    estimate and a run of small files does not make it jump ahead.
+    以字节而不是文件数计算的批量进度与剩余时间，单个大文件不会使进度停滞，连续的小文件也不会使进度虚高。
+    """
+    def __init__(self, total_bytes: int):
+        """
+        :param total_bytes: int 全部任务的字节数
+        """
+        self.total_bytes = max(0, total_bytes)
+        self.done_bytes = 0
+        self._start = time.perf_counter()
+
+    def add(self, nbytes: int) -> None:
+        """一个任务完成，计入其字节数"""
+        self.done_bytes = min(self.done_bytes + max(0, nbytes), self.total_bytes)
+
+    def fraction(self, in_flight: int = 0) -> float:
+        """
+        :param in_flight: int 正在处理的任务中已处理的字节数
+        """
+        if self.total_bytes <= 0:
+            return 0.0
+        return min(1.0, (self.done_bytes + in_flight) / self.total_bytes)
+
+    def eta(self, in_flight: int = 0) -> Optional[float]:
+        """按目前的平均速度估算剩余秒数，尚未处理任何数据时返回 None"""
+        fraction = self.fraction(in_flight)
+        if fraction <= 0:
+            return None
+        elapsed = time.perf_counter() - self._start
+        return elapsed * (1 - fraction) / fraction
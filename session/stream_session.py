@@ -0,0 +1,333 @@
+import io
+import time
+from typing import BinaryIO, Iterator, Optional, TYPE_CHECKING
+
+from codec.ncm_codec import NCMCodec
+from domain.exceptions import NCMFileValidationException, NCMExportException, NCMDecryptionException
+from domain.models import NCMMetadata, NCMHeader
+from session.chunk_tuner import AUTO_CHUNK_SIZE, device_of_stream, get_tuner
+from session.decryption_session import CoverTransform, ProgressCallback
+
+if TYPE_CHECKING:
+    from codec.format_converter import FormatConverter
+    from domain.models import ClipOptions
+    from session.cancellation import CancellationToken
+    from session.checksum import DigestSet
+
+ID3_HEADER_SIZE = 10
+
+
+def read_exact(stream: BinaryIO, size: int) -> bytes:
+    """
+    Read exactly size bytes from a possibly non-seekable stream (pipes may return short reads).
+    从不可定位的流中读取恰好 size 字节，管道可能分多次返回。
+    """
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = stream.read(size - len(buffer))
+        if not data:
+            break
+        buffer.extend(data)
+    return bytes(buffer)
+
+
+def read_field(stream: BinaryIO, size: int, field: str) -> bytes:
+    data = read_exact(stream, size)
+    if len(data) != size:
+        raise NCMFileValidationException(f"文件不完整，读取{field}时遇到文件结尾")
+    return data
+
+
+def skip_bytes(stream: BinaryIO, size: int) -> None:
+    """跳过 size 字节：可定位的流直接定位，否则读取后丢弃"""
+    if is_seekable(stream):
+        stream.seek(size, io.SEEK_CUR)
+    else:
+        read_exact(stream, size)
+
+
+def is_seekable(stream: BinaryIO) -> bool:
+    # 流模式打开的 tar 包成员不支持 seekable()
+    try:
+        return stream.seekable()
+    except (AttributeError, OSError):
+        return False
+
+
+def remaining_size(stream: BinaryIO) -> int:
+    """剩余字节数：可定位的流直接定位到结尾，否则读完剩余数据"""
+    if is_seekable(stream):
+        position = stream.tell()
+        return stream.seek(0, io.SEEK_END) - position
+
+    size = 0
+    while data := stream.read(1024 * 1024):
+        size += len(data)
+    return size
+
+
+def read_header(stream: BinaryIO, name: str = "<stream>") -> NCMHeader:
+    """
+    Read the still-encrypted header fields up to the cover length, leaving the stream at the start of the cover.
+    读取文件头中尚未解密的密钥与元数据字段，读取后流位置停在封面数据开始处。
+
+    :param stream: BinaryIO 位于文件开头的数据流
+    :param name: str 用于错误信息的文件名
+    :return: NCMHeader
+    :raise: NCMFileValidationException 不是NCM文件或文件头不完整
+    """
+    if not NCMCodec.verify_format(read_exact(stream, 8)):
+        raise NCMFileValidationException(f"文件不是合法的NCM格式：{name}")
+    read_field(stream, 2, "文件头")
+
+    key_data = read_field(stream, 132, "密钥")
+    metadata_length = int.from_bytes(read_field(stream, 4, "元数据长度"), byteorder="little")
+    metadata_data = read_field(stream, metadata_length, "元数据")
+    read_field(stream, 9, "封面校验")
+    cover_length = int.from_bytes(read_field(stream, 4, "封面长度"), byteorder="little")
+
+    audio_offset = 8 + 2 + 132 + 4 + metadata_length + 9 + 4 + cover_length
+    return NCMHeader(key_data, metadata_data, cover_length, audio_offset)
+
+
+def build_cover_tag(cover_bytes: bytes, existing_tag: bytes = b"", audio_size: int = 0) -> bytes:
+    """
+    Render the ID3 tag that DecryptionSession._write_cover_to_file would leave at the start of the file.
+    生成与 DecryptionSession._write_cover_to_file 写入效果一致的 ID3 标签字节，用于流式输出。
+
+    :param cover_bytes: bytes 封面
+    :param existing_tag: bytes 音频开头已有的完整 ID3v2 标签（可为空）
+    :param audio_size: int 音频总大小（含已有标签）；mutagen 据此决定填充长度，已知时结果与写入文件完全一致
+    :return: bytes
+    """
+    import mutagen
+    import mutagen.id3 as id3
+
+    try:
+        tags = id3.ID3(io.BytesIO(existing_tag)) if existing_tag else id3.ID3()
+    except id3.error:
+        tags = id3.ID3()
+
+    tags.add(
+        id3.APIC(
+            encoding=3,
+            mime="image/jpeg",
+            type=3,
+            desc='Cover',
+            data=cover_bytes
+        )
+    )
+
+    buffer = io.BytesIO()
+    tags.save(buffer, padding=lambda info: mutagen.PaddingInfo(info.padding, audio_size).get_default_padding())
+    return buffer.getvalue()
+
+
+def id3_tag_size(head: bytes) -> int:
+    """返回以 ID3v2 头开始的数据中完整标签（含头部与尾部）的长度，不是 ID3v2 头时返回 0"""
+    if len(head) < ID3_HEADER_SIZE or not head.startswith(b"ID3"):
+        return 0
+    size = 0
+    for b in head[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    has_footer = head[5] & 0x10
+    return ID3_HEADER_SIZE + size + (ID3_HEADER_SIZE if has_footer else 0)
+
+
+class StreamDecryptionSession:
+    """
+    Forward-only counterpart of DecryptionSession for non-seekable inputs such as stdin or archive members.
+    DecryptionSession 的只前向读取版本，适用于标准输入、压缩包成员等不可定位的输入流。
+    """
+    def __init__(self, stream: BinaryIO, name: str = "<stream>", cover_transform: Optional[CoverTransform] = None):
+        self.stream = stream
+        self.name = name
+        self.cover_transform = cover_transform
+
+        self._rc4_key: Optional[bytes] = None
+        self._metadata: Optional[NCMMetadata] = None
+        self._cover_bytes: Optional[bytes] = None
+        self._header_size: Optional[int] = None
+
+    def preview(self):
+        """依次读取文件头、密钥、元数据与封面，读取后流位置停在音频数据开始处"""
+        if self._header_size is not None:
+            return
+
+        header = read_header(self.stream, self.name)
+        cover_bytes = read_field(self.stream, header.cover_length, "封面")
+
+        try:
+            self._rc4_key = NCMCodec.derive_key(header.key_data)
+            self._metadata = NCMMetadata.load_from_dict(NCMCodec.decrypt_metadata(header.metadata_data))
+        except ValueError as e:
+            raise NCMDecryptionException(str(e))
+
+        self._cover_bytes = cover_bytes
+        self._header_size = header.audio_offset
+
+    def get_metadata(self) -> NCMMetadata:
+        self.preview()
+        return self._metadata
+
+    def get_cover_bytes(self) -> bytes:
+        self.preview()
+        return self._cover_bytes
+
+    def _embedded_cover_bytes(self) -> bytes:
+        """返回嵌入输出文件的封面，已应用 cover_transform"""
+        cover_bytes = self.get_cover_bytes()
+        if cover_bytes and self.cover_transform:
+            cover_bytes = self.cover_transform(cover_bytes)
+        return cover_bytes
+
+    def get_audio_offset(self) -> int:
+        self.preview()
+        return self._header_size
+
+    def iter_audio(self, chunk_size: int = 1024 * 1024,
+                   audio_digests: Optional[DigestSet] = None,
+                   cancel_token: Optional[CancellationToken] = None,
+                   clip: Optional[ClipOptions] = None) -> Iterator[bytes]:
+        """
+        Yield decrypted audio chunks. chunk_size must be a multiple of 256 because the NCM keystream
+        restarts on every decrypt_audio call and repeats every 256 bytes.
+        逐块返回解密后的音频。NCM 密钥流周期为256字节且每次调用 decrypt_audio 都从头开始，故 chunk_size 必须为256的倍数。
+
+        :param chunk_size: int 分块大小；为 AUTO_CHUNK_SIZE 时按所在设备自动调节（见 session.chunk_tuner）
+        :param audio_digests: Optional[DigestSet] 指定时对每个解密分块计算哈希
+        :param cancel_token: Optional[CancellationToken] 每个分块之前检查，已取消时抛出 NCMCancelledException
+        :param clip: Optional[ClipOptions] 指定时只读取切点之前的音频，作为一个分块返回截取的片段，哈希按片段计算
+        """
+        if chunk_size < 0 or chunk_size % 256:
+            raise ValueError("chunk_size must be a positive multiple of 256")
+
+        self.preview()
+        if clip is not None:
+            from codec.audio_clip import CLIP_READ_SIZE, clip_audio
+
+            read_size = CLIP_READ_SIZE if chunk_size == AUTO_CHUNK_SIZE else min(chunk_size, CLIP_READ_SIZE)
+            chunk = clip_audio(self.iter_audio(read_size, cancel_token=cancel_token), clip)
+            if audio_digests is not None:
+                audio_digests.update(chunk)
+            yield chunk
+            return
+
+        tuner = get_tuner(device_of_stream(self.stream)) if chunk_size == AUTO_CHUNK_SIZE else None
+        while True:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            read_size = tuner.chunk_size if tuner else chunk_size
+            started = time.perf_counter()
+            encrypted_chunk = read_exact(self.stream, read_size)
+            if not encrypted_chunk:
+                return
+            chunk = NCMCodec.decrypt_audio(encrypted_chunk, self._rc4_key)
+            if tuner:
+                tuner.record(read_size, len(encrypted_chunk), time.perf_counter() - started)
+            if audio_digests is not None:
+                audio_digests.update(chunk)
+            yield chunk
+
+    def export_to_stream(self, output: BinaryIO, chunk_size: int = 1024 * 1024,
+                         progress_callback: Optional[ProgressCallback] = None,
+                         total_size: int = 0, audio_digests: Optional[DigestSet] = None,
+                         cancel_token: Optional[CancellationToken] = None,
+                         clip: Optional[ClipOptions] = None) -> int:
+        """
+        Stream decrypted audio with the cover tag prepended, holding at most one chunk (plus an existing ID3 tag).
+        流式写出带封面标签的音频，内存中最多只保留一个分块（以及音频开头已有的ID3标签）。
+
+        :param output: BinaryIO 输出流，可为标准输出
+        :param chunk_size: int 分块大小，必须为256的倍数
+        :param progress_callback: Optional[ProgressCallback]
+        :param total_size: int 音频总大小，未知时为0
+        :param audio_digests: Optional[DigestSet] 指定时对解密后的音频数据计算哈希
+        :param cancel_token: Optional[CancellationToken] 取消标记
+        :param clip: Optional[ClipOptions] 指定时只写出开头的片段
+        :return: int 已解密的音频字节数（截取片段时为片段大小）
+        """
+        processed_size = 0
+        chunks = self.iter_audio(chunk_size, audio_digests, cancel_token, clip)
+
+        def report(msg: str):
+            if progress_callback:
+                progress_callback(processed_size, total_size, msg)
+
+        try:
+            report("开始任务")
+            head = bytearray()
+            cover_bytes = self._embedded_cover_bytes()
+
+            if cover_bytes:
+                # 收集足以包含音频开头 ID3 标签的数据，与封面合并后再写出
+                for chunk in chunks:
+                    head.extend(chunk)
+                    processed_size += len(chunk)
+                    tag_size = id3_tag_size(bytes(head[:ID3_HEADER_SIZE]))
+                    if len(head) >= max(tag_size, ID3_HEADER_SIZE):
+                        break
+                if clip is not None:
+                    total_size = processed_size  # 片段只有一个分块，大小在截取后才知道
+                tag_size = id3_tag_size(bytes(head[:ID3_HEADER_SIZE]))
+                output.write(build_cover_tag(cover_bytes, bytes(head[:tag_size]), total_size))
+                output.write(head[tag_size:])
+                report(f"已处理 {processed_size / 1024 / 1024:.2f}MB")
+
+            for chunk in chunks:
+                output.write(chunk)
+                processed_size += len(chunk)
+                report(f"已处理 {processed_size / 1024 / 1024:.2f}MB")
+
+            output.flush()
+            total_size = processed_size if clip is not None else total_size or processed_size
+            report("任务完成")
+            return processed_size
+        except (IOError, OSError) as e:
+            raise NCMExportException(f"导出音频失败：{str(e)}")
+
+    def transcode_to_stream(self, output: BinaryIO, converter: FormatConverter, chunk_size: int = 1024 * 1024,
+                            progress_callback: Optional[ProgressCallback] = None,
+                            total_size: int = 0, audio_digests: Optional[DigestSet] = None,
+                            cancel_token: Optional[CancellationToken] = None,
+                            clip: Optional[ClipOptions] = None) -> int:
+        """
+        Pipe decrypted audio through an external encoder and write the encoded result to output.
+        The cover is embedded as an ID3 tag only when the target format is mp3.
+        将解密后的音频经外部编码器转码后写入输出流。仅当目标格式为 mp3 时以 ID3 标签嵌入封面。
+
+        :param output: BinaryIO 输出流，可为标准输出
+        :param converter: FormatConverter 格式转换器
+        :param chunk_size: int 分块大小，必须为256的倍数
+        :param progress_callback: Optional[ProgressCallback]
+        :param total_size: int 音频总大小，未知时为0
+        :param audio_digests: Optional[DigestSet] 指定时对转码前解密后的音频数据计算哈希
+        :param cancel_token: Optional[CancellationToken] 取消标记，取消后编码器的输入提前结束
+        :param clip: Optional[ClipOptions] 指定时只转码开头的片段
+        :return: int 已解密的音频字节数
+        """
+        processed_size = 0
+
+        def report(msg: str):
+            if progress_callback:
+                progress_callback(processed_size, total_size, msg)
+
+        def counted_chunks() -> Iterator[bytes]:
+            nonlocal processed_size
+            for chunk in self.iter_audio(chunk_size, audio_digests, cancel_token, clip):
+                yield chunk
+                processed_size += len(chunk)
+                report(f"已转码 {processed_size / 1024 / 1024:.2f}MB")
+
+        try:
+            report("开始任务")
+            cover_bytes = self._embedded_cover_bytes() if converter.options.target_format == "mp3" else b""
+            if cover_bytes:
+                output.write(build_cover_tag(cover_bytes))  # 编码后的大小未知，按默认填充
+            converter.transcode(counted_chunks(), output)
+            output.flush()
+            total_size = processed_size if clip is not None else total_size or processed_size
+            report("任务完成")
+            return processed_size
+        except (IOError, OSError) as e:
+            raise NCMExportException(f"导出音频失败：{str(e)}")
@@ -0,0 +1,113 @@
+import tarfile
+import time
+import zipfile
+from typing import BinaryIO, List, Optional
+
+from codec.ncm_codec import NCMCodec
+from domain.exceptions import NCMException, NCMFileValidationException, NCMDecryptionException
+from domain.models import BatchTask, BatchResult, NCMMetadata
+from session.batch_engine import BatchResultCallback, iter_task_streams, map_in_pool
+from session.stream_session import read_exact, read_header, remaining_size, skip_bytes
+
+VERIFY_AUDIO_SIZE = 4096  # 只解密音频开头的字节数（256的倍数）
+SIZE_RATIO_RANGE = (0.25, 4.0)  # 音频大小与 时长×码率 估算值之比的合理范围
+
+
+def sniff_audio_format(head: bytes) -> Optional[str]:
+    """根据解密后音频开头的签名判断格式，无法识别时返回 None"""
+    if head.startswith(b"fLaC"):
+        return "flac"
+    if head.startswith(b"ID3") or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+def check_audio_size(metadata: NCMMetadata, audio_size: int) -> str:
+    """根据元数据中的时长与码率估算音频大小，不合理时返回错误信息"""
+    if audio_size <= 0:
+        return "没有音频数据，文件可能被截断"
+    if metadata.duration > 0 and metadata.bitrate > 0:
+        expected_size = metadata.duration / 1000 * metadata.bitrate / 8
+        ratio = audio_size / expected_size
+        if not SIZE_RATIO_RANGE[0] <= ratio <= SIZE_RATIO_RANGE[1]:
+            return f"音频大小 {audio_size / 1024 / 1024:.2f}MB 与时长、码率不符（约为预期的 {ratio:.2f} 倍），文件可能被截断"
+    return ""
+
+
+def verify_stream(stream: BinaryIO, input_path: str) -> BatchResult:
+    """
+    Check one NCM stream without exporting: magic, key (including its padding checks), metadata,
+    the signature of the first few KB of decrypted audio and the plausibility of the audio size.
+    The cover is skipped rather than read when the stream is seekable.
+    不导出音频，只检查文件头、密钥（含填充校验）、元数据、音频开头几KB解密后的签名与音频大小是否合理。
+    可定位的流会直接跳过封面数据。
+
+    :param stream: BinaryIO 位于文件开头的数据流
+    :param input_path: str 用于结果显示的路径
+    :return: BatchResult 成功时 message 为音频格式与大小，失败时为损坏原因
+    """
+    start = time.perf_counter()
+    input_size = 0
+
+    try:
+        header = read_header(stream, input_path)
+        try:
+            rc4_key = NCMCodec.derive_key(header.key_data)
+            metadata = NCMMetadata.load_from_dict(NCMCodec.decrypt_metadata(header.metadata_data))
+        except (ValueError, TypeError, KeyError, AttributeError, IndexError) as e:
+            raise NCMDecryptionException(str(e))
+        skip_bytes(stream, header.cover_length)
+
+        encrypted_head = read_exact(stream, VERIFY_AUDIO_SIZE)
+        audio_size = len(encrypted_head) + remaining_size(stream)
+        input_size = header.audio_offset + audio_size
+        if error := check_audio_size(metadata, audio_size):
+            raise NCMFileValidationException(error)
+
+        audio_format = sniff_audio_format(NCMCodec.decrypt_audio(encrypted_head, rc4_key))
+        if audio_format is None:
+            raise NCMDecryptionException("解密后的音频数据无法识别，密钥或音频数据已损坏")
+        if audio_format != metadata.format:
+            raise NCMFileValidationException(f"音频格式为 {audio_format}，与元数据中的 {metadata.format} 不符")
+
+        message = f"{audio_format}，{audio_size / 1024 / 1024:.2f}MB"
+        return BatchResult(input_path, "", True, message, input_size, time.perf_counter() - start)
+
+    except (NCMException, ValueError, OSError) as e:
+        return BatchResult(input_path, "", False, str(e), input_size, time.perf_counter() - start)
+
+
+def verify_task(task: BatchTask) -> List[BatchResult]:
+    """
+    Verify every file of a task (plain file, zip member or whole archive). Module-level for worker processes.
+    检查任务对应的全部文件（普通文件、zip 成员或整个压缩包）。定义在模块级以便传递给子进程。
+    """
+    results = []
+    try:
+        for input_path, member, stream in iter_task_streams(task):
+            results.append(verify_stream(stream, input_path))
+    except (OSError, KeyError, tarfile.TarError, zipfile.BadZipFile) as e:
+        results.append(BatchResult(task.input_path, "", False, f"读取文件失败：{e}"))
+    return results
+
+
+def verify_library(tasks: List[BatchTask], jobs: int = 1,
+                   result_callback: Optional[BatchResultCallback] = None) -> List[BatchResult]:
+    """
+    Verify all tasks in parallel and return the results.
+    并行检查全部任务并返回结果。
+
+    :param tasks: List[BatchTask]
+    :param jobs: int 并行进程数
+    :param result_callback: Optional[BatchResultCallback] 每个文件检查完成后的回调
+    :return: List[BatchResult]
+    """
+    results = []
+    total = len(tasks)
+    for task_results in map_in_pool(verify_task, tasks, jobs):
+        total += len(task_results) - 1
+        for result in task_results:
+            results.append(result)
+            if result_callback:
+                result_callback(result, len(results), total)
+    return results
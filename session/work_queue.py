@@ -0,0 +1,221 @@
+import contextlib
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from domain.exceptions import NCMException
+from domain.models import BatchTask, BatchResult
+from session.archive_source import is_archive
+
+"""
+共享目录上的持久化工作队列（SQLite）。多台机器上的工作进程以带过期时间的租约领取一批文件，转换后标记完成；
+租约过期（节点崩溃或断开）的文件会被其他工作进程重新领取。无需额外的消息代理，节点越多吞吐越高。
+数据库使用回滚日志模式（而不是 WAL），依赖文件锁，可用于支持 fcntl 锁的网络文件系统（NFS、SMB）。
+租约按各节点的系统时间计算，节点间的时钟偏差应远小于租约时长。
+"""
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3  # 同一文件最多被领取的次数，超过后标记为失败，避免导致崩溃的文件反复拖垮节点
+DEFAULT_POLL_INTERVAL = 5.0
+STATES = ("pending", "leased", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    input_path  TEXT PRIMARY KEY,
+    output_dir  TEXT,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    owner       TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT NOT NULL DEFAULT '',
+    message     TEXT NOT NULL DEFAULT '',
+    updated     REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Durable work queue in a SQLite file on shared storage. Every state change is a short IMMEDIATE
+    transaction, so any number of processes on any number of nodes can use the same file; a claimed
+    task stays leased to its worker until it is completed, released, or the lease expires.
+    共享存储上 SQLite 文件中的持久化工作队列。每次状态变更都是一个简短的 IMMEDIATE 事务，任意多个节点上的任意多个进程
+    可以同时使用同一文件；被领取的任务在完成、归还或租约过期前归该工作进程所有。
+    """
+    def __init__(self, db_path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, worker_id: Optional[str] = None):
+        """
+        :param db_path: str 队列数据库路径，通常位于共享目录
+        :param lease_seconds: float 租约时长，应明显长于转换一批文件所需的时间（每完成一个文件会续约）
+        :param max_attempts: int 同一文件最多被领取的次数
+        :param worker_id: Optional[str] 工作进程标识，默认为 主机名:进程号
+        """
+        self.db_path = str(Path(db_path).resolve())
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.worker_id = worker_id or default_worker_id()
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            # isolation_level=None：由 _transaction 显式控制事务
+            self._connection = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=DELETE")
+            self._connection.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            raise NCMException(f"无法打开工作队列 {self.db_path}：{e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE 立即获取写锁，并发领取时不会出现两个进程读到同一批待处理任务
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def add(self, tasks: Iterable[BatchTask]) -> int:
+        """
+        Enqueue plain .ncm files; files already in the queue are left as they are, so every node may
+        enqueue the same library. Returns the number of newly added files.
+        将普通 .ncm 文件加入队列；已在队列中的文件保持原状，因此每个节点都可以重复加入同一曲库。返回新加入的文件数。
+        """
+        rows = []
+        for task in tasks:
+            if task.member or is_archive(task.input_path):
+                raise NCMException(f"工作队列只支持普通 .ncm 文件：{task.input_path}")
+            output_dir = str(Path(task.output_dir).resolve()) if task.output_dir else None
+            rows.append((str(Path(task.input_path).resolve()), output_dir, time.time()))
+
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO tasks (input_path, output_dir, updated) VALUES (?, ?, ?)",
+                                   rows)
+            return connection.total_changes - before
+
+    def claim(self, count: int) -> List[BatchTask]:
+        """
+        Lease up to count pending tasks, including tasks whose previous lease has expired.
+        Expired tasks that already used up max_attempts are marked failed instead.
+        领取最多 count 个待处理任务（包括租约已过期的任务）。已达到最大领取次数的过期任务改为标记失败。
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE tasks SET state = 'failed', message = ?, updated = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (f"已领取 {self.max_attempts} 次仍未完成", now, now, self.max_attempts))
+            rows = connection.execute(
+                "SELECT input_path, output_dir FROM tasks "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY state DESC, rowid LIMIT ?", (now, count)).fetchall()
+            connection.executemany(
+                "UPDATE tasks SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE input_path = ?",
+                [(self.worker_id, now + self.lease_seconds, now, input_path) for input_path, _ in rows])
+        return [BatchTask(input_path, output_dir=output_dir) for input_path, output_dir in rows]
+
+    def renew(self, tasks: Iterable[BatchTask]) -> None:
+        """延长本工作进程仍持有的租约"""
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE tasks SET lease_until = ?, updated = ? WHERE input_path = ? AND owner = ? AND state = 'leased'",
+                [(now + self.lease_seconds, now, task.input_path, self.worker_id) for task in tasks])
+
+    def complete(self, result: BatchResult) -> None:
+        """
+        Record the outcome of a task. A result arriving after the lease was taken over by another worker
+        is still recorded unless that worker has already finished the file.
+        记录任务结果。租约已被其他工作进程接管时仍然记录，除非对方已经完成该文件。
+        """
+        state = "done" if result.success else "failed"
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE tasks SET state = ?, owner = ?, output_path = ?, message = ?, updated = ? "
+                "WHERE input_path = ? AND state != 'done'",
+                (state, self.worker_id, result.output_path, result.message, time.time(), result.input_path))
+
+    def release(self, tasks: Iterable[BatchTask]) -> None:
+        """归还尚未完成的租约（例如被中断时），这些任务立即可被其他工作进程领取，且不计入领取次数"""
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE tasks SET state = 'pending', owner = NULL, lease_until = 0, attempts = attempts - 1 "
+                "WHERE input_path = ? AND owner = ? AND state = 'leased'",
+                [(task.input_path, self.worker_id) for task in tasks])
+
+    def retry_failed(self) -> int:
+        """将失败的任务重新置为待处理并清零领取次数，返回数量"""
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE tasks SET state = 'pending', owner = NULL, lease_until = 0, attempts = 0, message = '' "
+                "WHERE state = 'failed'").rowcount
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self._connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        return counts
+
+
+def run_queue(queue: WorkQueue, convert: Callable[[List[BatchTask], Callable[[BatchResult], None]], None],
+              batch_size: int = 16, wait: bool = True, poll_interval: float = DEFAULT_POLL_INTERVAL) -> int:
+    """
+    Claim batches from the queue and convert them until nothing is left. While other workers still hold
+    leases the loop keeps polling (if wait), so tasks of a node that crashes are picked up once its leases
+    expire. Leases of the current batch are renewed after every finished file and released on interruption.
+    从队列中逐批领取并转换，直到没有剩余任务。其他工作进程仍持有租约时继续轮询（wait 为真时），
+    因此崩溃节点的任务会在其租约过期后被接管。每完成一个文件续约本批剩余任务，被中断时归还租约。
+
+    :param queue: WorkQueue 工作队列
+    :param convert: Callable 转换一批任务，每完成一个调用一次传入的结果回调，例如 BatchEngine.run
+    :param batch_size: int 每次领取的任务数
+    :param wait: bool 队列中只剩其他工作进程持有的任务时是否继续等待
+    :param poll_interval: float 等待时的轮询间隔（秒）
+    :return: int 本工作进程处理的任务数
+    """
+    processed = 0
+    while True:
+        batch = queue.claim(batch_size)
+        if not batch:
+            counts = queue.counts()
+            if not wait or counts["pending"] + counts["leased"] == 0:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        unfinished = {task.input_path: task for task in batch}
+        last_renewal = time.monotonic()
+
+        def on_result(result: BatchResult):
+            nonlocal processed, last_renewal
+            queue.complete(result)
+            processed += 1
+            unfinished.pop(result.input_path, None)
+            # 租约过半时续约，避免每个文件都写一次共享数据库
+            if time.monotonic() - last_renewal > queue.lease_seconds / 2:
+                queue.renew(unfinished.values())
+                last_renewal = time.monotonic()
+
+        try:
+            convert(batch, on_result)
+        except BaseException:
+            queue.release(unfinished.values())
+            raise
+        for task in list(unfinished.values()):
+            on_result(BatchResult(task.input_path, "", False, "转换未返回结果"))